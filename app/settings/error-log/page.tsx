@@ -87,6 +87,8 @@ interface ErrorStats {
 
 const ITEMS_PER_PAGE = 15;
 const ERROR_LOG_TOPIC = "subrack/error/log";
+// Logs queued while the broker was unreachable are sent later as JSON arrays
+const ERROR_LOG_BATCH_TOPIC = "subrack/error/log/batch";
 
 // Color mapping for error types
 const getErrorColor = (type: string) => {
@@ -164,8 +166,8 @@ const ErrorLogPage = () => {
           setIsConnected(true);
           console.log("MQTT: Error Log - Connected");
 
-          // Subscribe to error log topic
-          client.subscribe([ERROR_LOG_TOPIC], (err) => {
+          // Subscribe to live and backlog error log topics
+          client.subscribe([ERROR_LOG_TOPIC, ERROR_LOG_BATCH_TOPIC], (err) => {
             if (err) {
               console.error("Failed to subscribe to error log topic:", err);
             } else {
@@ -209,13 +211,19 @@ const ErrorLogPage = () => {
         const payload = JSON.parse(message.toString());
         console.log("MQTT: Error log received:", payload);
 
+        // Batches arrive oldest first; the list shows the newest log on top
+        const entries: ErrorLog[] = Array.isArray(payload)
+          ? [...payload].reverse()
+          : [payload];
+        const receivedAt = new Date().toISOString();
+
         // Add to logs with timestamp when received
-        const logWithTimestamp = {
-          ...payload,
-          receivedAt: new Date().toISOString(),
-        };
+        const logsWithTimestamp = entries.map((entry) => ({
+          ...entry,
+          receivedAt,
+        }));
 
-        setErrorLogs((prevLogs) => [logWithTimestamp, ...prevLogs]);
+        setErrorLogs((prevLogs) => [...logsWithTimestamp, ...prevLogs]);
       } catch (error) {
         console.error("MQTT: Failed to parse error log", error);
       }
@@ -223,7 +231,7 @@ const ErrorLogPage = () => {
 
     // Set up message handler
     mqttClient.on("message", (topic: string, message: Buffer) => {
-      if (topic === ERROR_LOG_TOPIC) {
+      if (topic === ERROR_LOG_TOPIC || topic === ERROR_LOG_BATCH_TOPIC) {
         handleErrorLogMessage(topic, message);
       }
     });
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Action Dispatcher Module
+Runs automation actions (relay control, WhatsApp messages) on a bounded worker
+pool so MQTT callbacks never block on publishes or slow HTTP endpoints.
+Provides per-action-type concurrency limits, per-key ordering, a pooled HTTP
+session with retry/backoff, and queue-depth metrics.
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger("ActionDispatcher")
+
+# --- Configuration ---
+ACTION_QUEUE_SIZE = 500
+ACTION_WORKERS = 4
+ACTION_TYPE_LIMITS = {
+    'control_relay': 2,   # MQTT publishes, cheap
+    'send_message': 2     # HTTP calls, may block up to the API timeout
+}
+DEFAULT_TYPE_LIMIT = 1
+QUEUE_WARNING_RATIO = 0.8
+
+HTTP_POOL_SIZE = 4
+RETRY_BACKOFF_MAX = 60
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ActionDispatcher:
+    """
+    Bounded FIFO of action jobs served by a fixed worker pool.
+    A job is only started when its action type is below its concurrency limit
+    and no other job with the same key is running, so commands for the same
+    relay are always applied in submission order.
+    """
+
+    def __init__(self, workers: int = ACTION_WORKERS, queue_size: int = ACTION_QUEUE_SIZE,
+                 type_limits: Optional[Dict[str, int]] = None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.type_limits = dict(ACTION_TYPE_LIMITS if type_limits is None else type_limits)
+        self._jobs = deque()
+        self._condition = threading.Condition()
+        self._running_types: Dict[str, int] = {}
+        self._running_keys = set()
+        self._threads = []
+        self._queue_warning = False
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'max_depth': 0
+        }
+
+    def start(self):
+        """Start worker threads (idempotent)"""
+        with self._condition:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ActionWorker-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def submit(self, action_type: str, func: Callable, *args, key: Optional[str] = None) -> bool:
+        """Queue an action; returns False when the queue is full and the action was dropped"""
+        with self._condition:
+            if len(self._jobs) >= self.queue_size:
+                self.metrics['dropped'] += 1
+                logger.warning(f"Action queue full ({self.queue_size}), dropping {action_type} action")
+                return False
+
+            self._jobs.append((action_type, key, func, args))
+            self.metrics['submitted'] += 1
+            depth = len(self._jobs)
+            if depth > self.metrics['max_depth']:
+                self.metrics['max_depth'] = depth
+
+            if depth >= self.queue_size * QUEUE_WARNING_RATIO and not self._queue_warning:
+                self._queue_warning = True
+                logger.warning(f"Action queue depth high: {depth}/{self.queue_size}")
+            elif depth < self.queue_size * QUEUE_WARNING_RATIO / 2:
+                self._queue_warning = False
+
+            self._condition.notify()
+            return True
+
+    def _next_job_locked(self):
+        """Pop the oldest job that is allowed to run now (caller holds the lock)"""
+        for index, job in enumerate(self._jobs):
+            action_type, key = job[0], job[1]
+            if self._running_types.get(action_type, 0) >= self.type_limits.get(action_type, DEFAULT_TYPE_LIMIT):
+                continue
+            if key is not None and key in self._running_keys:
+                continue
+            del self._jobs[index]
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = self._next_job_locked()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job_locked()
+
+                action_type, key, func, args = job
+                self._running_types[action_type] = self._running_types.get(action_type, 0) + 1
+                if key is not None:
+                    self._running_keys.add(key)
+
+            try:
+                func(*args)
+                succeeded = True
+            except Exception as e:
+                succeeded = False
+                logger.error(f"Action {action_type} failed: {e}")
+
+            with self._condition:
+                self._running_types[action_type] -= 1
+                if key is not None:
+                    self._running_keys.discard(key)
+                self.metrics['completed' if succeeded else 'failed'] += 1
+                # A finished job may unblock jobs of the same type or key
+                self._condition.notify_all()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, in-flight counts and totals"""
+        with self._condition:
+            metrics = dict(self.metrics)
+            metrics['queue_depth'] = len(self._jobs)
+            metrics['in_flight'] = {k: v for k, v in self._running_types.items() if v}
+            return metrics
+
+
+# --- Global dispatcher and HTTP session ---
+_global_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_action_dispatcher() -> ActionDispatcher:
+    """Get the process-wide dispatcher, starting it on first use"""
+    global _global_dispatcher
+    with _dispatcher_lock:
+        if _global_dispatcher is None:
+            _global_dispatcher = ActionDispatcher()
+            _global_dispatcher.start()
+        return _global_dispatcher
+
+
+def submit_action(action_type: str, func: Callable, *args, key: Optional[str] = None) -> bool:
+    """Convenience function to queue an action on the global dispatcher"""
+    return get_action_dispatcher().submit(action_type, func, *args, key=key)
+
+
+def get_action_metrics() -> Dict[str, Any]:
+    """Convenience function to read dispatcher metrics"""
+    return get_action_dispatcher().get_metrics()
+
+
+def get_http_session():
+    """Shared requests.Session so HTTP actions reuse pooled keep-alive connections"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def post_with_retry(url: str, retry_attempts: int = 3, retry_delay: float = 5, **kwargs):
+    """
+    POST through the shared session, retrying connection errors and
+    429/5xx responses with exponential backoff.
+
+    Returns:
+        The last response; raises the last exception if no response was received
+    """
+    import requests
+
+    session = get_http_session()
+    attempts = max(1, int(retry_attempts))
+    for attempt in range(attempts):
+        try:
+            response = session.post(url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                return response
+            logger.warning(f"HTTP {response.status_code} from {url}, retrying ({attempt + 1}/{attempts})")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning(f"HTTP request to {url} failed: {e}, retrying ({attempt + 1}/{attempts})")
+        time.sleep(min(retry_delay * (2 ** attempt), RETRY_BACKOFF_MAX))
@@ -0,0 +1,471 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import paho.mqtt.client as mqtt
+from ErrorLogger import initialize_error_logger, send_error_log, ERROR_TYPE_MINOR, ERROR_TYPE_MAJOR, ERROR_TYPE_CRITICAL, ERROR_TYPE_WARNING
+from ActionDispatcher import get_action_metrics
+from PublishQueue import PublishQueue
+
+# The rule engines are hosted as plugins: their CRUD/evaluation code is reused
+# as-is, only the MQTT connection and the device-topic decoding are shared.
+import AutomationLogic
+import AutomationValue
+import AutomationUnified
+import AutomationSchedule
+import AutomationVoice
+
+# --- Setup Logging ---
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger("AutomationRuntimeService")
+
+# --- Startup Banner Functions ---
+def print_startup_banner():
+    """Print standardized startup banner"""
+    print("\n" + "="*50)
+    print("========== Automation Runtime ==========")
+    print("Initializing System...")
+    print("="*50)
+
+def print_success_banner():
+    """Print success status banner"""
+    print("\n" + "="*50)
+    print("========== Automation Runtime ==========")
+    print("Success To Running")
+    print("")
+
+def print_broker_status(runtime_status=False):
+    """Print MQTT broker connection status"""
+    if runtime_status:
+        print("MQTT Broker Runtime is Running")
+    else:
+        print("MQTT Broker Runtime connection failed")
+
+    print("\n" + "="*34)
+    print("Log print Data")
+    print("")
+
+def log_simple(message, level="INFO"):
+    """Simple logging without timestamp for cleaner output"""
+    if level == "ERROR":
+        print(f"[ERROR] {message}")
+    elif level == "SUCCESS":
+        print(f"[OK] {message}")
+    elif level == "WARNING":
+        print(f"[WARN] {message}")
+    else:
+        print(f"[INFO] {message}")
+
+# --- Global Variables ---
+client_runtime = None  # Single MQTT connection shared by every plugin
+control_queue = None  # Priority publish queue in front of client_runtime, shared by the rule engines
+device_states = {}  # Shared device-state cache (device topic / device name -> last decoded data)
+command_routes = {}  # Command topic -> list of plugin CRUD handlers
+
+# --- Connection Status Tracking ---
+runtime_broker_connected = False
+
+# --- Periodic Task Intervals (seconds) ---
+UNIFIED_SCHEDULE_INTERVAL = 5   # Same cadence as AutomationUnified.run
+MAIN_LOOP_INTERVAL = 1          # Upper bound on a main loop sleep
+ACTION_METRICS_INTERVAL = 60    # Action queue metrics log cadence
+
+# Plugins that evaluate device-topic data. Each one keeps its own
+# subscribed_topics set, which is used to route decoded messages.
+DEVICE_PLUGINS = (AutomationLogic, AutomationValue, AutomationUnified)
+
+# MQTT config fields that decide which broker a plugin talks to
+BROKER_CONFIG_FIELDS = ('broker_address', 'broker_port', 'username', 'password')
+
+# --- Device Message Decoding ---
+def decode_device_message(topic, payload):
+    """Decode a device-topic payload once for all plugins.
+
+    Returns a dict with the outer message, the unwrapped device data and
+    flags describing how the data was obtained, or None if the payload is
+    not JSON.
+    """
+    try:
+        message = json.loads(payload)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        log_simple(f"Failed to parse device message JSON on '{topic}': {e}", "ERROR")
+        return None
+
+    decoded = {
+        "topic": topic,
+        "message": message,
+        "data": message,
+        "from_value": False,  # data was taken from the 'value' field
+        "status_only": False  # 'value' is a plain status string such as "data acquisition success"
+    }
+
+    if isinstance(message, dict) and 'value' in message:
+        value = message['value']
+        if isinstance(value, str):
+            try:
+                decoded["data"] = json.loads(value)
+                decoded["from_value"] = True
+            except json.JSONDecodeError:
+                if "success" in value.lower() or "error" in value.lower():
+                    decoded["status_only"] = True
+        else:
+            decoded["data"] = value
+            decoded["from_value"] = True
+
+    return decoded
+
+def dispatch_logic(decoded):
+    """Feed decoded data to AutomationLogic (mirrors AutomationLogic.on_message_control)"""
+    topic_parts = decoded["topic"].split('/')
+    if len(topic_parts) < 3 or not decoded["from_value"]:
+        return
+
+    device_type = topic_parts[-2]
+    device_id = topic_parts[-1]
+    AutomationLogic.process_modular_device_data({
+        'device_name': f"{device_type.capitalize()}{device_id}",
+        'data': decoded["data"]
+    })
+
+def dispatch_value(decoded):
+    """Feed decoded data to AutomationValue (mirrors AutomationValue.on_message_control)"""
+    if decoded["status_only"]:
+        return
+
+    device_data = decoded["data"]
+    if not isinstance(device_data, dict):
+        log_simple(f"Invalid device data format for topic '{decoded['topic']}': expected dict, got {type(device_data).__name__}", "WARNING")
+        return
+
+    AutomationValue.process_modbus_device_data({
+        'device_topic': decoded["topic"],
+        'data': device_data,
+        'topic': decoded["topic"]
+    })
+
+def dispatch_unified(decoded):
+    """Feed decoded data to AutomationUnified (mirrors AutomationUnified.on_message_control)"""
+    if decoded["status_only"]:
+        return
+
+    device_data = decoded["data"]
+    if isinstance(device_data, dict):
+        pass
+    elif isinstance(device_data, (int, float, str, bool)):
+        device_data = {'value': device_data}
+    elif isinstance(device_data, list):
+        device_data = {'data': device_data}
+    else:
+        log_simple(f"Unsupported device data type for topic '{decoded['topic']}': {type(device_data).__name__}. Skipping.", "WARNING")
+        return
+
+    AutomationUnified.process_unified_device_data({
+        'device_topic': decoded["topic"],
+        'data': device_data,
+        'topic': decoded["topic"]
+    })
+
+DEVICE_DISPATCHERS = (
+    (AutomationLogic, dispatch_logic),
+    (AutomationValue, dispatch_value),
+    (AutomationUnified, dispatch_unified),
+)
+
+# --- Plugin Wiring ---
+def build_command_routes():
+    """Map every per-service command topic to the plugin handler that owns it"""
+    routes = {}
+
+    def add_route(topic, handler):
+        routes.setdefault(topic, []).append(handler)
+
+    add_route(AutomationLogic.topic_command, AutomationLogic.on_message_crud)
+    add_route(AutomationValue.topic_command, AutomationValue.on_message_crud)
+    add_route(AutomationUnified.topic_command, AutomationUnified.on_message_crud)
+    add_route(AutomationSchedule.topic_command, AutomationSchedule.on_message_crud)
+    add_route(AutomationSchedule.mac_address_request_topic, AutomationSchedule.on_message_crud)
+    add_route(AutomationVoice.VOICE_CONTROL_COMMAND_TOPIC, AutomationVoice.on_local_message)
+
+    # Every engine answers its own available-device requests
+    for module in DEVICE_PLUGINS:
+        add_route("command_available_device", module.on_message_crud)
+
+    return routes
+
+def attach_plugins(client):
+    """Point every plugin at the shared client, error logger and device-state cache"""
+    global control_queue
+
+    # Relay commands go through one queue per client object; create it after
+    # connect_mqtt has set the client callbacks
+    if control_queue and control_queue.client is not client:
+        control_queue.stop()
+        control_queue = None
+    if client and control_queue is None:
+        control_queue = PublishQueue(client, "runtime")
+
+    for module in (AutomationLogic, AutomationValue, AutomationUnified, AutomationSchedule):
+        module.client_crud = client
+        module.client_control = client
+    AutomationVoice.mqtt_local = client
+
+    # Schedule and Voice keep their own dedicated error-log clients when run
+    # standalone; inside the runtime they share the unified logger instead.
+    AutomationSchedule.send_error_log = send_error_log
+    AutomationVoice.send_error_log = send_error_log
+
+    for module in DEVICE_PLUGINS:
+        module.device_states = device_states
+        module.control_queue = control_queue
+
+def load_plugin_configs():
+    """Load the configuration files of every hosted plugin"""
+    AutomationLogic.load_logic_config()
+    AutomationLogic.load_modular_devices()
+
+    AutomationValue.load_value_config()
+    AutomationValue.load_modbus_devices()
+    AutomationValue.load_modular_devices()
+
+    AutomationUnified.load_unified_config()
+    AutomationUnified.load_modbus_devices()
+    AutomationUnified.load_modular_devices()
+
+    AutomationSchedule.load_config()
+    AutomationSchedule.load_installed_devices()
+
+def check_broker_configs(mqtt_config):
+    """Log an error when a plugin's own MQTT config names a different broker.
+
+    Standalone, AutomationValue and AutomationUnified read the MODBUS_SNMP
+    config while the runtime connects every plugin with the MODULAR_I2C one.
+    """
+    reference = tuple(mqtt_config.get(field) for field in BROKER_CONFIG_FIELDS)
+    for module in (AutomationValue, AutomationUnified):
+        try:
+            with open(module.mqtt_config_file, 'r') as file:
+                plugin_config = json.load(file)
+        except (OSError, ValueError) as e:
+            log_simple(f"Cannot compare {module.__name__} MQTT config {module.mqtt_config_file}: {e}", "WARNING")
+            continue
+        if tuple(plugin_config.get(field) for field in BROKER_CONFIG_FIELDS) != reference:
+            message = (f"{module.__name__} MQTT config {module.mqtt_config_file} "
+                       f"({plugin_config.get('broker_address')}:{plugin_config.get('broker_port')}) differs from "
+                       f"{AutomationLogic.mqtt_config_file} ({mqtt_config.get('broker_address')}:{mqtt_config.get('broker_port')}); "
+                       f"the runtime uses the latter for every plugin")
+            log_simple(message, "ERROR")
+            send_error_log("check_broker_configs", message, ERROR_TYPE_MAJOR,
+                           {"plugin": module.__name__, "config_file": module.mqtt_config_file})
+
+# --- MQTT Callbacks ---
+def on_connect(client, userdata, flags, rc):
+    global runtime_broker_connected
+    if rc == 0:
+        runtime_broker_connected = True
+        log_simple("Runtime MQTT broker connected", "SUCCESS")
+        # A clean session drops subscriptions, so let every plugin subscribe again
+        for module in DEVICE_PLUGINS:
+            module.subscribed_topics.clear()
+    else:
+        runtime_broker_connected = False
+        log_simple(f"Runtime MQTT broker connection failed (code {rc})", "ERROR")
+
+    callbacks = (
+        AutomationLogic.on_connect_crud, AutomationLogic.on_connect_control,
+        AutomationValue.on_connect_crud, AutomationValue.on_connect_control,
+        AutomationUnified.on_connect_crud, AutomationUnified.on_connect_control,
+        AutomationSchedule.on_connect_crud, AutomationSchedule.on_connect_control,
+        AutomationVoice.on_local_connect,
+    )
+    for callback in callbacks:
+        try:
+            callback(client, userdata, flags, rc)
+        except Exception as e:
+            log_simple(f"Plugin connect handler {callback.__module__}.{callback.__name__} failed: {e}", "ERROR")
+            send_error_log("on_connect", f"Plugin connect handler failed: {e}", ERROR_TYPE_MAJOR, {"handler": f"{callback.__module__}.{callback.__name__}"})
+
+def on_disconnect(client, userdata, rc):
+    global runtime_broker_connected
+    runtime_broker_connected = False
+    if rc != 0:
+        log_simple("Runtime MQTT broker disconnected unexpectedly", "WARNING")
+
+    for module in (AutomationLogic, AutomationValue, AutomationUnified, AutomationSchedule):
+        module.on_disconnect_crud(client, userdata, rc)
+        module.on_disconnect_control(client, userdata, rc)
+    AutomationVoice.local_broker_connected = False
+
+def on_message(client, userdata, msg):
+    """Route a message to the owning plugin, decoding device payloads only once"""
+    try:
+        topic = msg.topic
+
+        handlers = command_routes.get(topic)
+        if handlers:
+            for handler in handlers:
+                handler(client, userdata, msg)
+            return
+
+        if topic in (AutomationValue.MODBUS_AVAILABLES_TOPIC, AutomationValue.MODULAR_AVAILABLES_TOPIC):
+            try:
+                available_devices = json.loads(msg.payload)
+                AutomationValue.handle_available_devices_update(client, available_devices)
+            except json.JSONDecodeError as e:
+                log_simple(f"Failed to parse available devices message JSON: {e}", "ERROR")
+            return
+
+        targets = [dispatch for module, dispatch in DEVICE_DISPATCHERS if topic in module.subscribed_topics]
+        if not targets:
+            return
+
+        decoded = decode_device_message(topic, msg.payload)
+        if decoded is None:
+            return
+
+        device_states[topic] = decoded["data"]
+        for dispatch in targets:
+            try:
+                dispatch(decoded)
+            except Exception as e:
+                log_simple(f"Error processing device message in {dispatch.__name__}: {e}", "ERROR")
+                send_error_log("on_message", f"Device message processing error: {e}", ERROR_TYPE_MINOR, {"topic": topic, "plugin": dispatch.__name__})
+
+    except Exception as e:
+        log_simple(f"Error handling runtime message: {e}", "ERROR")
+        send_error_log("on_message", f"Runtime message handling error: {e}", ERROR_TYPE_MINOR, {"topic": getattr(msg, 'topic', '')})
+
+# --- MQTT Client Setup ---
+def connect_mqtt(client_id, broker, port, username="", password=""):
+    """Create and connect the shared MQTT client"""
+    try:
+        client = mqtt.Client(client_id)
+        if username and password:
+            client.username_pw_set(username, password)
+
+        client.on_connect = on_connect
+        client.on_disconnect = on_disconnect
+        client.on_message = on_message
+
+        client.reconnect_delay_set(min_delay=1, max_delay=120)
+        client.connect(broker, port, keepalive=60)
+        return client
+
+    except Exception as e:
+        log_simple(f"Failed to connect to MQTT broker {broker}:{port} - {e}", "ERROR")
+        send_error_log("connect_mqtt", f"MQTT connection failed: {e}", ERROR_TYPE_CRITICAL, {"broker": broker, "port": port})
+        return None
+
+# --- Main Application ---
+def run():
+    global client_runtime, command_routes
+
+    print_startup_banner()
+
+    # All engines talk to the same broker; the modular config is the reference
+    log_simple("Loading configurations...")
+    mqtt_config = AutomationLogic.load_mqtt_config()
+    broker = mqtt_config.get('broker_address', '18.143.215.113')
+    port = int(mqtt_config.get('broker_port', 1883))
+    username = mqtt_config.get('username', '')
+    password = mqtt_config.get('password', '')
+
+    log_simple("Initializing unified error logger...")
+    error_logger = initialize_error_logger("AutomationRuntimeService", broker, port)
+
+    check_broker_configs(mqtt_config)
+
+    command_routes = build_command_routes()
+    attach_plugins(None)
+    load_plugin_configs()
+
+    log_simple("Connecting to Runtime MQTT broker...")
+    client_runtime = connect_mqtt(f'automation-runtime-{uuid.uuid4()}', broker, port, username, password)
+    if client_runtime:
+        attach_plugins(client_runtime)
+        client_runtime.loop_start()
+    else:
+        log_simple("Failed to connect to Runtime MQTT broker - will retry during runtime", "WARNING")
+
+    # Wait for connection
+    time.sleep(2)
+
+    print_success_banner()
+    print_broker_status(runtime_broker_connected)
+
+    if client_runtime:
+        log_simple("Setting up scheduled tasks...")
+        AutomationSchedule.schedule_control(client_runtime)
+
+    log_simple("Starting voice control publisher thread...")
+    voice_thread = threading.Thread(target=AutomationVoice.run_voice_publisher_loop, daemon=True)
+    voice_thread.start()
+
+    log_simple(f"Automation Runtime started with {len(command_routes)} command topics", "SUCCESS")
+
+    last_unified_check = 0
+    last_metrics_log = time.time()
+    last_metrics_submitted = 0
+
+    try:
+        while True:
+            now = time.time()
+
+            if client_runtime is None:
+                client_runtime = connect_mqtt(f'automation-runtime-{uuid.uuid4()}', broker, port, username, password)
+                if client_runtime:
+                    attach_plugins(client_runtime)
+                    client_runtime.loop_start()
+                    AutomationSchedule.reload_schedule(client_runtime)
+                    log_simple("Runtime MQTT client successfully recreated", "SUCCESS")
+            elif not client_runtime.is_connected():
+                log_simple("Attempting to reconnect Runtime client...", "WARNING")
+                try:
+                    client_runtime.reconnect()
+                except Exception:
+                    pass
+
+            if error_logger and error_logger.client and not error_logger.client.is_connected():
+                try:
+                    error_logger.client.reconnect()
+                except Exception:
+                    pass
+
+            if client_runtime and client_runtime.is_connected():
+                if now - last_unified_check >= UNIFIED_SCHEDULE_INTERVAL:
+                    last_unified_check = now
+                    AutomationUnified.check_schedule_triggers(client_runtime)
+
+            if now - last_metrics_log >= ACTION_METRICS_INTERVAL:
+                last_metrics_log = now
+                metrics = get_action_metrics()
+                if metrics['submitted'] != last_metrics_submitted or metrics['queue_depth']:
+                    last_metrics_submitted = metrics['submitted']
+                    log_simple(f"Action queue: depth={metrics['queue_depth']} max={metrics['max_depth']} "
+                               f"in_flight={metrics['in_flight']} done={metrics['completed']} "
+                               f"failed={metrics['failed']} dropped={metrics['dropped']}", "INFO")
+
+            # Schedule transitions only send commands when a desired state changes
+            AutomationSchedule.schedule_wakeup.clear()
+            wait_seconds = AutomationSchedule.run_pending_transitions(client_runtime)
+            AutomationSchedule.schedule_wakeup.wait(min(wait_seconds, MAIN_LOOP_INTERVAL))
+
+    except KeyboardInterrupt:
+        log_simple("Automation Runtime stopped by user", "WARNING")
+    except Exception as e:
+        log_simple(f"Critical error: {e}", "ERROR")
+        send_error_log("run", f"Critical runtime error: {e}", ERROR_TYPE_CRITICAL)
+    finally:
+        log_simple("Shutting down services...")
+        if control_queue:
+            control_queue.stop()
+        if client_runtime:
+            client_runtime.loop_stop()
+            client_runtime.disconnect()
+        if error_logger and error_logger.client:
+            error_logger.client.loop_stop()
+            error_logger.client.disconnect()
+        log_simple("Application terminated", "SUCCESS")
+
+if __name__ == '__main__':
+    run()
@@ -1,11 +1,13 @@
 import json
 import time
+import heapq
 import logging
 import uuid
-import schedule
-import subprocess
+import itertools
+import threading
+import HostIdentity
 from paho.mqtt import client as mqtt_client
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -60,9 +62,17 @@ client_control = None # For sending control commands to devices
 client_crud = None    # For handling configuration CRUD operations
 client_error_logger = None # Dedicated client for sending error logs to 18.143.215.113
 
-# --- Device state tracking ---
-device_states = {}  # Track current device states: {device_pin: {'on': timestamp, 'off': timestamp}}
-last_check_time = None  # Track last time we checked schedules
+# --- Schedule compiler state ---
+compiled_controls = {}  # (device_id, pin) -> compiled control entry
+transition_queue = []  # Priority queue of (next_transition_timestamp, sequence, (device_id, pin))
+sent_states = {}  # (device_id, pin) -> last state sent to the modular bus
+transition_sequence = itertools.count()  # Tie-breaker for transitions at the same instant
+schedule_lock = threading.Lock()
+schedule_wakeup = threading.Event()  # Set on config change or reconnect to wake the scheduler loop
+schedule_resync_needed = False  # Resend all desired states on the next loop iteration
+MAX_SCHEDULER_SLEEP = 5  # Upper bound on a scheduler sleep so reconnection is still checked
+
+DAYS_OF_WEEK = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 # --- Connection Status Tracking ---
 crud_broker_connected = False
@@ -286,8 +296,8 @@ def reload_schedule(client_control):
     try:
         load_config()  # Reload the configuration
         logger.info("Reloading schedule...")
-        schedule.clear()  # Clear existing schedule
-        schedule_control(client_control)  # Reschedule based on updated config
+        schedule_control(client_control)  # Recompile transitions from the updated config
+        request_schedule_resync()
     except Exception as e:
         send_error_log("reload_schedule", f"Failed to reload schedule: {e}", ERROR_TYPE_MINOR)
         logger.error(f"Failed to reload schedule: {e}")
@@ -329,6 +339,8 @@ def on_connect_control(client, userdata, flags, rc):
         if rc == 0:
             control_broker_connected = True
             log_simple("Control MQTT broker connected", "SUCCESS")
+            # State may have drifted while we were offline
+            request_schedule_resync()
         else:
             control_broker_connected = False
             connect_reason = mqtt_client.connack_string(rc)
@@ -422,6 +434,8 @@ def handle_message(client, message):
         elif action in ['set', 'add', 'delete']:
             modify_config(client, message)
             publish_response(client, f"{action.capitalize()} successful", True)
+            schedule_control(client_control)
+            request_schedule_resync()
         elif action == 'get_devices':
             # Send available devices to dedicated topic
             send_available_devices(client)
@@ -436,34 +450,20 @@ def handle_message(client, message):
 
 def get_active_mac_address():
     """Get MAC address from active network interface (prioritize eth0, then wlan0)"""
-    import subprocess
-
     # Priority: eth0 (Ethernet) > wlan0 (WiFi) for consistency with other automation services
-    interfaces = ['eth0', 'wlan0']
-
-    for interface in interfaces:
-        try:
-            result = subprocess.run(['cat', f'/sys/class/net/{interface}/address'],
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                mac_address = result.stdout.strip()
-                # Validate MAC address format
-                if len(mac_address.split(':')) == 6:
-                    log_simple(f"Found active MAC address from {interface}: {mac_address}", "SUCCESS")
-                    return mac_address
-        except (subprocess.TimeoutExpired, FileNotFoundError, Exception) as e:
-            log_simple(f"Failed to get MAC from {interface}: {e}", "WARNING")
-            continue
+    # Resolved once and cached by HostIdentity until the network changes
+    mac_address = HostIdentity.get_active_mac_address(('eth0', 'wlan0'))
+    if mac_address != HostIdentity.DEFAULT_MAC:
+        return mac_address
 
     # Fallback to Python uuid method
     try:
-        import uuid
         mac = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff) for elements in range(0, 2*6, 2)][::-1])
         log_simple(f"Using fallback MAC address from uuid: {mac}", "WARNING")
         return mac
     except Exception as e:
         log_simple(f"Failed to get fallback MAC address: {e}", "ERROR")
-        return "00:00:00:00:00:00"
+        return HostIdentity.DEFAULT_MAC
 
 def handle_mac_address_request(client, msg):
     """Handle MAC address request and send response"""
@@ -617,12 +617,14 @@ def publish_crud(client, msg, topic):
 def publish_control(client, msg, topic):
     try:
         if client and client.is_connected():
-            client.publish(topic, msg)
+            result = client.publish(topic, msg)
+            return result.rc == mqtt_client.MQTT_ERR_SUCCESS
         else:
             logger.warning(f"Control client not connected, unable to publish to {topic}: {msg}")
             send_error_log("publish_control", f"Control client disconnected, failed to publish.", ERROR_TYPE_WARNING, {"topic": topic, "message_preview": msg[:100]})
     except Exception as e:
         send_error_log("publish_control", f"Failed to publish control message: {e}", ERROR_TYPE_CRITICAL, {"topic": topic})
+    return False
 
 def publish_response(client, message, success):
     try:
@@ -643,98 +645,192 @@ def parse_time(time_string):
         except ValueError as e:
             raise ValueError(f"Invalid time format: {time_string}. Expected 'HH:MM' or 'HH:MM AM/PM'.") from e
 
-def check_and_send_immediate_control(client_control):
-    """Check current time and send immediate control signals if within scheduled windows"""
-    try:
-        if not config or not isinstance(config, list) or len(config) == 0:
-            return
+def compile_schedule():
+    """Compile the device config into per-pin control entries with pre-parsed times.
 
-        current_time = datetime.now()
-        current_day = current_time.strftime("%a")
-        current_time_str = current_time.strftime('%H:%M')
+    Times are parsed and day filters resolved once per config load, so the
+    scheduler loop only compares minutes-of-day and weekday indexes.
+    """
+    compiled = {}
+
+    if not config or not isinstance(config, list) or len(config) == 0:
+        logger.info("No devices configured in automationSchedulerConfig.json to schedule.")
+        return compiled
+
+    for device in config:
+        # Basic validation for required keys in device config
+        if 'id' not in device or 'startDay' not in device or 'endDay' not in device or 'controls' not in device:
+            device_name = device.get('customName', device.get('name', device.get('id', 'unknown_id')))
+            logger.warning(f"Skipping malformed device entry in config: {device_name}")
+            send_error_log("compile_schedule", f"Malformed device entry - missing required fields", ERROR_TYPE_WARNING, {"device_name": device_name, "device_id": device.get('id', 'unknown')})
+            continue
 
-        logger.info(f"Checking immediate control for current time: {current_time_str} on {current_day}")
+        if not isinstance(device['controls'], list):
+            device_name = device.get('customName', device.get('name', device.get('id', 'unknown_id')))
+            logger.warning(f"Device {device['id']} has malformed 'controls' entry. Skipping scheduling for it.")
+            send_error_log("compile_schedule", f"Device has malformed controls - not a list", ERROR_TYPE_WARNING, {"device_id": device['id'], "device_name": device_name})
+            continue
 
-        for device in config:
-            if not device.get('autoControl', True):
-                continue
+        if not device.get('autoControl', True):
+            continue
 
-            if not is_within_active_days(device, current_day):
+        active_days = frozenset(index for index, day in enumerate(DAYS_OF_WEEK) if is_within_active_days(device, day))
+
+        for control in device['controls']:
+            if 'onTime' not in control or 'offTime' not in control or 'pin' not in control:
+                logger.warning(f"Skipping malformed control entry for device {device['id']}: {control}")
+                send_error_log("compile_schedule", f"Malformed control entry for device pin.", ERROR_TYPE_WARNING, {"device_id": device['id'], "control_data": control})
+                continue
+            try:
+                on_time = parse_time(control['onTime'])
+                off_time = parse_time(control['offTime'])
+            except ValueError as control_e:
+                send_error_log("compile_schedule (time_parse_error)", f"Invalid time format in control: {control_e}", ERROR_TYPE_MINOR, {"device_id": device['id'], "control_data": control})
                 continue
 
-            for control in device['controls']:
+            key = (device['id'], control['pin'])
+            compiled[key] = {
+                "device": device,
+                "pin": control['pin'],
+                "on_minute": on_time.hour * 60 + on_time.minute,
+                "off_minute": off_time.hour * 60 + off_time.minute,
+                "active_days": active_days
+            }
+            logger.info(f"Compiled device '{device.get('customName', device.get('name', device['id']))}' pin {control['pin']} ON at {on_time.strftime('%H:%M')} and OFF at {off_time.strftime('%H:%M')}")
+
+    return compiled
+
+def desired_state(entry, now):
+    """Return 1/0 for the state a control should have at `now`, or None on a day
+    no window of it touches. An overnight window belongs to the day it starts on."""
+    weekday = now.weekday()
+    previous_day = (weekday - 1) % 7
+    active_days = entry["active_days"]
+    minute = now.hour * 60 + now.minute
+    on_minute = entry["on_minute"]
+    off_minute = entry["off_minute"]
+
+    if on_minute <= off_minute:
+        if weekday not in active_days:
+            return None
+        return 1 if on_minute <= minute < off_minute else 0
+
+    # Overnight window (e.g. 22:00-06:00): tonight's window starts today, the
+    # morning part is the tail of the window that started yesterday
+    if minute >= on_minute and weekday in active_days:
+        return 1
+    if minute < off_minute and previous_day in active_days:
+        return 1
+    if weekday in active_days or previous_day in active_days:
+        return 0
+    return None
+
+def next_transition(entry, now):
+    """Return the first instant after `now` at which the desired state can change.
+
+    Candidates are the ON time, the OFF time and midnight (where the day
+    filter can switch the control in or out of its active days).
+    """
+    today = datetime.combine(now.date(), datetime.min.time())
+    candidates = []
+    for day_offset in (0, 1):
+        base = today + timedelta(days=day_offset)
+        for minute in (entry["on_minute"], entry["off_minute"], 0):
+            when = base + timedelta(minutes=minute)
+            if when > now:
+                candidates.append(when)
+    return min(candidates)
+
+def schedule_control(client_control):
+    """Compile the config and rebuild the transition priority queue"""
+    global compiled_controls, transition_queue
+    try:
+        now = datetime.now()
+        compiled = compile_schedule()
+        queue = [(next_transition(entry, now).timestamp(), next(transition_sequence), key) for key, entry in compiled.items()]
+        heapq.heapify(queue)
+
+        with schedule_lock:
+            compiled_controls = compiled
+            transition_queue = queue
+            # Forget states of controls that no longer exist
+            for key in list(sent_states):
+                if key not in compiled:
+                    del sent_states[key]
+
+        if not compiled:
+            send_error_log("schedule_control", "No devices configured for scheduling", ERROR_TYPE_WARNING)
+        else:
+            log_simple(f"Compiled {len(compiled)} scheduled control(s)", "SUCCESS")
+        schedule_wakeup.set()
+    except Exception as e:
+        send_error_log("schedule_control", f"Unhandled error during scheduling: {e}", ERROR_TYPE_MAJOR)
+
+def apply_control_state(client_control, key, entry, now, force=False):
+    """Send the desired state for one control if it differs from the last state sent"""
+    state = desired_state(entry, now)
+    if state is None:
+        return
+    if not force and sent_states.get(key) == state:
+        return
+    if send_control_signal(client_control, entry["device"], entry["pin"], state):
+        sent_states[key] = state
+
+def check_and_send_immediate_control(client_control):
+    """Resync every scheduled control to its desired state (on reconnect or config change)"""
+    try:
+        now = datetime.now()
+        logger.info(f"Resyncing scheduled controls for {now.strftime('%H:%M')} on {now.strftime('%a')}")
+        with schedule_lock:
+            for key, entry in compiled_controls.items():
                 try:
-                    on_time = parse_time(control['onTime'])
-                    off_time = parse_time(control['offTime'])
-                    on_time_str = on_time.strftime('%H:%M')
-                    off_time_str = off_time.strftime('%H:%M')
-
-                    # Check if current time is within the on/off window
-                    if on_time_str <= current_time_str < off_time_str:
-                        # Should be ON
-                        logger.info(f"Current time {current_time_str} is within ON window ({on_time_str}-{off_time_str}) for device {device.get('id')} pin {control['pin']}")
-                        send_control_signal(client_control, device, control['pin'], 1)
-                    elif off_time_str <= current_time_str or current_time_str < on_time_str:
-                        # Should be OFF (before on_time or after off_time)
-                        logger.info(f"Current time {current_time_str} is within OFF window for device {device.get('id')} pin {control['pin']}")
-                        send_control_signal(client_control, device, control['pin'], 0)
+                    apply_control_state(client_control, key, entry, now, force=True)
                 except Exception as e:
-                    logger.warning(f"Error checking immediate control for device {device.get('id')} pin {control.get('pin')}: {e}")
+                    logger.warning(f"Error resyncing control for device {entry['device'].get('id')} pin {entry['pin']}: {e}")
     except Exception as e:
         logger.error(f"Error in check_and_send_immediate_control: {e}")
 
-def schedule_control(client_control):
-    try:
-        if not config or not isinstance(config, list) or len(config) == 0:
-            logger.info("No devices configured in automationSchedulerConfig.json to schedule.")
-            send_error_log("schedule_control", "No devices configured for scheduling", ERROR_TYPE_WARNING)
-            return
+def request_schedule_resync():
+    """Flag a full resync for the scheduler loop and wake it up"""
+    global schedule_resync_needed
+    schedule_resync_needed = True
+    schedule_wakeup.set()
 
-        current_day = datetime.now().strftime("%a")
-        scheduled_count = 0
+def run_pending_transitions(client_control):
+    """Process due transitions and return the seconds until the next one.
 
-        for device in config:
-            # Basic validation for required keys in device config
-            if 'id' not in device or 'startDay' not in device or 'endDay' not in device or 'controls' not in device:
-                device_name = device.get('customName', device.get('name', device.get('id', 'unknown_id')))
-                logger.warning(f"Skipping malformed device entry in config: {device_name}")
-                send_error_log("schedule_control", f"Malformed device entry - missing required fields", ERROR_TYPE_WARNING, {"device_name": device_name, "device_id": device.get('id', 'unknown')})
-                continue
+    Only controls whose desired state changed are written to the modular bus.
+    """
+    global schedule_resync_needed
 
-            if not isinstance(device['controls'], list):
-                device_name = device.get('customName', device.get('name', device.get('id', 'unknown_id')))
-                logger.warning(f"Device {device['id']} has malformed 'controls' entry. Skipping scheduling for it.")
-                send_error_log("schedule_control", f"Device has malformed controls - not a list", ERROR_TYPE_WARNING, {"device_id": device['id'], "device_name": device_name})
+    if not (client_control and client_control.is_connected()):
+        return MAX_SCHEDULER_SLEEP
+
+    if schedule_resync_needed:
+        schedule_resync_needed = False
+        check_and_send_immediate_control(client_control)
+
+    now = datetime.now()
+    now_ts = now.timestamp()
+    with schedule_lock:
+        while transition_queue and transition_queue[0][0] <= now_ts:
+            _, _, key = heapq.heappop(transition_queue)
+            entry = compiled_controls.get(key)
+            if entry is None:
                 continue
+            try:
+                apply_control_state(client_control, key, entry, now)
+            except Exception as e:
+                send_error_log("run_pending_transitions", f"Failed to apply scheduled transition: {e}", ERROR_TYPE_MINOR, {"device_id": key[0], "pin": key[1]})
+            heapq.heappush(transition_queue, (next_transition(entry, now).timestamp(), next(transition_sequence), key))
 
-            if is_within_active_days(device, current_day):
-                scheduled_count += 1
-                for control in device['controls']:
-                    if 'onTime' not in control or 'offTime' not in control or 'pin' not in control:
-                        logger.warning(f"Skipping malformed control entry for device {device['id']}: {control}")
-                        send_error_log("schedule_control", f"Malformed control entry for device pin.", ERROR_TYPE_WARNING, {"device_id": device['id'], "control_data": control})
-                        continue
-                    try:
-                        on_time = parse_time(control['onTime'])
-                        off_time = parse_time(control['offTime'])
-
-                        schedule.every().day.at(on_time.strftime('%H:%M')).do(
-                            send_control_signal, client_control, device, control['pin'], 1).tag(device['id'], control['pin'], 'on')
-                        schedule.every().day.at(off_time.strftime('%H:%M')).do(
-                            send_control_signal, client_control, device, control['pin'], 0).tag(device['id'], control['pin'], 'off')
-                        logger.info(f"Scheduled device '{device.get('customName', device.get('name', device['id']))}' pin {control['pin']} ON at {on_time.strftime('%H:%M')} and OFF at {off_time.strftime('%H:%M')}")
-                    except ValueError as control_e:
-                        send_error_log("schedule_control (time_parse_error)", f"Invalid time format in control: {control_e}", ERROR_TYPE_MINOR, {"device_id": device['id'], "control_data": control})
-                    except Exception as control_e:
-                        send_error_log("schedule_control (control_loop_exception)", f"Error scheduling control: {control_e}", ERROR_TYPE_MINOR, {"device_id": device['id'], "control_data": control})
-            else:
-                logger.info(f"Skipping scheduling for device '{device.get('customName', device.get('name', device['id']))}' on {current_day} as it is outside the active days ({device['startDay']}-{device['endDay']}).")
-    except Exception as e:
-        send_error_log("schedule_control", f"Unhandled error during scheduling: {e}", ERROR_TYPE_MAJOR)
+        if not transition_queue:
+            return MAX_SCHEDULER_SLEEP
+        return max(0.0, min(transition_queue[0][0] - now_ts, MAX_SCHEDULER_SLEEP))
 
 def is_within_active_days(device, current_day):
     try:
-        days_of_week = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        days_of_week = DAYS_OF_WEEK
         start_day = device.get('startDay')
         end_day = device.get('endDay')
 
@@ -765,15 +861,13 @@ def is_within_active_days(device, current_day):
         return False
 
 def send_control_signal(client, device, pin, data):
-    # BUG: config is an array, not a dict with 'autoControl'
-    # This check is broken and always allows sending
-    # Should be: if not device.get('autoControl', True):
+    """Publish a modular write for one pin; returns True if the command was handed to the broker"""
     device_name = device.get('customName', device.get('name', device.get('id', 'unknown')))
 
     if not device.get('autoControl', True):
         logger.info(f"Auto control is disabled for device. Not sending signal to {device_name}, pin {pin}, data {data}.")
         send_error_log("send_control_signal", f"Auto control disabled for device", ERROR_TYPE_WARNING, {"device_name": device_name, "device_id": device.get('id'), "pin": pin})
-        return
+        return False
 
     try:
         # Basic validation for critical device info
@@ -781,7 +875,7 @@ def send_control_signal(client, device, pin, data):
             missing_keys = [key for key in ['part_number', 'address', 'device_bus'] if key not in device]
             logger.error(f"Missing critical device information for sending control signal: {device_name}")
             send_error_log("send_control_signal", f"Missing critical device info: {', '.join(missing_keys)}", ERROR_TYPE_CRITICAL, {"device_name": device_name, "device_id": device.get('id', 'unknown'), "missing_keys": missing_keys})
-            return
+            return False
 
         # Get active MAC address instead of using potentially wrong config MAC
         active_mac = get_active_mac_address()
@@ -799,11 +893,14 @@ def send_control_signal(client, device, pin, data):
             "device_bus": device['device_bus'],
             "Timestamp": datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
         }
-        publish_control(client, json.dumps(message), "modular")
+        if not publish_control(client, json.dumps(message), "modular"):
+            return False
         logger.info(f"Sent control signal to {device_name}, pin {pin}, data {data} (using active MAC: {active_mac})")
         log_simple(f"Control signal sent: {device_name} pin {pin} → {bool(data)}", "SUCCESS")
+        return True
     except Exception as e:
         send_error_log("send_control_signal", f"Failed to send control signal: {e}", ERROR_TYPE_CRITICAL, {"device_name": device_name, "device_id": device.get('id', 'unknown'), "pin": pin, "data": data})
+        return False
 
 def run():
     global crud_broker_connected, control_broker_connected
@@ -856,8 +953,8 @@ def run():
     if client_control:
         log_simple("Setting up scheduled tasks...")
         schedule_control(client_control)
-        log_simple("Checking and sending immediate control signals...")
-        check_and_send_immediate_control(client_control)
+        log_simple("Requesting initial control resync...")
+        request_schedule_resync()
 
         # Log configuration status
         if config and len(config) > 0:
@@ -873,28 +970,6 @@ def run():
 
     log_simple("Scheduler service started successfully", "SUCCESS")
 
-    # Periodic state check - every 60 seconds check all scheduled devices
-    def periodic_schedule_check():
-        """Check all scheduled devices periodically to ensure they are in correct state"""
-        global last_check_time
-
-        current_time = time.time()
-        if last_check_time is None or (current_time - last_check_time) >= 60:  # Check every 60 seconds
-            last_check_time = current_time
-
-            try:
-                if client_control and client_control.is_connected() and config:
-                    log_simple("Running periodic schedule check...", "INFO")
-                    check_and_send_immediate_control(client_control)
-                    log_simple("Periodic schedule check completed", "SUCCESS")
-                elif not config:
-                    log_simple("No configured devices to check", "INFO")
-                else:
-                    log_simple("Control client not connected, skipping periodic check", "WARNING")
-            except Exception as e:
-                log_simple(f"Error during periodic schedule check: {e}", "ERROR")
-                send_error_log("periodic_schedule_check", f"Periodic check failed: {e}", ERROR_TYPE_MINOR)
-
     try:
         while True:
             # Handle reconnection for control client
@@ -912,9 +987,8 @@ def run():
                     if client_control:
                         client_control.loop_start()
                         log_simple("Control MQTT client successfully recreated", "SUCCESS")
-                        # Reschedule tasks and check immediate control if we got the control client back
+                        # Recompile transitions; the resync runs once the client connects
                         schedule_control(client_control)
-                        check_and_send_immediate_control(client_control)
                 except Exception as e:
                     send_error_log("run (recreate_control)", f"Failed to recreate Control MQTT client: {e}", ERROR_TYPE_WARNING)
 
@@ -946,11 +1020,10 @@ def run():
                     logger.error(f"Failed to force reconnect Error Logger MQTT client: {e}")
                     # Cannot send log here as logger is failing
 
-            # Periodic schedule state checking
-            periodic_schedule_check()
-
-            schedule.run_pending()
-            time.sleep(1)
+            # Sleep until the earliest transition, a config change or a reconnect
+            schedule_wakeup.clear()
+            wait_seconds = run_pending_transitions(client_control)
+            schedule_wakeup.wait(wait_seconds)
     except KeyboardInterrupt:
         log_simple("Scheduler service stopped by user", "WARNING")
     except Exception as e:
@@ -4,11 +4,13 @@ import threading
 import logging
 import uuid
 import operator
-import subprocess
 
 import paho.mqtt.client as mqtt
 from datetime import datetime, timedelta
 from ErrorLogger import initialize_error_logger, send_error_log, ERROR_TYPE_MINOR, ERROR_TYPE_MAJOR, ERROR_TYPE_CRITICAL, ERROR_TYPE_WARNING
+import HostIdentity
+from ActionDispatcher import submit_action, post_with_retry
+from PublishQueue import PublishQueue, PRIORITY_CONTROL
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -62,6 +64,7 @@ modbus_devices = []
 modular_devices = []
 subscribed_topics = set()  # Track subscribed device topics
 client_control = None  # For sending control commands to devices
+control_queue = None  # Priority publish queue in front of client_control
 client_crud = None     # For handling configuration CRUD operations
 client_error_logger = None  # For unified error logger MQTT client
 error_logger = None
@@ -105,64 +108,8 @@ ERROR_TYPE_WARNING = "WARNING"
 
 def get_active_mac_address():
     """Get MAC address from active network interface (prioritize eno2, then wlo1)"""
-    interfaces = ['eno2', 'wlo1']
-
-    # First try: Use ifconfig (most reliable on embedded systems)
-    try:
-        log_simple("Checking network interfaces with ifconfig", "INFO")
-        ifconfig_result = subprocess.run(['ifconfig'], capture_output=True, text=True, timeout=5)
-        if ifconfig_result.returncode == 0:
-            lines = ifconfig_result.stdout.split('\n')
-            current_interface = None
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith(' ') and not line.startswith('\t') and ':' in line:
-                    current_interface = line.split(':')[0].strip()
-                elif current_interface and current_interface in interfaces and 'ether ' in line:
-                    mac_match = line.split('ether ')[1].split()[0].strip()
-                    if len(mac_match.split(':')) == 6 and len(mac_match) == 17:
-                        interface_block_start = None
-                        for i, check_line in enumerate(lines):
-                            if check_line.strip().startswith(f'{current_interface}:'):
-                                interface_block_start = i
-                                break
-
-                        if interface_block_start is not None:
-                            flags_line = lines[interface_block_start].strip()
-                            if 'RUNNING' in flags_line:
-                                log_simple(f"Found active MAC address from {current_interface}: {mac_match}", "SUCCESS")
-                                return mac_match
-                            else:
-                                log_simple(f"Interface {current_interface} is not RUNNING", "WARNING")
-    except Exception as e:
-        log_simple(f"ifconfig method failed: {e}", "ERROR")
-
-    # Second try: Use sysfs method
-    for interface in interfaces:
-        try:
-            operstate_path = f'/sys/class/net/{interface}/operstate'
-            address_path = f'/sys/class/net/{interface}/address'
-
-            with open(operstate_path, 'r') as f:
-                operstate = f.read().strip()
-
-            if operstate == 'up':
-                with open(address_path, 'r') as f:
-                    mac_address = f.read().strip()
-
-                if len(mac_address.split(':')) == 6 and len(mac_address) == 17:
-                    log_simple(f"Found active MAC address from {interface} (sysfs): {mac_address}", "SUCCESS")
-                    return mac_address
-                else:
-                    log_simple(f"Invalid MAC format from {interface}: {mac_address}", "WARNING")
-            else:
-                log_simple(f"Interface {interface} operstate is {operstate}", "WARNING")
-        except (FileNotFoundError, PermissionError, Exception) as e:
-            log_simple(f"Failed to get MAC from {interface} (sysfs): {e}", "WARNING")
-            continue
-
-    log_simple("No active network interface found, using default MAC", "WARNING")
-    return "00:00:00:00:00:00"
+    # Resolved once and cached by HostIdentity until the network changes
+    return HostIdentity.get_active_mac_address(('eno2', 'wlo1'))
 
 # --- Configuration Management ---
 def load_mqtt_config():
@@ -1070,7 +1017,22 @@ def execute_unified_rule_actions_off(rule):
         send_error_log("execute_unified_rule_actions_off", f"Unified rule OFF action execution error: {e}", ERROR_TYPE_MINOR)
 
 def execute_relay_control(action):
-    """Execute relay control action with latching support"""
+    """Queue relay control action on the action dispatcher"""
+    # Commands for the same relay share a key so they are applied in order
+    relay_key = f"relay_{action.get('target_address', 0)}_{action.get('target_bus', 0)}_{action.get('relay_pin', 1)}"
+    if not submit_action('control_relay', publish_relay_control, action, key=relay_key):
+        log_simple("Action queue full, relay control dropped", "WARNING")
+
+def send_control_command(topic, payload):
+    """Publish a relay command ahead of queued traffic; False when it was dropped or refused"""
+    if control_queue:
+        return control_queue.publish(topic, payload, priority=PRIORITY_CONTROL)
+    # No queue in front of the client (e.g. a caller that only set client_control)
+    result = client_control.publish(topic, payload)
+    return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+def publish_relay_control(action):
+    """Publish relay control command with latching support (runs on an action worker)"""
     try:
         if not (client_control and client_control.is_connected()):
             log_simple("Control client not connected for relay action", "WARNING")
@@ -1119,8 +1081,9 @@ def execute_relay_control(action):
         }
 
         if client_control and client_control.is_connected():
-            client_control.publish(MODBUS_CONTROL_TOPIC, json.dumps(control_payload))
-            if is_latching:
+            if not send_control_command(MODBUS_CONTROL_TOPIC, json.dumps(control_payload)):
+                log_simple(f"Relay control for {target_device} pin {relay_pin} was dropped", "WARNING")
+            elif is_latching:
                 log_simple(f"Latched relay control sent: {target_device} pin {relay_pin} = {actual_value} (current state: {latched_relay_states[latch_key]})", "SUCCESS")
             else:
                 log_simple(f"Relay control sent: {target_device} pin {relay_pin} = {actual_value}", "SUCCESS")
@@ -1132,13 +1095,9 @@ def execute_relay_control(action):
         send_error_log("execute_relay_control", f"Relay control execution error: {e}", ERROR_TYPE_MINOR)
 
 def execute_send_message(action, rule):
-    """Execute send message action (WhatsApp only)"""
-    try:
-        execute_whatsapp_message(action, rule)
-
-    except Exception as e:
-        log_simple(f"Error executing send message: {e}", "ERROR")
-        send_error_log("execute_send_message", f"Send message execution error: {e}", ERROR_TYPE_MINOR)
+    """Queue send message action on the action dispatcher (WhatsApp only)"""
+    if not submit_action('send_message', execute_whatsapp_message, action, rule):
+        log_simple("Action queue full, message action dropped", "WARNING")
 
 def load_whatsapp_config():
     """Load WhatsApp configuration from file"""
@@ -1226,8 +1185,6 @@ def process_action_timers():
 def execute_whatsapp_message(action, rule):
     """Execute WhatsApp message action using Qontak API"""
     try:
-        import requests
-
         whatsapp_config = load_whatsapp_config()
 
         to_number = action.get('whatsapp_number', '')
@@ -1271,7 +1228,13 @@ def execute_whatsapp_message(action, rule):
             "Content-Type": "application/json"
         }
 
-        response = requests.post(whatsapp_config.get('api_url'), json=whatsapp_payload, headers=headers, timeout=timeout)
+        # Pooled session, retrying transient failures
+        response = post_with_retry(
+            whatsapp_config.get('api_url'),
+            retry_attempts=whatsapp_config.get('retry_attempts', 3),
+            retry_delay=whatsapp_config.get('retry_delay', 5),
+            json=whatsapp_payload, headers=headers, timeout=timeout
+        )
 
         if response.status_code == 200:
             log_simple(f"WhatsApp message sent to {to_number}: {message_text}", "SUCCESS")
@@ -1343,7 +1306,7 @@ def connect_mqtt(client_id, broker, port, username="", password="", on_connect_c
 
 # --- Main Application ---
 def run():
-    global client_control, client_crud, client_error_logger
+    global client_control, client_crud, client_error_logger, control_queue
 
     print_startup_banner()
 
@@ -1388,6 +1351,8 @@ def run():
     if client_crud:
         client_crud.loop_start()
     if client_control:
+        # Relay commands go out ahead of anything else queued on this client
+        control_queue = PublishQueue(client_control, "control")
         client_control.loop_start()
 
     # Wait for connections
@@ -1434,6 +1399,8 @@ def run():
         send_error_log("run", f"Critical service error: {e}", ERROR_TYPE_CRITICAL)
     finally:
         log_simple("Shutting down services...")
+        if control_queue:
+            control_queue.stop()
         if client_control:
             client_control.loop_stop()
             client_control.disconnect()
@@ -4,10 +4,12 @@ import threading
 import logging
 import uuid
 import operator
-import subprocess
 import paho.mqtt.client as mqtt
 from datetime import datetime, timedelta
 from ErrorLogger import initialize_error_logger, send_error_log, ERROR_TYPE_MINOR, ERROR_TYPE_MAJOR, ERROR_TYPE_CRITICAL, ERROR_TYPE_WARNING
+import HostIdentity
+from ActionDispatcher import submit_action, post_with_retry
+from PublishQueue import PublishQueue, PRIORITY_CONTROL
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -61,6 +63,7 @@ modbus_devices = []
 modular_devices = []
 subscribed_topics = set()  # Track subscribed device topics
 client_control = None  # For sending control commands to devices
+control_queue = None  # Priority publish queue in front of client_control
 client_crud = None     # For handling configuration CRUD operations
 client_error_logger = None  # For unified error logger MQTT client
 error_logger = None
@@ -110,86 +113,8 @@ ERROR_LOG_PORT = 1883
 def get_active_mac_address():
     """Get MAC address from active network interface (prioritize eth0, then wlan0)"""
     # Priority: eth0 (Ethernet) > wlan0 (WiFi) for consistency with other automation services
-    interfaces = ['eth0', 'wlan0']
-
-    # First try: Use ifconfig (most reliable on embedded systems)
-    try:
-        log_simple("Checking network interfaces with ifconfig", "INFO")
-        ifconfig_result = subprocess.run(['ifconfig'], capture_output=True, text=True, timeout=5)
-        if ifconfig_result.returncode == 0:
-            lines = ifconfig_result.stdout.split('\n')
-            current_interface = None
-            for line in lines:
-                line = line.strip()
-                # Look for interface name (line that starts with interface name)
-                if line and not line.startswith(' ') and not line.startswith('\t') and ':' in line:
-                    current_interface = line.split(':')[0].strip()
-                # Look for ether (MAC address) in the interface block
-                elif current_interface and current_interface in interfaces and 'ether ' in line:
-                    mac_match = line.split('ether ')[1].split()[0].strip()
-                    # Validate MAC address format
-                    if len(mac_match.split(':')) == 6 and len(mac_match) == 17:
-                        # Check if interface is RUNNING by looking for RUNNING flag in previous lines
-                        interface_block_start = None
-                        for i, check_line in enumerate(lines):
-                            if check_line.strip().startswith(f'{current_interface}:'):
-                                interface_block_start = i
-                                break
-
-                        if interface_block_start is not None:
-                            # Check the flags line (usually the line after interface name)
-                            flags_line = lines[interface_block_start].strip()
-                            if 'RUNNING' in flags_line:
-                                log_simple(f"Found active MAC address from {current_interface}: {mac_match}", "SUCCESS")
-                                return mac_match
-                            else:
-                                log_simple(f"Interface {current_interface} is not RUNNING", "WARNING")
-    except Exception as e:
-        log_simple(f"ifconfig method failed: {e}", "ERROR")
-
-    # Second try: Use sysfs method
-    for interface in interfaces:
-        try:
-            # Check if interface exists and is up
-            operstate_path = f'/sys/class/net/{interface}/operstate'
-            address_path = f'/sys/class/net/{interface}/address'
-
-            # Check operstate
-            with open(operstate_path, 'r') as f:
-                operstate = f.read().strip()
-
-            if operstate == 'up':
-                # Get MAC address
-                with open(address_path, 'r') as f:
-                    mac_address = f.read().strip()
-
-                # Validate MAC address format
-                if len(mac_address.split(':')) == 6 and len(mac_address) == 17:
-                    log_simple(f"Found active MAC address from {interface} (sysfs): {mac_address}", "SUCCESS")
-                    return mac_address
-                else:
-                    log_simple(f"Invalid MAC format from {interface}: {mac_address}", "WARNING")
-            else:
-                log_simple(f"Interface {interface} operstate is {operstate}", "WARNING")
-        except (FileNotFoundError, PermissionError, Exception) as e:
-            log_simple(f"Failed to get MAC from {interface} (sysfs): {e}", "WARNING")
-            continue
-
-    # Third try: Use getmac library as fallback
-    try:
-        import getmac
-        mac_address = getmac.get_mac_address()
-        if mac_address and mac_address != "00:00:00:00:00:00":
-            log_simple(f"Found MAC address using getmac library: {mac_address}", "SUCCESS")
-            return mac_address
-    except ImportError:
-        log_simple("getmac library not available", "WARNING")
-    except Exception as e:
-        log_simple(f"getmac library method failed: {e}", "WARNING")
-
-    # Fallback to default if no active interface found
-    log_simple("No active network interface found, using default MAC", "WARNING")
-    return "00:00:00:00:00:00"
+    # Resolved once and cached by HostIdentity until the network changes
+    return HostIdentity.get_active_mac_address(('eth0', 'wlan0'))
 
 # --- Configuration Management ---
 def load_mqtt_config():
@@ -1091,7 +1016,22 @@ def execute_rule_actions_off(rule):
         send_error_log("execute_rule_actions_off", f"Rule OFF action execution error: {e}", ERROR_TYPE_MINOR)
 
 def execute_relay_control(action):
-    """Execute relay control action"""
+    """Queue relay control action on the action dispatcher"""
+    # Commands for the same relay share a key so they are applied in order
+    relay_key = f"relay_{action.get('target_address', 0)}_{action.get('target_bus', 0)}_{action.get('relay_pin', 1)}"
+    if not submit_action('control_relay', publish_relay_control, action, key=relay_key):
+        log_simple("Action queue full, relay control dropped", "WARNING")
+
+def send_control_command(topic, payload):
+    """Publish a relay command ahead of queued traffic; False when it was dropped or refused"""
+    if control_queue:
+        return control_queue.publish(topic, payload, priority=PRIORITY_CONTROL)
+    # No queue in front of the client (e.g. a caller that only set client_control)
+    result = client_control.publish(topic, payload)
+    return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+def publish_relay_control(action):
+    """Publish relay control command (runs on an action worker)"""
     try:
         if not (client_control and client_control.is_connected()):
             log_simple("Control client not connected for relay action", "WARNING")
@@ -1123,9 +1063,11 @@ def execute_relay_control(action):
 
         # Add connection check for safety
         if client_control and client_control.is_connected():
-            client_control.publish(MODBUS_CONTROL_TOPIC, json.dumps(control_payload))
             relay_state = "ON" if target_value else "OFF"
-            log_simple(f"Relay {target_device}[{relay_pin}] set to {relay_state}", "SUCCESS")
+            if send_control_command(MODBUS_CONTROL_TOPIC, json.dumps(control_payload)):
+                log_simple(f"Relay {target_device}[{relay_pin}] set to {relay_state}", "SUCCESS")
+            else:
+                log_simple(f"Relay control {target_device}[{relay_pin}] = {relay_state} was dropped", "WARNING")
         else:
             log_simple("Control client not connected, cannot send relay control command", "WARNING")
 
@@ -1134,14 +1076,9 @@ def execute_relay_control(action):
         send_error_log("execute_relay_control", f"Relay control execution error: {e}", ERROR_TYPE_MINOR)
 
 def execute_send_message(action, rule):
-    """Execute send message action (WhatsApp only)"""
-    try:
-        # Always use WhatsApp for send_message actions
-        execute_whatsapp_message(action, rule)
-
-    except Exception as e:
-        log_simple(f"Error executing send message: {e}", "ERROR")
-        send_error_log("execute_send_message", f"Send message execution error: {e}", ERROR_TYPE_MINOR)
+    """Queue send message action on the action dispatcher (WhatsApp only)"""
+    if not submit_action('send_message', execute_whatsapp_message, action, rule):
+        log_simple("Action queue full, message action dropped", "WARNING")
 
 def load_whatsapp_config():
     """Load WhatsApp configuration from file"""
@@ -1179,8 +1116,6 @@ def load_whatsapp_config():
 def execute_whatsapp_message(action, rule):
     """Execute WhatsApp message action using Qontak API"""
     try:
-        import requests
-
         # Load WhatsApp configuration
         whatsapp_config = load_whatsapp_config()
 
@@ -1228,8 +1163,13 @@ def execute_whatsapp_message(action, rule):
             "Content-Type": "application/json"
         }
 
-        # Send WhatsApp message
-        response = requests.post(whatsapp_config.get('api_url'), json=whatsapp_payload, headers=headers, timeout=timeout)
+        # Send WhatsApp message over the pooled session, retrying transient failures
+        response = post_with_retry(
+            whatsapp_config.get('api_url'),
+            retry_attempts=whatsapp_config.get('retry_attempts', 3),
+            retry_delay=whatsapp_config.get('retry_delay', 5),
+            json=whatsapp_payload, headers=headers, timeout=timeout
+        )
 
         if response.status_code == 200:
             log_simple(f"WhatsApp message sent to {to_number}: {message_text}", "SUCCESS")
@@ -1270,7 +1210,7 @@ def connect_mqtt(client_id, broker, port, username="", password="", on_connect_c
 
 # --- Main Application ---
 def run():
-    global client_control, client_crud, client_error_logger
+    global client_control, client_crud, client_error_logger, control_queue
 
     print_startup_banner()
 
@@ -1316,6 +1256,8 @@ def run():
     if client_crud:
         client_crud.loop_start()
     if client_control:
+        # Relay commands go out ahead of anything else queued on this client
+        control_queue = PublishQueue(client_control, "control")
         client_control.loop_start()
 
     # Wait for connections
@@ -1352,6 +1294,8 @@ def run():
         send_error_log("run", f"Critical service error: {e}", ERROR_TYPE_CRITICAL)
     finally:
         log_simple("Shutting down services...")
+        if control_queue:
+            control_queue.stop()
         if client_control:
             client_control.loop_stop()
             client_control.disconnect()
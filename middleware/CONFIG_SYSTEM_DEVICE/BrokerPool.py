@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Broker Connection Pool
+Keeps one persistent MQTT connection per (broker URL, credentials) with
+keepalive and automatic reconnect, and a bounded per-broker priority publish
+queue (see PublishQueue) drained by a sender thread. Services publish through
+the pool instead of connecting and disconnecting for every message.
+"""
+
+import uuid
+import logging
+import threading
+from typing import Dict, Any, Iterable, Tuple
+
+import paho.mqtt.client as mqtt
+
+from PublishQueue import PublishQueue, PRIORITY_TELEMETRY
+
+logger = logging.getLogger("BrokerPool")
+
+# --- Configuration ---
+DEFAULT_BROKER_URL = "mqtt://18.143.215.113:1883"
+DEFAULT_PORT = 1883
+DEFAULT_KEEPALIVE = 60
+DEFAULT_QUEUE_SIZE = 100  # per broker; telemetry is coalesced / dropped first when full
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 120
+
+
+def parse_broker_url(broker_url: str, default_port: int = DEFAULT_PORT) -> Tuple[str, int]:
+    """Parse 'mqtt://host:port' (or 'host:port') into (host, port)"""
+    broker_part = broker_url or DEFAULT_BROKER_URL
+    if '://' in broker_part:
+        broker_part = broker_part.split('://', 1)[1]
+    broker_part = broker_part.rstrip('/')
+    if ':' in broker_part:
+        host, port = broker_part.rsplit(':', 1)
+        return host, int(port)
+    return broker_part, default_port
+
+
+class PooledBroker:
+    """A persistent connection to one broker with its own publish queue"""
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 client_id: str = "", keepalive: int = DEFAULT_KEEPALIVE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.connected = False
+
+        self.client = mqtt.Client(client_id or f"pool-{uuid.uuid4()}", clean_session=True)
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.reconnect_delay_set(min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY)
+        self.queue = PublishQueue(self.client, f"{host}:{port}", queue_size)
+
+        # connect_async + loop_start: the network thread connects and reconnects
+        # on its own, so callers never block on the broker
+        self.client.connect_async(host, port, keepalive=keepalive)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.connected = rc == 0
+        self.queue.notify()
+        if rc == 0:
+            logger.info(f"Pooled broker {self.host}:{self.port} connected")
+        else:
+            logger.warning(f"Pooled broker {self.host}:{self.port} connection failed (code {rc})")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        if rc != 0:
+            logger.warning(f"Pooled broker {self.host}:{self.port} disconnected unexpectedly")
+
+    def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False,
+                priority: int = PRIORITY_TELEMETRY) -> bool:
+        """Queue a message; returns False if it or an older message was dropped"""
+        return self.queue.publish(topic, payload, qos, retain, priority)
+
+    def queue_depth(self) -> int:
+        return self.queue.depth()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.queue.get_stats()
+        stats["connected"] = self.connected
+        return stats
+
+    def close(self):
+        self.queue.stop()
+        try:
+            self.client.loop_stop()
+            self.client.disconnect()
+        except Exception:
+            pass
+
+
+class BrokerPool:
+    """Pooled broker connections keyed by broker URL and credentials"""
+
+    def __init__(self, client_id_prefix: str = "pool", keepalive: int = DEFAULT_KEEPALIVE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.client_id_prefix = client_id_prefix
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self._brokers: Dict[Tuple[str, int, str, str], PooledBroker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(broker_url: str, username: str = "", password: str = "") -> Tuple[str, int, str, str]:
+        host, port = parse_broker_url(broker_url)
+        return host, port, username or "", password or ""
+
+    def get(self, broker_url: str, username: str = "", password: str = "") -> PooledBroker:
+        """Get the pooled connection for a broker, creating it on first use"""
+        key = self.make_key(broker_url, username, password)
+        with self._lock:
+            broker = self._brokers.get(key)
+            if broker is None:
+                host, port = key[0], key[1]
+                client_id = f"{self.client_id_prefix}-{host}-{port}-{uuid.uuid4().hex[:8]}"
+                broker = PooledBroker(host, port, key[2], key[3], client_id, self.keepalive, self.queue_size)
+                self._brokers[key] = broker
+                logger.info(f"Broker pool: opened connection to {host}:{port}")
+            return broker
+
+    def publish(self, broker_url: str, topic: str, payload: str, qos: int = 0, retain: bool = False,
+                username: str = "", password: str = "", priority: int = PRIORITY_TELEMETRY) -> bool:
+        """Queue a publish on the pooled connection for broker_url"""
+        return self.get(broker_url, username, password).publish(topic, payload, qos, retain, priority)
+
+    def retain_only(self, keys: Iterable[Tuple[str, int, str, str]]):
+        """Close pooled connections whose key is no longer in use"""
+        keep = set(keys)
+        with self._lock:
+            stale = [key for key in self._brokers if key not in keep]
+            brokers = [self._brokers.pop(key) for key in stale]
+        for broker in brokers:
+            logger.info(f"Broker pool: closing unused connection to {broker.host}:{broker.port}")
+            broker.close()
+
+    def close_all(self):
+        self.retain_only(())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            brokers = list(self._brokers.values())
+        return {f"{b.host}:{b.port}": b.get_stats() for b in brokers}
@@ -1,6 +1,8 @@
+import os
 import json
 import logging
 import paho.mqtt.client as mqtt
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import time
@@ -8,8 +10,35 @@ import threading
 from BrokerTemplateManager import BrokerTemplateManager
 from ErrorLogger import initialize_error_logger, send_error_log, ERROR_TYPE_MINOR, ERROR_TYPE_MAJOR, ERROR_TYPE_CRITICAL, ERROR_TYPE_WARNING
 
+# --- Connection health ---
+EWMA_ALPHA = 0.2  # weight of the newest sample
+ACK_TIMEOUT = 10  # seconds before an unacknowledged publish counts as failed
+HEALTHY_SUCCESS_RATE = 0.5  # EWMA of publish acks below this marks a connection unhealthy
+LATENCY_REFERENCE = 2.0  # seconds of ack latency that halves the health score
+IDLE_CONNECTION_TIMEOUT = 600  # seconds without use before a connection is closed
+PROBE_INTERVAL = 30  # seconds between trial publishes through an unhealthy but connected broker
+
+# --- Retry queue ---
+RETRY_INTERVAL = 1  # seconds between retry passes
+RETRY_MAX_AGE = 60  # seconds a queued publish is kept before it is dropped
+RETRY_QUEUE_SIZE = 500  # queued topics; latest payload per topic wins
+
+# --- publish_to_topic results ---
+PUBLISH_SENT = "sent"  # handed to a healthy broker
+PUBLISH_QUEUED = "queued"  # no healthy broker; the resolver retries it in the background
+PUBLISH_FAILED = "failed"  # not sent and not queued; the caller may retry
+
 class BrokerConnection:
-    """Represents a single broker connection with health monitoring"""
+    """
+    A single broker connection with health monitoring.
+
+    The connection is opened with connect_async and kept up by paho's
+    network thread, so no caller ever waits on a connect. Health is an EWMA
+    of publish acknowledgements (1 = acked, 0 = failed or timed out) and of
+    ack latency. The EWMAs start over on every (re)connect, and an unhealthy
+    but connected broker is still offered one probe publish every
+    PROBE_INTERVAL seconds, so it can earn its health back.
+    """
 
     def __init__(self, broker_config: Dict[str, Any], template_id: str = ""):
         self.broker_config = broker_config
@@ -17,175 +46,178 @@ class BrokerConnection:
         self.client: Optional[mqtt.Client] = None
         self.connected = False
         self.last_connected: Optional[datetime] = None
+        self.started_at: Optional[float] = None
+        self.last_used = time.time()
         self.connection_attempts = 0
         self.last_error: Optional[str] = None
-        self.response_times: List[float] = []
-        self.lock = threading.Lock()
-
-    def connect(self) -> bool:
-        """Establish connection to broker"""
-        try:
+        self.ack_rate = 1.0  # EWMA of publish acknowledgements
+        self.ack_latency = 0.0  # EWMA of seconds from publish to ack
+        self._inflight: Dict[int, float] = {}  # mid -> publish time
+        self._last_probe = 0.0
+        # Reentrant: paho may call on_publish from inside publish() when no loop thread runs
+        self.lock = threading.RLock()
+
+    def start(self):
+        """Begin connecting in the background (idempotent)"""
+        with self.lock:
+            if self.client is not None:
+                return
+
+            client_id = f"payload_static_{self.template_id}_{int(time.time())}"
+            self.started_at = time.time()
+            self.client = mqtt.Client(client_id=client_id, clean_session=True)
+
+            # Set up credentials if provided
+            if self.broker_config.get('username'):
+                self.client.username_pw_set(
+                    self.broker_config['username'],
+                    self.broker_config.get('password', '')
+                )
+
+            # Set up TLS if required
+            if self.broker_config.get('ssl', False):
+                self.client.tls_set()
+
+            reconnect_period = self.broker_config.get('reconnect_period', 3)
+            self.client.reconnect_delay_set(min_delay=reconnect_period, max_delay=max(reconnect_period, 120))
+            self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
+            self.client.on_publish = self._on_publish
+
+            try:
+                print(f"🔄 Connecting to {self.broker_config['host']}:{self.broker_config['port']}...")
+                self.connection_attempts += 1
+                self.client.connect_async(
+                    self.broker_config['host'],
+                    self.broker_config['port'],
+                    keepalive=self.broker_config.get('keepalive', 60)
+                )
+                self.client.loop_start()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Broker {self.template_id} connection error: {e}")
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
             with self.lock:
-                if self.connected and self.client and self.client.is_connected():
-                    return True
-
-                client_id = f"payload_static_{self.template_id}_{int(time.time())}"
-
-                self.client = mqtt.Client(client_id=client_id, clean_session=True)
-
-                # Set up credentials if provided
-                if self.broker_config.get('username'):
-                    self.client.username_pw_set(
-                        self.broker_config['username'],
-                        self.broker_config.get('password', '')
-                    )
-
-                # Set up TLS if required
-                if self.broker_config.get('ssl', False):
-                    self.client.tls_set()
-
-                # Connection timeout
-                connect_timeout = self.broker_config.get('connect_timeout', 10)
-
-                # Attempt connection
-                start_time = time.time()
-                connected = False
-
-                def on_connect(client, userdata, flags, rc):
-                    nonlocal connected
-                    if rc == 0:
-                        connected = True
-                        print(f"✅ Broker {self.template_id} connected successfully")
-                    else:
-                        print(f"❌ Broker {self.template_id} connection failed with code: {rc}")
-
-                self.client.on_connect = on_connect
-
-                try:
-                    print(f"🔄 Connecting to {self.broker_config['host']}:{self.broker_config['port']}...")
-                    self.client.connect(
-                        self.broker_config['host'],
-                        self.broker_config['port'],
-                        keepalive=self.broker_config.get('keepalive', 60)
-                    )
-
-                    # Start network loop
-                    self.client.loop_start()
-
-                    # Wait for connection with timeout
-                    timeout = connect_timeout
-                    while timeout > 0 and not connected:
-                        time.sleep(0.1)
-                        timeout -= 0.1
-
-                    if connected:
-                        self.connected = True
-                        self.last_connected = datetime.now()
-                        self.connection_attempts += 1
-                        self.last_error = None
-
-                        # Record response time
-                        response_time = time.time() - start_time
-                        self.response_times.append(response_time)
-
-                        # Keep only last 10 response times
-                        if len(self.response_times) > 10:
-                            self.response_times.pop(0)
-
-                        print(f"✅ Broker {self.template_id} connection established")
-                        return True
-                    else:
-                        self.last_error = f"Connection timeout after {connect_timeout}s"
-                        print(f"❌ Broker {self.template_id} connection timeout")
-                        return False
-
-                except Exception as e:
-                    self.last_error = str(e)
-                    print(f"❌ Broker {self.template_id} connection error: {e}")
-                    return False
-
-        except Exception as e:
-            print(f"❌ Error in connect for {self.template_id}: {e}")
-            self.last_error = str(e)
-            return False
+                # A new session: judge it on its own acks, not the old link's
+                self.ack_rate = 1.0
+                self._inflight.clear()
+            self.connected = True
+            self.last_connected = datetime.now()
+            self.last_error = None
+            print(f"✅ Broker {self.template_id} connected successfully")
+        else:
+            self.connected = False
+            self.connection_attempts += 1
+            self.last_error = f"Connection failed with code: {rc}"
+            print(f"❌ Broker {self.template_id} connection failed with code: {rc}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        with self.lock:
+            # Publishes in flight when the link dropped will never be acked;
+            # the disconnect already marks the broker down, so do not count
+            # them as failures against the next session
+            self._inflight.clear()
+        if rc != 0:
+            self.connection_attempts += 1
+            self.last_error = f"Disconnected unexpectedly with code: {rc}"
+
+    def _on_publish(self, client, userdata, mid):
+        with self.lock:
+            sent_at = self._inflight.pop(mid, None)
+            if sent_at is not None:
+                self._record(True, time.time() - sent_at)
+
+    def _record(self, acked: bool, latency: Optional[float] = None):
+        """Update the EWMAs (caller holds the lock)"""
+        self.ack_rate = EWMA_ALPHA * (1.0 if acked else 0.0) + (1 - EWMA_ALPHA) * self.ack_rate
+        if latency is not None:
+            self.ack_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ack_latency
+
+    def _expire_inflight(self):
+        """Count publishes that were never acknowledged as failures"""
+        now = time.time()
+        with self.lock:
+            expired = [mid for mid, sent_at in self._inflight.items() if now - sent_at > ACK_TIMEOUT]
+            for mid in expired:
+                del self._inflight[mid]
+                self._record(False)
 
     def disconnect(self):
         """Disconnect from broker"""
         with self.lock:
-            if self.client and self.connected:
-                self.client.loop_stop()
-                self.client.disconnect()
-                self.connected = False
+            client, self.client = self.client, None
+            self.connected = False
+            self._inflight.clear()
+        if client:
+            client.loop_stop()
+            client.disconnect()
 
     def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False) -> bool:
-        """Publish message to broker"""
+        """Publish message to broker without waiting; False when not connected or rejected"""
+        client = self.client
+        if not self.connected or not client:
+            return False
         try:
-            if not self.connected or not self.client:
-                if not self.connect():
-                    return False
-
-            start_time = time.time()
-            result = self.client.publish(topic, payload, qos=qos, retain=retain)
-
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                # Record response time
-                response_time = time.time() - start_time
-                self.response_times.append(response_time)
-                if len(self.response_times) > 10:
-                    self.response_times.pop(0)
-                return True
-            else:
-                self.last_error = f"Publish failed with code: {result.rc}"
-                return False
+            with self.lock:
+                result = client.publish(topic, payload, qos=qos, retain=retain)
+                if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self._inflight[result.mid] = time.time()
+                    return True
+                self._record(False)
+            self.last_error = f"Publish failed with code: {result.rc}"
+            return False
 
         except Exception as e:
             self.last_error = str(e)
             return False
 
+    def is_connecting(self) -> bool:
+        """True while the first connect attempt is still within its timeout"""
+        if self.connected or self.client is None or self.last_error or self.started_at is None:
+            return False
+        timeout = self.broker_config.get('connection_timeout', self.broker_config.get('connect_timeout', 10))
+        return time.time() - self.started_at < timeout
+
     def is_healthy(self) -> bool:
         """Check if broker connection is healthy"""
         if not self.connected:
             return False
+        self._expire_inflight()
+        return self.ack_rate >= HEALTHY_SUCCESS_RATE
 
-        # Check if connection is too old (no ping for 2 minutes)
-        if self.last_connected:
-            time_since_last_connection = datetime.now() - self.last_connected
-            if time_since_last_connection.total_seconds() > 120:
-                return False
-
-        # Check average response time (should be < 5 seconds)
-        if self.response_times:
-            avg_response_time = sum(self.response_times) / len(self.response_times)
-            if avg_response_time > 5.0:
+    def accepts_publish(self) -> bool:
+        """Healthy, or unhealthy but connected and due a probe publish"""
+        if self.is_healthy():
+            return True
+        if not self.connected:
+            return False
+        with self.lock:
+            now = time.time()
+            if now - self._last_probe < PROBE_INTERVAL:
                 return False
-
-        return True
+            self._last_probe = now
+            return True
 
     def get_health_score(self) -> float:
-        """Get health score (0-100)"""
+        """Get health score (0-100) from the ack-rate and latency EWMAs"""
         if not self.connected:
             return 0.0
-
-        score = 100.0
-
-        # Penalize for connection attempts
-        if self.connection_attempts > 5:
-            score -= min(50, self.connection_attempts * 5)
-
-        # Penalize for slow response times
-        if self.response_times:
-            avg_response = sum(self.response_times) / len(self.response_times)
-            if avg_response > 2.0:
-                score -= min(30, avg_response * 5)
-
-        # Penalize for recent errors
-        if self.last_error:
-            score -= 20
-
-        return max(0.0, score)
+        self._expire_inflight()
+        return round(100.0 * self.ack_rate * LATENCY_REFERENCE / (LATENCY_REFERENCE + self.ack_latency), 1)
 
 class BrokerResolver:
-    """Advanced broker resolver with template support and health monitoring"""
+    """
+    Advanced broker resolver with template support and health monitoring.
+
+    Connections for a topic's primary, fallback, alternative and local
+    brokers are created once and connect in the background. A publish goes
+    straight to the first healthy connection in that order; when none is
+    healthy the message is queued (latest payload per topic) and retried by
+    a background thread, so a dead broker never blocks the caller.
+    """
 
     def __init__(self, payload_config_file: str = "./JSON/payloadStaticConfig.json"):
         self.payload_config_file = payload_config_file
@@ -193,24 +225,51 @@ class BrokerResolver:
         self.broker_connections: Dict[str, BrokerConnection] = {}
         self.logger = logging.getLogger("BrokerResolver")
         self.lock = threading.Lock()
+        self._payloads: List[Dict[str, Any]] = []
+        self._payloads_stamp = None
+        self._payloads_lock = threading.Lock()
+        self._retry_queue: "OrderedDict[str, Tuple[str, Dict[str, Any], float]]" = OrderedDict()
+        self._retry_lock = threading.Lock()
+        self.retry_dropped = 0
+        self._retry_thread = threading.Thread(target=self._retry_loop, name="BrokerResolverRetry", daemon=True)
+        self._retry_thread.start()
         # Initialize unified error logger
         self.error_logger = initialize_error_logger("BrokerResolverService")
 
+    def _get_payload_config(self, topic: str) -> Optional[Dict[str, Any]]:
+        """Find a topic's payload configuration; the file is re-read only when its mtime changes"""
+        with self._payloads_lock:
+            try:
+                stat = os.stat(self.payload_config_file)
+                stamp = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stamp = None
+            if stamp is None or stamp != self._payloads_stamp:
+                with open(self.payload_config_file, 'r') as f:
+                    config = json.load(f)
+                self._payloads = config.get('payloads', [])
+                self._payloads_stamp = stamp
+            payloads = self._payloads
+
+        for payload in payloads:
+            if payload.get('topic') == topic:
+                return payload
+        return None
+
+    def _get_connection(self, connection_key: str, broker_config: Dict[str, Any], template_id: str) -> BrokerConnection:
+        """Get the cached connection for a key; it is started when a publish first reaches it"""
+        with self.lock:
+            connection = self.broker_connections.get(connection_key)
+            if connection is None:
+                connection = BrokerConnection(broker_config, template_id)
+                self.broker_connections[connection_key] = connection
+        return connection
+
     def resolve_broker_for_topic(self, topic: str, payload_data: Dict[str, Any] = None) -> Optional[BrokerConnection]:
-        """Resolve the best broker for a specific topic"""
+        """Resolve the primary broker for a specific topic"""
         try:
-            # Load current payload configuration
-            with open(self.payload_config_file, 'r') as f:
-                config = json.load(f)
-
-            payloads = config.get('payloads', [])
-
             # Find payload configuration for this topic
-            payload_config = None
-            for payload in payloads:
-                if payload.get('topic') == topic:
-                    payload_config = payload
-                    break
+            payload_config = self._get_payload_config(topic)
 
             if not payload_config:
                 self.logger.warning(f"No configuration found for topic: {topic}")
@@ -235,22 +294,7 @@ class BrokerResolver:
 
             # Create or get existing connection
             connection_key = f"{template_id}_{resolved_config['host']}_{resolved_config['port']}"
-
-            with self.lock:
-                if connection_key not in self.broker_connections:
-                    self.broker_connections[connection_key] = BrokerConnection(resolved_config, template_id)
-
-                connection = self.broker_connections[connection_key]
-
-                # Try to connect if not connected
-                if not connection.is_healthy():
-                    self.logger.info(f"Broker {connection_key} not healthy, attempting reconnection...")
-                    connection.disconnect()
-                    if not connection.connect():
-                        send_error_log("resolve_broker_for_topic", f"Failed to connect to broker {connection_key}", ERROR_TYPE_MAJOR, {"connection_key": connection_key, "topic": topic})
-                        return None
-
-                return connection
+            return self._get_connection(connection_key, resolved_config, template_id)
 
         except Exception as e:
             send_error_log("resolve_broker_for_topic", f"Error resolving broker for topic {topic}: {e}", ERROR_TYPE_MAJOR, {"topic": topic})
@@ -281,40 +325,34 @@ class BrokerResolver:
             send_error_log("_resolve_broker_config", f"Error resolving broker config: {e}", ERROR_TYPE_MAJOR)
             return template.get('config', {})
 
+    def get_candidate_brokers(self, topic: str, payload_data: Dict[str, Any] = None) -> List[BrokerConnection]:
+        """All brokers for a topic in failover order: primary, fallbacks, alternatives, local"""
+        candidates = []
+        primary_broker = self.resolve_broker_for_topic(topic, payload_data)
+        if primary_broker:
+            candidates.append(primary_broker)
+        candidates.extend(self._get_fallback_brokers(topic, payload_data))
+        candidates.extend(self._get_alternative_brokers(topic, payload_data))
+        candidates.extend(self._get_local_fallback_brokers())
+        return candidates
+
     def get_best_broker_for_topic(self, topic: str, payload_data: Dict[str, Any] = None) -> Optional[BrokerConnection]:
-        """Get the best available broker for a topic (with enhanced failover support)"""
+        """
+        Get the first healthy broker for a topic in failover order, without waiting on connects.
+
+        Candidates are started lazily: the next broker in line is only
+        started once the ones before it are unhealthy, and the search stops
+        at a broker that is still making its first connection attempt.
+        """
         try:
-            # Try primary broker first
-            primary_broker = self.resolve_broker_for_topic(topic, payload_data)
-            if primary_broker:
-                # Try to connect if not connected
-                if not primary_broker.connected:
-                    if primary_broker.connect():
-                        return primary_broker
-                elif primary_broker.is_healthy():
-                    return primary_broker
-
-            # If primary fails, try fallback brokers from template
-            fallback_brokers = self._get_fallback_brokers(topic, payload_data)
-            for fallback_broker in fallback_brokers:
-                if fallback_broker.connect():
-                    self.logger.info(f"Using fallback broker for topic {topic}")
-                    return fallback_broker
-
-            # If fallback fails, try alternative brokers (same category)
-            alternative_brokers = self._get_alternative_brokers(topic, payload_data)
-            for alt_broker in alternative_brokers:
-                if alt_broker.connect():
-                    self.logger.info(f"Using alternative broker for topic {topic}")
-                    return alt_broker
-
-            # Final fallback: use local broker
-            local_broker = self._get_local_fallback_broker()
-            if local_broker and local_broker.connect():
-                self.logger.info(f"Using local fallback broker for topic {topic}")
-                return local_broker
-
-            send_error_log("get_best_broker_for_topic", f"No working brokers available for topic: {topic}", ERROR_TYPE_CRITICAL, {"topic": topic})
+            now = time.time()
+            for broker in self.get_candidate_brokers(topic, payload_data):
+                broker.start()
+                broker.last_used = now
+                if broker.accepts_publish():
+                    return broker
+                if broker.is_connecting():
+                    return None
             return None
 
         except Exception as e:
@@ -326,17 +364,9 @@ class BrokerResolver:
         try:
             fallbacks = []
 
-            # Load payload config to find current template
-            with open(self.payload_config_file, 'r') as f:
-                config = json.load(f)
-
-            payloads = config.get('payloads', [])
-            current_template_id = None
-
-            for payload in payloads:
-                if payload.get('topic') == topic:
-                    current_template_id = payload.get('template_id')
-                    break
+            # Find current template for this topic
+            payload_config = self._get_payload_config(topic)
+            current_template_id = payload_config.get('template_id') if payload_config else None
 
             if not current_template_id:
                 return fallbacks
@@ -350,12 +380,10 @@ class BrokerResolver:
                         if fallback_config.get('protocol') == 'ws':
                             fallback_config = self._convert_websocket_to_mqtt(fallback_config)
 
-                        fallback_connection = BrokerConnection(fallback_config, f"{current_template_id}_fallback")
-
-                        if fallback_connection.connect():
-                            fallbacks.append(fallback_connection)
+                        connection_key = f"{current_template_id}_fallback_{fallback_config['host']}_{fallback_config['port']}"
+                        fallbacks.append(self._get_connection(connection_key, fallback_config, f"{current_template_id}_fallback"))
                     except Exception as e:
-                        send_error_log("_get_fallback_brokers", f"Failed to connect to fallback broker: {e}", ERROR_TYPE_WARNING, {"topic": topic})
+                        send_error_log("_get_fallback_brokers", f"Failed to set up fallback broker: {e}", ERROR_TYPE_WARNING, {"topic": topic})
                         continue
 
             return fallbacks
@@ -372,17 +400,9 @@ class BrokerResolver:
             # Get all available templates
             all_templates = self.template_manager.get_all_templates()
 
-            # Load payload config to find current template
-            with open(self.payload_config_file, 'r') as f:
-                config = json.load(f)
-
-            payloads = config.get('payloads', [])
-            current_template_id = None
-
-            for payload in payloads:
-                if payload.get('topic') == topic:
-                    current_template_id = payload.get('template_id')
-                    break
+            # Find current template for this topic
+            payload_config = self._get_payload_config(topic)
+            current_template_id = payload_config.get('template_id') if payload_config else None
 
             if not current_template_id:
                 return alternatives
@@ -398,10 +418,8 @@ class BrokerResolver:
 
                         # Create connection for alternative template
                         alt_config = self._resolve_broker_config(template, {}, payload_data)
-                        alt_connection = BrokerConnection(alt_config, template.get('template_id'))
-
-                        if alt_connection.connect():
-                            alternatives.append(alt_connection)
+                        connection_key = f"{template.get('template_id')}_{alt_config.get('host')}_{alt_config.get('port')}"
+                        alternatives.append(self._get_connection(connection_key, alt_config, template.get('template_id')))
 
             return alternatives
 
@@ -409,8 +427,8 @@ class BrokerResolver:
             send_error_log("_get_alternative_brokers", f"Error getting alternative brokers: {e}", ERROR_TYPE_MAJOR, {"topic": topic})
             return []
 
-    def _get_local_fallback_broker(self) -> Optional[BrokerConnection]:
-        """Get local broker as final fallback"""
+    def _get_local_fallback_brokers(self) -> List[BrokerConnection]:
+        """Get local brokers (MQTT, then WebSocket) as final fallback"""
         try:
             local_config = {
                 "protocol": "mqtt",
@@ -426,36 +444,29 @@ class BrokerResolver:
                 "reconnect_period": 3
             }
 
-            local_connection = BrokerConnection(local_config, "local_fallback")
-
-            if local_connection.connect():
-                return local_connection
-            else:
-                # Try WebSocket as final fallback
-                ws_config = {
-                    "protocol": "ws",
-                    "host": "18.143.215.113",
-                    "port": 9000,
-                    "path": "/mqtt",
-                    "ssl": False,
-                    "username": "",
-                    "password": "",
-                    "qos": 0,
-                    "retain": False,
-                    "keepalive": 60,
-                    "connection_timeout": 5,
-                    "reconnect_period": 3
-                }
-
-                ws_connection = BrokerConnection(ws_config, "local_websocket_fallback")
-                if ws_connection.connect():
-                    return ws_connection
+            ws_config = {
+                "protocol": "ws",
+                "host": "18.143.215.113",
+                "port": 9000,
+                "path": "/mqtt",
+                "ssl": False,
+                "username": "",
+                "password": "",
+                "qos": 0,
+                "retain": False,
+                "keepalive": 60,
+                "connection_timeout": 5,
+                "reconnect_period": 3
+            }
 
-            return None
+            return [
+                self._get_connection("local_fallback", local_config, "local_fallback"),
+                self._get_connection("local_websocket_fallback", ws_config, "local_websocket_fallback")
+            ]
 
         except Exception as e:
             send_error_log("_get_local_fallback_broker", f"Error getting local fallback broker: {e}", ERROR_TYPE_MAJOR)
-            return None
+            return []
 
     def _convert_websocket_to_mqtt(self, ws_config: Dict[str, Any]) -> Dict[str, Any]:
         """Convert WebSocket config to MQTT config"""
@@ -463,35 +474,96 @@ class BrokerResolver:
         mqtt_config['protocol'] = 'mqtt'
         return mqtt_config
 
-    def publish_to_topic(self, topic: str, payload: str, payload_data: Dict[str, Any] = None) -> bool:
-        """Publish payload to topic using appropriate broker"""
-        try:
-            broker = self.get_best_broker_for_topic(topic, payload_data)
-            if not broker:
-                send_error_log("publish_to_topic", f"No available broker for topic: {topic}", ERROR_TYPE_CRITICAL, {"topic": topic})
-                return False
+    def publish_to_topic(self, topic: str, payload: str, payload_data: Dict[str, Any] = None) -> str:
+        """
+        Publish payload to topic using the best healthy broker.
 
-            # Get QoS and retain settings
-            qos = payload_data.get('qos', 0) if payload_data else 0
-            retain = payload_data.get('retain', False) if payload_data else False
+        Returns immediately with PUBLISH_SENT, or PUBLISH_QUEUED when no broker
+        is healthy: the message is then queued for background retry
+        (replacing any older queued payload for the same topic) and the
+        caller must not re-send it. PUBLISH_FAILED means it was neither sent
+        nor queued.
+        """
+        try:
+            if self._publish_now(topic, payload, payload_data):
+                with self._retry_lock:
+                    self._retry_queue.pop(topic, None)
+                return PUBLISH_SENT
 
-            return broker.publish(topic, payload, qos=qos, retain=retain)
+            self._queue_retry(topic, payload, payload_data)
+            return PUBLISH_QUEUED
 
         except Exception as e:
             send_error_log("publish_to_topic", f"Error publishing to topic {topic}: {e}", ERROR_TYPE_MAJOR, {"topic": topic})
-            return False
+            return PUBLISH_FAILED
+
+    def _publish_now(self, topic: str, payload: str, payload_data: Dict[str, Any] = None) -> bool:
+        # Get QoS and retain settings
+        qos = payload_data.get('qos', 0) if payload_data else 0
+        retain = payload_data.get('retain', False) if payload_data else False
+
+        broker = self.get_best_broker_for_topic(topic, payload_data)
+        return broker is not None and broker.publish(topic, payload, qos=qos, retain=retain)
+
+    def _queue_retry(self, topic: str, payload: str, payload_data: Dict[str, Any] = None):
+        with self._retry_lock:
+            first_queued = self._retry_queue[topic][2] if topic in self._retry_queue else time.time()
+            self._retry_queue[topic] = (payload, payload_data, first_queued)
+            self._retry_queue.move_to_end(topic)
+            while len(self._retry_queue) > RETRY_QUEUE_SIZE:
+                self._retry_queue.popitem(last=False)
+                self.retry_dropped += 1
+
+    def _retry_loop(self):
+        """Retry queued publishes once a broker for their topic is healthy"""
+        while True:
+            time.sleep(RETRY_INTERVAL)
+            try:
+                with self._retry_lock:
+                    pending = list(self._retry_queue.items())
+
+                now = time.time()
+                for topic, (payload, payload_data, first_queued) in pending:
+                    if now - first_queued > RETRY_MAX_AGE:
+                        delivered = False
+                        expired = True
+                    else:
+                        delivered = self._publish_now(topic, payload, payload_data)
+                        expired = False
+
+                    if delivered or expired:
+                        with self._retry_lock:
+                            # Only remove it if it was not replaced by a newer payload meanwhile
+                            if self._retry_queue.get(topic, (None,))[0] is payload:
+                                del self._retry_queue[topic]
+                                if expired:
+                                    self.retry_dropped += 1
+                        if expired:
+                            send_error_log("publish_to_topic", f"No available broker for topic: {topic}", ERROR_TYPE_CRITICAL, {"topic": topic})
+                        else:
+                            self.logger.info(f"Delivered queued publish for topic {topic}")
+
+            except Exception as e:
+                send_error_log("_retry_loop", f"Error retrying queued publishes: {e}", ERROR_TYPE_MINOR)
 
     def get_broker_health_report(self) -> Dict[str, Any]:
         """Get health report for all broker connections"""
         try:
+            with self.lock:
+                connections = list(self.broker_connections.items())
+            with self._retry_lock:
+                retry_depth = len(self._retry_queue)
+
             report = {
-                "total_connections": len(self.broker_connections),
+                "total_connections": len(connections),
                 "healthy_connections": 0,
                 "unhealthy_connections": 0,
+                "retry_queue_depth": retry_depth,
+                "retry_dropped": self.retry_dropped,
                 "brokers": {}
             }
 
-            for connection_key, connection in self.broker_connections.items():
+            for connection_key, connection in connections:
                 health_score = connection.get_health_score()
                 is_healthy = connection.is_healthy()
 
@@ -504,7 +576,8 @@ class BrokerResolver:
                     "last_connected": connection.last_connected.isoformat() if connection.last_connected else None,
                     "connection_attempts": connection.connection_attempts,
                     "last_error": connection.last_error,
-                    "avg_response_time": sum(connection.response_times) / len(connection.response_times) if connection.response_times else 0
+                    "ack_rate": round(connection.ack_rate, 3),
+                    "avg_response_time": round(connection.ack_latency, 3)
                 }
 
                 report["brokers"][connection_key] = broker_info
@@ -521,20 +594,23 @@ class BrokerResolver:
             return {"error": str(e)}
 
     def cleanup_unhealthy_connections(self):
-        """Clean up unhealthy broker connections"""
+        """
+        Close connections no publish has reached recently, e.g. fallbacks after
+        the primary recovered. Unhealthy connections in use keep reconnecting
+        in the background.
+        """
         try:
-            unhealthy_keys = []
-
-            for connection_key, connection in self.broker_connections.items():
-                if not connection.is_healthy():
-                    connection.disconnect()
-                    unhealthy_keys.append(connection_key)
+            now = time.time()
+            with self.lock:
+                idle_keys = [key for key, connection in self.broker_connections.items()
+                             if now - connection.last_used > IDLE_CONNECTION_TIMEOUT]
+                idle = [self.broker_connections.pop(key) for key in idle_keys]
 
-            for key in unhealthy_keys:
-                del self.broker_connections[key]
+            for connection in idle:
+                connection.disconnect()
 
-            if unhealthy_keys:
-                self.logger.info(f"Cleaned up {len(unhealthy_keys)} unhealthy connections")
+            if idle_keys:
+                self.logger.info(f"Closed {len(idle_keys)} idle broker connections")
 
         except Exception as e:
             send_error_log("cleanup_unhealthy_connections", f"Error during cleanup: {e}", ERROR_TYPE_MINOR)
@@ -557,4 +633,4 @@ class BrokerResolver:
 
         except Exception as e:
             send_error_log("get_connection_stats", f"Error getting connection stats: {e}", ERROR_TYPE_MINOR)
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
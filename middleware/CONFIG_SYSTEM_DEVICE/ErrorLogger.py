@@ -3,25 +3,53 @@
 Unified Error Logger Module
 Provides standardized error logging across all middleware services.
 Synchronized with ErrorLog.py service for consistent error handling.
+
+Run as a script it is the error log service: received logs are appended to
+JSON-lines segments under JSON/errorLog/, the stored listing is served on
+subrack/error/data and filtered, paginated queries are answered on
+subrack/error/query.
 """
 
 import os
+import re
 import json
 import time
 import uuid
 import threading
 import paho.mqtt.client as mqtt
+from collections import deque
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 import logging
 
 # --- Configuration ---
 ERROR_LOG_TOPIC = "subrack/error/log"
-ERROR_LOG_FILE = "JSON/errorLog.json"
+ERROR_LOG_BATCH_TOPIC = "subrack/error/log/batch"  # JSON array of entries drained from an outbox
+ERROR_DATA_TOPIC = "subrack/error/data"  # stored log listing for the UI
+ERROR_DATA_REQUEST_TOPIC = "subrack/error/data/request"
+ERROR_QUERY_TOPIC = "subrack/error/query"
+ERROR_QUERY_RESPONSE_TOPIC = "subrack/error/query/response"
+ERROR_LOG_FILE = "JSON/errorLog.json"  # legacy single-file log, imported once
+ERROR_LOG_DIR = "JSON/errorLog"
+ERROR_OUTBOX_DIR = "JSON/errorOutbox"
 DEFAULT_MQTT_BROKER = "18.143.215.113"
 DEFAULT_MQTT_PORT = 1883
 QOS = 1
-MAX_LOG_ENTRIES = 1000
+MAX_LOG_ENTRIES = 1000  # in-memory tail and UI listing size
+
+# Segment storage
+SEGMENT_PREFIX = "errors-"
+SEGMENT_SUFFIX = ".jsonl"
+SEGMENT_INDEX_FILE = "index.json"
+SEGMENT_ROWS_SUFFIX = ".idx.json"  # per-segment row index: [offset, timestamp, type, source]
+SEGMENT_MAX_BYTES = 256 * 1024
+MAX_SEGMENTS = 8
+FSYNC_BATCH_SIZE = 50
+FSYNC_INTERVAL = 2.0  # seconds
+
+# Query API
+QUERY_DEFAULT_PAGE_SIZE = 50
+QUERY_MAX_PAGE_SIZE = 500
 
 # Error Types (standardized)
 ERROR_TYPE_MINOR = "MINOR"
@@ -31,58 +59,732 @@ ERROR_TYPE_INFO = "INFO"
 ERROR_TYPE_WARNING = "WARNING"
 ERROR_TYPE_ERROR = "ERROR"
 
+# De-duplication and rate limiting
+DEDUP_WINDOW = 60  # seconds; repeats of the same error inside a window are collapsed
+DEDUP_FLUSH_INTERVAL = 5  # seconds between checks for closed windows
+MAX_DEDUP_ENTRIES = 500  # open windows per service; the oldest is closed early when full
+RATE_LIMITS = {  # publishes per minute per severity (first occurrences and summaries)
+    ERROR_TYPE_CRITICAL: 30,
+    ERROR_TYPE_MAJOR: 20,
+    ERROR_TYPE_ERROR: 20,
+    ERROR_TYPE_WARNING: 10,
+    ERROR_TYPE_MINOR: 10,
+    ERROR_TYPE_INFO: 5
+}
+DEFAULT_RATE_LIMIT = 10
+
+# Outbox for logs sent while the broker is unreachable
+MAX_OUTBOX_ENTRIES = 5000
+OUTBOX_BATCH_SIZE = 100  # entries per MQTT message when draining
+OUTBOX_COMPACT_ENTRIES = 1000  # acknowledged entries kept in the file before it is rewritten
+OUTBOX_ACK_TIMEOUT = 30  # seconds to wait for the broker's PUBACK of a drained batch
+
 # Global state
 _error_logger_client = None
 _connection_status = False
-_pending_logs = []
-_pending_logs_lock = threading.Lock()
 _client_lock = threading.Lock()
-MAX_PENDING_LOGS = 50
-_stored_logs: List[Dict[str, Any]] = []
-_logs_lock = threading.Lock()
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# --- JSON Storage Functions ---
-def _load_stored_logs():
-    """Load existing logs from JSON file"""
-    global _stored_logs
-    try:
-        if os.path.exists(ERROR_LOG_FILE):
+# --- Segmented Log Storage ---
+class ErrorLogStore:
+    """
+    Append-only error log kept as JSON-lines segments.
+
+    Entries are appended to the active segment and fsync'd in batches. A
+    segment is sealed once it reaches SEGMENT_MAX_BYTES and the oldest
+    segments are deleted beyond MAX_SEGMENTS. A compact index (entry count,
+    time range, per-type and per-source counts) is kept per segment so reads
+    can skip whole segments, and the newest entries are held in a deque.
+    Each segment also has a row index (byte offset, timestamp, type, source
+    per entry) so queries filter and count without decoding entries and
+    only read the page they return.
+    """
+
+    def __init__(self, directory: str = ERROR_LOG_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 max_segments: int = MAX_SEGMENTS, tail_size: int = MAX_LOG_ENTRIES,
+                 fsync_batch_size: int = FSYNC_BATCH_SIZE, fsync_interval: float = FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval = fsync_interval
+        self.tail: deque = deque(maxlen=tail_size)
+        self._segments: List[Dict[str, Any]] = []  # segment indexes, oldest first
+        self._rows: Dict[int, List[tuple]] = {}  # seq -> row index
+        self._file = None
+        self._unsynced = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    # --- Segment files and indexes ---
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:06d}{SEGMENT_SUFFIX}")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, SEGMENT_INDEX_FILE)
+
+    def _rows_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:06d}{SEGMENT_ROWS_SUFFIX}")
+
+    def _list_segment_seqs(self) -> List[int]:
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    seqs.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(seqs)
+
+    @staticmethod
+    def _new_index(seq: int) -> Dict[str, Any]:
+        return {"seq": seq, "count": 0, "bytes": 0, "first": None, "last": None, "types": {}, "sources": {}}
+
+    @staticmethod
+    def _make_row(log_entry: Dict[str, Any], offset: int) -> tuple:
+        return (offset,
+                log_entry.get("receivedAt") or log_entry.get("Timestamp") or "",
+                str(log_entry.get("type", "UNKNOWN")).upper(),
+                str(log_entry.get("source", "unknown")))
+
+    @staticmethod
+    def _update_index(index: Dict[str, Any], row: tuple):
+        _, timestamp, log_type, source = row
+        index["count"] += 1
+        if timestamp:
+            if index["first"] is None or timestamp < index["first"]:
+                index["first"] = timestamp
+            if index["last"] is None or timestamp > index["last"]:
+                index["last"] = timestamp
+        index["types"][log_type] = index["types"].get(log_type, 0) + 1
+        index["sources"][source] = index["sources"].get(source, 0) + 1
+
+    def _scan_segment(self, seq: int):
+        """Rebuild a segment's index and row index by reading the segment"""
+        index = self._new_index(seq)
+        rows = []
+        path = self._segment_path(seq)
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    row = self._make_row(json.loads(line), offset)
+                    rows.append(row)
+                    self._update_index(index, row)
+                except ValueError:
+                    pass  # partial line from an interrupted write
+                offset += len(line)
+        index["bytes"] = offset
+        return index, rows
+
+    def _load_rows(self, seq: int, count: int) -> Optional[List[tuple]]:
+        try:
+            with open(self._rows_path(seq), 'r') as f:
+                rows = [tuple(row) for row in json.load(f)]
+            return rows if len(rows) == count else None
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save_rows(self, seq: int):
+        path = self._rows_path(seq)
+        try:
+            with open(path + ".tmp", 'w') as f:
+                json.dump(self._rows.get(seq, []), f, separators=(',', ':'))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.error(f"Error saving error log row index {path}: {e}")
+
+    def _read_index_file(self) -> Dict[int, Dict[str, Any]]:
+        try:
+            with open(self._index_path(), 'r') as f:
+                return {index["seq"]: index for index in json.load(f)}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _save_index_locked(self):
+        path = self._index_path()
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._segments, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving error log index {path}: {e}")
+
+    # --- Lifecycle ---
+    def open(self):
+        """Load segment indexes and the in-memory tail, importing the legacy JSON file once"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            saved = self._read_index_file()
+            seqs = self._list_segment_seqs()
+            self._segments = []
+            self._rows = {}
+            for seq in seqs:
+                index = saved.get(seq)
+                rows = None
+                # The active segment and any segment that changed since the index was saved are rescanned
+                if index is not None and seq != seqs[-1] and \
+                        index.get("bytes") == os.path.getsize(self._segment_path(seq)):
+                    rows = self._load_rows(seq, index["count"])
+                if rows is None:
+                    index, rows = self._scan_segment(seq)
+                    if seq != seqs[-1]:
+                        self._save_rows(seq)
+                self._segments.append(index)
+                self._rows[seq] = rows
+
+            if not self._segments:
+                self._segments.append(self._new_index(1))
+                self._rows[1] = []
+            self._open_active_locked()
+            if len(seqs) == 0:
+                self._import_legacy_locked()
+
+            self.tail.clear()
+            self.tail.extend(self.iter_logs(limit=self.tail.maxlen))
+            logger.info(f"Loaded {sum(s['count'] for s in self._segments)} error logs "
+                        f"from {len(self._segments)} segment(s)")
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="ErrorLogFlusher", daemon=True)
+            self._flusher.start()
+
+    def _open_active_locked(self):
+        active = self._segments[-1]
+        self._file = open(self._segment_path(active["seq"]), 'ab')
+        # Terminate a partial line left by a crash so the next entry starts cleanly
+        if active["bytes"] > 0:
+            with open(self._segment_path(active["seq"]), 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+                    active["bytes"] += 1
+        self._rows.setdefault(active["seq"], [])
+
+    def _import_legacy_locked(self):
+        """Move entries from the old single-file errorLog.json into the segment log"""
+        if not os.path.exists(ERROR_LOG_FILE):
+            return
+        try:
             with open(ERROR_LOG_FILE, 'r') as f:
                 content = f.read().strip()
-                if content:
-                    _stored_logs = json.loads(content)
-                    logger.info(f"Loaded {len(_stored_logs)} existing error logs")
+            legacy_logs = json.loads(content) if content else []
+            for log_entry in legacy_logs:
+                self._append_locked(log_entry)
+            self._sync_locked()
+            os.replace(ERROR_LOG_FILE, ERROR_LOG_FILE + ".migrated")
+            logger.info(f"Imported {len(legacy_logs)} error logs from {ERROR_LOG_FILE}")
+        except Exception as e:
+            logger.error(f"Error importing legacy logs from {ERROR_LOG_FILE}: {e}")
+
+    def close(self):
+        """Flush pending entries, persist the index and close the active segment"""
+        self._stop.set()
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+            self._save_index_locked()
+
+    # --- Writes ---
+    def append(self, log_entry: Dict[str, Any]):
+        """Append one entry; fsync happens once per batch or every FSYNC_INTERVAL seconds"""
+        with self._lock:
+            if self._file is None:
+                logger.warning("Error log store is not open, entry kept in memory only")
+                self.tail.append(log_entry)
+                return
+            self._append_locked(log_entry)
+            self.tail.append(log_entry)
+            if self._unsynced >= self.fsync_batch_size:
+                self._sync_locked()
+
+    def _append_locked(self, log_entry: Dict[str, Any]):
+        line = (json.dumps(log_entry, separators=(',', ':')) + "\n").encode('utf-8')
+        active = self._segments[-1]
+        if active["count"] and active["bytes"] + len(line) > self.segment_max_bytes:
+            self._rotate_locked()
+            active = self._segments[-1]
+        self._file.write(line)
+        row = self._make_row(log_entry, active["bytes"])
+        active["bytes"] += len(line)
+        self._update_index(active, row)
+        self._rows[active["seq"]].append(row)
+        self._unsynced += 1
+
+    def _sync_locked(self):
+        if self._file is None or not self._unsynced:
+            return
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error(f"Error syncing error log segment: {e}")
+        self._unsynced = 0
+
+    def _rotate_locked(self):
+        """Seal the active segment, start a new one and apply retention"""
+        self._sync_locked()
+        self._file.close()
+        self._save_rows(self._segments[-1]["seq"])
+        self._segments.append(self._new_index(self._segments[-1]["seq"] + 1))
+        while len(self._segments) > self.max_segments:
+            expired = self._segments.pop(0)
+            self._rows.pop(expired["seq"], None)
+            for path in (self._segment_path(expired["seq"]), self._rows_path(expired["seq"])):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            logger.info(f"Error log segment {expired['seq']} expired ({expired['count']} entries)")
+        self._open_active_locked()
+        self._save_index_locked()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                self._sync_locked()
+
+    # --- Reads ---
+    def get_segment_indexes(self) -> List[Dict[str, Any]]:
+        """Copy of the per-segment indexes, oldest first"""
+        with self._lock:
+            return [dict(index, types=dict(index["types"]), sources=dict(index["sources"]))
+                    for index in self._segments]
+
+    def iter_logs(self, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream stored entries oldest first from the segment files.
+
+        Args:
+            limit: Only yield the newest `limit` entries; segments entirely
+                   before them are skipped using the index counts
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            segments = [(index["seq"], index["count"]) for index in self._segments]
+
+        skip = 0
+        if limit is not None:
+            skip = max(0, sum(count for _, count in segments) - limit)
+
+        for seq, count in segments:
+            if skip >= count:
+                skip -= count
+                continue
+            remaining = count  # ignore entries appended after the snapshot
+            try:
+                with open(self._segment_path(seq), 'rb') as f:
+                    for line in f:
+                        if remaining <= 0:
+                            break
+                        try:
+                            log_entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        remaining -= 1
+                        if skip:
+                            skip -= 1
+                            continue
+                        yield log_entry
+            except FileNotFoundError:
+                # Segment expired while we were reading
+                skip = max(0, skip - count)
+                continue
+
+    def query(self, sources: Optional[List[str]] = None, types: Optional[List[str]] = None,
+              start: Optional[str] = None, end: Optional[str] = None, offset: int = 0,
+              limit: int = QUERY_DEFAULT_PAGE_SIZE, newest_first: bool = True) -> Dict[str, Any]:
+        """
+        Filter stored entries by source, severity and time range.
+
+        Segments are skipped using their index summary, matching rows are
+        found and counted in the row indexes, and only the requested page is
+        read from disk.
+
+        Args:
+            sources: Source service names to include (None = all)
+            types: Severities to include, e.g. ["CRITICAL", "MAJOR"] (None = all)
+            start, end: Inclusive "%Y-%m-%d %H:%M:%S" bounds on receivedAt/Timestamp
+            offset, limit: Page of the matching entries to return
+            newest_first: Page order
+
+        Returns:
+            Dict with total, offset, limit, entries and per-type/per-source counts
+        """
+        source_set = set(sources) if sources else None
+        type_set = {t.upper() for t in types} if types else None
+
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            # Row lists only grow, so a length snapshot is enough
+            snapshot = [(index["seq"], index["first"], index["last"], set(index["types"]),
+                         set(index["sources"]), self._rows.get(index["seq"], []), index["count"])
+                        for index in self._segments]
+
+        matches = []
+        type_counts: Dict[str, int] = {}
+        source_counts: Dict[str, int] = {}
+        for seq, first, last, seg_types, seg_sources, rows, count in snapshot:
+            if start and (last is None or last < start):
+                continue
+            if end and (first is None or first > end):
+                continue
+            if type_set is not None and not (type_set & seg_types):
+                continue
+            if source_set is not None and not (source_set & seg_sources):
+                continue
+            for row in rows[:count]:
+                row_offset, timestamp, log_type, source = row
+                if type_set is not None and log_type not in type_set:
+                    continue
+                if source_set is not None and source not in source_set:
+                    continue
+                if start and (not timestamp or timestamp < start):
+                    continue
+                if end and (not timestamp or timestamp > end):
+                    continue
+                matches.append((seq, row_offset))
+                type_counts[log_type] = type_counts.get(log_type, 0) + 1
+                source_counts[source] = source_counts.get(source, 0) + 1
+
+        if newest_first:
+            matches.reverse()
+        page = matches[max(0, offset):max(0, offset) + max(0, limit)]
+
+        entries = []
+        handles = {}
+        try:
+            for seq, row_offset in page:
+                handle = handles.get(seq)
+                if handle is None:
+                    try:
+                        handle = handles[seq] = open(self._segment_path(seq), 'rb')
+                    except FileNotFoundError:
+                        continue  # segment expired since the snapshot
+                handle.seek(row_offset)
+                try:
+                    entries.append(json.loads(handle.readline()))
+                except ValueError:
+                    continue
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+        return {
+            "total": len(matches),
+            "offset": offset,
+            "limit": limit,
+            "entries": entries,
+            "counts": {"types": type_counts, "sources": source_counts}
+        }
+
+
+# Global store, opened by the error log service (see __main__)
+_log_store: Optional[ErrorLogStore] = None
+_log_store_lock = threading.Lock()
+
+
+def get_log_store() -> ErrorLogStore:
+    """Get the process-wide segment store, opening it on first use"""
+    global _log_store
+    with _log_store_lock:
+        if _log_store is None:
+            _log_store = ErrorLogStore()
+            _log_store.open()
+        return _log_store
+
+
+def iter_stored_logs(limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Stream stored error logs oldest first, optionally only the newest `limit`"""
+    return get_log_store().iter_logs(limit)
+
+
+def query_stored_logs(**filters) -> Dict[str, Any]:
+    """Query stored error logs (see ErrorLogStore.query)"""
+    return get_log_store().query(**filters)
+
+
+def get_recent_logs() -> List[Dict[str, Any]]:
+    """Newest MAX_LOG_ENTRIES logs from the in-memory tail, oldest first"""
+    return list(get_log_store().tail)
+
+# --- Outbox ---
+class ErrorOutbox:
+    """
+    Bounded, disk-backed FIFO of log entries waiting for the broker.
+
+    Every entry is appended to a JSON-lines file as it is queued, so the
+    backlog survives restarts. Sent batches are acknowledged by moving a head
+    offset, kept in a small ".head" file next to the outbox; the file itself is
+    only rewritten once the acknowledged prefix reaches OUTBOX_COMPACT_ENTRIES.
+    When full, the oldest entry is dropped.
+    """
+
+    def __init__(self, path: str, max_entries: int = MAX_OUTBOX_ENTRIES):
+        self.path = path
+        self.head_path = path + ".head"
+        self.max_entries = max_entries
+        self.dropped = 0
+        self._entries: deque = deque()
+        self._file_lines = 0
+        self._head = 0  # file lines before the first queued entry
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.head_path, 'rb') as f:
+                self._head = max(0, int(f.read() or 0))
+        except (OSError, ValueError):
+            self._head = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    self._file_lines += 1
+                    if self._file_lines <= self._head:
+                        continue  # acknowledged before the restart
+                    try:
+                        self._entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # partial line from an interrupted write
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Error loading error log outbox {self.path}: {e}")
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popleft()
+            self.dropped += 1
+        # Skipped or dropped lines break the line-per-entry mapping after the head
+        if self._file_lines - self._head != len(self._entries):
+            self._compact_locked()
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} unsent error logs from {self.path}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def put(self, log_entry: Dict[str, Any]):
+        """Queue an entry at the back, dropping the oldest when full"""
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                removed = self._entries.popleft()
+                # The dropped line stays in the file behind the head; a restart
+                # trims the backlog to max_entries the same way
+                self._head += 1
+                self.dropped += 1
+                logger.warning(f"Error log outbox full, dropped oldest entry from {removed.get('source', 'unknown')}")
+            self._entries.append(log_entry)
+            if self._head >= OUTBOX_COMPACT_ENTRIES:
+                self._compact_locked()
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, 'ab') as f:
+                    f.write((json.dumps(log_entry, separators=(',', ':')) + "\n").encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file_lines += 1
+            except OSError as e:
+                logger.error(f"Error writing error log outbox {self.path}: {e}")
+
+    def peek(self, count: int) -> List[Dict[str, Any]]:
+        """Oldest `count` entries, left in the queue until acknowledged"""
+        with self._lock:
+            return [self._entries[i] for i in range(min(count, len(self._entries)))]
+
+    def ack(self, count: int):
+        """Remove the oldest `count` entries after they were sent"""
+        with self._lock:
+            count = min(count, len(self._entries))
+            for _ in range(count):
+                self._entries.popleft()
+            self._head += count
+            if not self._entries or self._head >= OUTBOX_COMPACT_ENTRIES:
+                self._compact_locked()
+            else:
+                self._write_head_locked()
+
+    def _write_head_locked(self):
+        try:
+            tmp_path = self.head_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(str(self._head).encode('ascii'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.head_path)
+        except OSError as e:
+            logger.error(f"Error writing error log outbox head {self.head_path}: {e}")
+
+    def _compact_locked(self):
+        """Rewrite the file with only the queued entries and reset the head"""
+        try:
+            # The head file goes first: a crash before the new file is in
+            # place resends acknowledged entries instead of skipping queued ones
+            if os.path.exists(self.head_path):
+                os.remove(self.head_path)
+            if not self._entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            else:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    for log_entry in self._entries:
+                        f.write((json.dumps(log_entry, separators=(',', ':')) + "\n").encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            self._file_lines = len(self._entries)
+            self._head = 0
+        except OSError as e:
+            logger.error(f"Error rewriting error log outbox {self.path}: {e}")
+
+
+_outboxes: Dict[str, ErrorOutbox] = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(service_name: str) -> ErrorOutbox:
+    """Get the outbox for a service; loggers with the same name share one file"""
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', service_name)
+    with _outboxes_lock:
+        if safe_name not in _outboxes:
+            _outboxes[safe_name] = ErrorOutbox(os.path.join(ERROR_OUTBOX_DIR, f"{safe_name}.jsonl"))
+        return _outboxes[safe_name]
+
+
+# --- De-duplication ---
+_NORMALIZE_PATTERNS = [
+    (re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE), '<uuid>'),
+    (re.compile(r'(?:[0-9a-f]{2}:){5}[0-9a-f]{2}', re.IGNORECASE), '<mac>'),
+    (re.compile(r'0x[0-9a-f]+', re.IGNORECASE), '<hex>'),
+    (re.compile(r'\d+(?:\.\d+)?'), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize_error_message(message: str) -> str:
+    """Replace numbers, ids and addresses so repeats of one error compare equal"""
+    for pattern, replacement in _NORMALIZE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message.strip()
+
+
+class ErrorDeduplicator:
+    """
+    Collapses repeated errors and rate-limits publishes per severity.
+
+    Errors are fingerprinted by (service, function, normalized message). The
+    first occurrence opens a window and is published right away if the
+    severity's token bucket allows it; repeats inside the window are only
+    counted. When the window closes, one summary entry carrying count,
+    firstSeen and lastSeen is emitted for the occurrences that were not
+    published. Summaries are rate-limited too and wait for the next flush
+    when the bucket is empty.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW, rate_limits: Optional[Dict[str, int]] = None,
+                 max_entries: int = MAX_DEDUP_ENTRIES):
+        self.window = window
+        self.rate_limits = dict(RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_entries = max_entries
+        self._windows: Dict[tuple, Dict[str, Any]] = {}  # insertion order = oldest first
+        self._closed: List[Dict[str, Any]] = []
+        self._buckets: Dict[str, List[float]] = {}  # severity -> [tokens, last refill]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def _take_token(self, severity: str, now: float) -> bool:
+        limit = self.rate_limits.get(severity, DEFAULT_RATE_LIMIT)
+        bucket = self._buckets.setdefault(severity, [float(limit), now])
+        bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * limit / 60.0)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def register(self, fingerprint: tuple, log_entry: Dict[str, Any], now: Optional[float] = None) -> bool:
+        """Record an occurrence; returns True when the entry should be published now"""
+        now = time.time() if now is None else now
+        severity = log_entry.get("type", ERROR_TYPE_ERROR)
+        with self._lock:
+            window = self._windows.get(fingerprint)
+            if window is not None and now - window["first_seen"] < self.window:
+                window["count"] += 1
+                window["last_seen"] = now
+                if window["repeat_first"] is None:
+                    window["repeat_first"] = now
+                self.suppressed += 1
+                return False
+
+            if window is not None:
+                self._closed.append(self._windows.pop(fingerprint))
+            elif len(self._windows) >= self.max_entries:
+                oldest = next(iter(self._windows))
+                self._closed.append(self._windows.pop(oldest))
+
+            publish = self._take_token(severity, now)
+            self._windows[fingerprint] = {
+                "entry": log_entry,
+                "severity": severity,
+                "count": 1,
+                "first_seen": now,
+                "last_seen": now,
+                # First unpublished occurrence; the first one itself when rate-limited
+                "repeat_first": None if publish else now,
+                "published": publish
+            }
+            if not publish:
+                self.suppressed += 1
+            return publish
+
+    def collect(self, now: Optional[float] = None, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Close expired windows and build summary entries for unpublished occurrences.
+
+        Args:
+            force: Close every window and ignore rate limits (used on shutdown)
+        """
+        now = time.time() if now is None else now
+        summaries = []
+        with self._lock:
+            for fingerprint in list(self._windows):
+                if force or now - self._windows[fingerprint]["first_seen"] >= self.window:
+                    self._closed.append(self._windows.pop(fingerprint))
+
+            pending = []
+            for window in self._closed:
+                if window["repeat_first"] is None:
+                    continue  # single occurrence, already published
+                if force or self._take_token(window["severity"], now):
+                    summaries.append(self._summary(window))
                 else:
-                    _stored_logs = []
-        else:
-            _stored_logs = []
-            _save_stored_logs()
-    except Exception as e:
-        logger.error(f"Error loading logs from {ERROR_LOG_FILE}: {e}")
-        _stored_logs = []
+                    pending.append(window)
+            self._closed = pending[-self.max_entries:]
+        return summaries
 
+    @staticmethod
+    def _summary(window: Dict[str, Any]) -> Dict[str, Any]:
+        count = window["count"] - (1 if window["published"] else 0)
+        entry = dict(window["entry"])
+        service, _, _ = str(entry.get("id", "")).partition("--")
+        entry["id"] = f"{service}--{int(time.time())}-{uuid.uuid4().int % 10000000000}"
+        entry["Timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry["count"] = count
+        entry["firstSeen"] = datetime.fromtimestamp(window["repeat_first"]).strftime("%Y-%m-%d %H:%M:%S")
+        entry["lastSeen"] = datetime.fromtimestamp(window["last_seen"]).strftime("%Y-%m-%d %H:%M:%S")
+        return entry
 
-def _save_stored_logs():
-    """Save logs to JSON file"""
-    try:
-        os.makedirs(os.path.dirname(ERROR_LOG_FILE) or ".", exist_ok=True)
-        with open(ERROR_LOG_FILE, 'w') as f:
-            json.dump(_stored_logs, f, indent=2)
-    except Exception as e:
-        logger.error(f"Error saving logs to {ERROR_LOG_FILE}: {e}")
-
-
-def _add_stored_log(log_entry: Dict[str, Any]):
-    """Add log to storage and maintain max size"""
-    with _logs_lock:
-        _stored_logs.append(log_entry)
-        if len(_stored_logs) > MAX_LOG_ENTRIES:
-            removed = _stored_logs.pop(0)
-            logger.warning(f"Max logs reached, removed oldest from {removed.get('source', 'unknown')}")
-        _save_stored_logs()
 
 class UnifiedErrorLogger:
     """
@@ -91,13 +793,26 @@ class UnifiedErrorLogger:
     """
 
     def __init__(self, service_name: str, mqtt_broker: str = DEFAULT_MQTT_BROKER,
-                 mqtt_port: int = DEFAULT_MQTT_PORT):
+                 mqtt_port: int = DEFAULT_MQTT_PORT, store_logs: bool = False):
         self.service_name = service_name
         self.mqtt_broker = mqtt_broker
         self.mqtt_port = mqtt_port
+        self.store_logs = store_logs
         self.client = None
         self.connected = False
         self.reconnect_thread = None
+        self.outbox = get_outbox(service_name)
+        self.drain_thread = None
+        # PUBACK tracking for the batch being drained; acks that arrive while
+        # client.publish() is still running are kept until it returns
+        self._batch_lock = threading.Lock()
+        self._batch_mid = None
+        self._batch_publishing = False
+        self._batch_early_acks = set()
+        self._batch_acked = threading.Event()
+        self.deduplicator = ErrorDeduplicator()
+        self.dedup_thread = None
+        self._stopping = threading.Event()
 
     def initialize(self) -> bool:
         """Initialize the error logger with MQTT connection"""
@@ -111,8 +826,12 @@ class UnifiedErrorLogger:
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
             self.client.on_message = self._on_message
+            self.client.on_publish = self._on_publish
             self.client.reconnect_delay_set(min_delay=1, max_delay=120)
 
+            self.dedup_thread = threading.Thread(target=self._dedup_flush_loop, daemon=True)
+            self.dedup_thread.start()
+
             # Attempt initial connection (non-blocking)
             try:
                 self.client.connect(self.mqtt_broker, self.mqtt_port, keepalive=60)
@@ -134,10 +853,13 @@ class UnifiedErrorLogger:
         if rc == 0:
             self.connected = True
             logger.info(f"Error logger connected for {self.service_name}")
-            # Subscribe to error log topic for receiving logs
-            client.subscribe(ERROR_LOG_TOPIC, qos=QOS)
-            logger.info(f"Subscribed to {ERROR_LOG_TOPIC}")
-            self._process_pending_logs()
+            if self.store_logs:
+                # Only the error log service stores logs and serves the listing
+                client.subscribe([(ERROR_LOG_TOPIC, QOS), (ERROR_LOG_BATCH_TOPIC, QOS),
+                                  (ERROR_DATA_REQUEST_TOPIC, QOS), (ERROR_QUERY_TOPIC, QOS)])
+                logger.info(f"Subscribed to {ERROR_LOG_TOPIC}, {ERROR_LOG_BATCH_TOPIC}, "
+                            f"{ERROR_DATA_REQUEST_TOPIC}, {ERROR_QUERY_TOPIC}")
+            self._start_drain()
         else:
             self.connected = False
             logger.warning(f"Error logger connection failed for {self.service_name} (code: {rc})")
@@ -151,6 +873,15 @@ class UnifiedErrorLogger:
         else:
             logger.info(f"Error logger disconnected normally for {self.service_name}")
 
+    def _on_publish(self, client, userdata, mid):
+        """Release the drained batch once the broker acknowledged it"""
+        with self._batch_lock:
+            if mid == self._batch_mid:
+                self._batch_mid = None
+                self._batch_acked.set()
+            elif self._batch_publishing:
+                self._batch_early_acks.add(mid)
+
     def _start_reconnection(self):
         """Start reconnection thread if not already running"""
         if self.reconnect_thread and self.reconnect_thread.is_alive():
@@ -174,23 +905,52 @@ class UnifiedErrorLogger:
                 time.sleep(delay)
                 delay = min(delay * 2, max_delay)
 
-    def _process_pending_logs(self):
-        """Process any pending error logs after reconnection"""
-        with _pending_logs_lock:
-            if not _pending_logs:
-                return
+    def _start_drain(self):
+        """Start the outbox drain thread if there is a backlog and it is not already running"""
+        if not len(self.outbox) or (self.drain_thread and self.drain_thread.is_alive()):
+            return
 
-            processed = 0
-            for log_entry in _pending_logs[:]:
-                try:
-                    if self._publish_log(log_entry):
-                        _pending_logs.remove(log_entry)
-                        processed += 1
-                except Exception as e:
-                    logger.error(f"Failed to process pending log: {e}")
+        self.drain_thread = threading.Thread(target=self._drain_outbox, daemon=True)
+        self.drain_thread.start()
 
-            if processed > 0:
-                logger.info(f"Processed {processed} pending error logs for {self.service_name}")
+    def _drain_outbox(self):
+        """Send queued logs in order, many entries per MQTT message"""
+        processed = 0
+        while self.connected:
+            batch = self.outbox.peek(OUTBOX_BATCH_SIZE)
+            if not batch:
+                break
+            self._batch_acked.clear()
+            with self._batch_lock:
+                self._batch_publishing = True
+            try:
+                result = self.client.publish(ERROR_LOG_BATCH_TOPIC, json.dumps(batch), qos=QOS)
+                rc, mid = result.rc, result.mid
+            except Exception as e:
+                logger.error(f"Failed to send error log batch: {e}")
+                rc, mid = mqtt.MQTT_ERR_UNKNOWN, None
+            with self._batch_lock:
+                self._batch_publishing = False
+                if rc == mqtt.MQTT_ERR_SUCCESS and mid in self._batch_early_acks:
+                    self._batch_acked.set()
+                else:
+                    self._batch_mid = mid
+                self._batch_early_acks.clear()
+            if rc != mqtt.MQTT_ERR_SUCCESS:
+                break
+
+            # Entries leave the disk outbox only after the broker's PUBACK; a
+            # batch that is not acknowledged in time is sent again later
+            if not self._batch_acked.wait(OUTBOX_ACK_TIMEOUT):
+                with self._batch_lock:
+                    self._batch_mid = None
+                logger.warning(f"Error log batch not acknowledged for {self.service_name}, keeping it queued")
+                break
+            self.outbox.ack(len(batch))
+            processed += len(batch)
+
+        if processed > 0:
+            logger.info(f"Sent {processed} queued error logs for {self.service_name}")
 
     def _publish_log(self, log_entry: Dict[str, Any]) -> bool:
         """Publish a single log entry"""
@@ -232,51 +992,130 @@ class UnifiedErrorLogger:
         if additional_info:
             log_entry.update(additional_info)
 
-        # Try to publish immediately
-        if self._publish_log(log_entry):
-            logger.debug(f"Error log sent immediately: {function_name}")
-        else:
-            # Queue for later if connection is down
-            self._queue_log(log_entry)
-            logger.warning(f"Error log queued (connection down): {function_name}")
+        # Repeats inside the de-dup window are counted and reported in one summary
+        fingerprint = (self.service_name, function_name, normalize_error_message(str(error_detail)))
+        if not self.deduplicator.register(fingerprint, log_entry):
+            logger.debug(f"Error log collapsed into summary: {function_name}")
+            return
 
-    def _queue_log(self, log_entry: Dict[str, Any]):
-        """Queue log entry for later processing"""
-        with _pending_logs_lock:
-            if len(_pending_logs) >= MAX_PENDING_LOGS:
-                # Remove oldest entry
-                removed = _pending_logs.pop(0)
-                logger.warning(f"Pending logs queue full, dropped oldest entry from {removed.get('source', 'unknown')}")
+        self._send(log_entry)
 
-            _pending_logs.append(log_entry)
+    def _send(self, log_entry: Dict[str, Any]):
+        """Publish now, or queue behind the outbox backlog so logs stay in order"""
+        if not len(self.outbox) and self._publish_log(log_entry):
+            logger.debug(f"Error log sent immediately: {log_entry.get('data', '')[:50]}")
+        else:
+            self.outbox.put(log_entry)
+            if self.connected:
+                self._start_drain()
+            else:
+                logger.warning(f"Error log queued (connection down): {log_entry.get('data', '')[:50]}")
+
+    def _dedup_flush_loop(self):
+        """Publish summaries for closed de-dup windows"""
+        while not self._stopping.wait(DEDUP_FLUSH_INTERVAL):
+            try:
+                for summary in self.deduplicator.collect():
+                    self._send(summary)
+            except Exception as e:
+                logger.error(f"Error flushing error log summaries: {e}")
 
     def _on_message(self, client, userdata, msg):
         """Handle incoming error messages from MQTT subscription"""
         try:
+            if msg.topic == ERROR_DATA_REQUEST_TOPIC:
+                self._publish_listing()
+                return
+            if msg.topic == ERROR_QUERY_TOPIC:
+                self._answer_query(msg.payload)
+                return
+
             # Decode message payload
             payload = msg.payload.decode('utf-8')
-            log_entry = json.loads(payload)
-
-            # Add reception timestamp
-            log_entry['receivedAt'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            log_entries = json.loads(payload)
+            if msg.topic != ERROR_LOG_BATCH_TOPIC:
+                log_entries = [log_entries]
 
-            # Save to JSON file
-            _add_stored_log(log_entry)
+            # Add reception timestamp and append to the segment log
+            received_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            store = get_log_store()
+            for log_entry in log_entries:
+                log_entry['receivedAt'] = received_at
+                store.append(log_entry)
 
-            logger.debug(f"Error log received from {log_entry.get('source', 'unknown')}: "
-                        f"{log_entry.get('data', 'N/A')[:50]}...")
+            logger.debug(f"{len(log_entries)} error log(s) received from "
+                        f"{log_entries[0].get('source', 'unknown') if log_entries else 'unknown'}")
 
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode error log JSON: {e}")
         except Exception as e:
             logger.error(f"Error processing message: {e}")
 
+    def _publish_listing(self):
+        """Publish the newest stored logs, streamed from the segments, for the UI"""
+        try:
+            listing = list(iter_stored_logs(limit=MAX_LOG_ENTRIES))
+            self.client.publish(ERROR_DATA_TOPIC, json.dumps(listing), qos=QOS)
+            logger.debug(f"Published {len(listing)} stored error logs to {ERROR_DATA_TOPIC}")
+        except Exception as e:
+            logger.error(f"Error publishing stored log listing: {e}")
+
+    def _answer_query(self, payload: bytes):
+        """
+        Answer a query on ERROR_QUERY_TOPIC.
+
+        Request: {"requestId", "source", "type", "from", "to", "page", "pageSize",
+                  "order": "desc"|"asc", "responseTopic"}; source and type may be a
+                  string or a list, from/to use "%Y-%m-%d %H:%M:%S".
+        Response: {"requestId", "status", "total", "page", "pageSize", "pages",
+                   "entries", "counts": {"types", "sources"}}
+        """
+        def as_list(value):
+            return [value] if isinstance(value, str) else (value or None)
+
+        request = {}
+        try:
+            request = json.loads(payload.decode('utf-8')) if payload else {}
+            page = max(1, int(request.get("page", 1)))
+            page_size = min(QUERY_MAX_PAGE_SIZE, max(1, int(request.get("pageSize", QUERY_DEFAULT_PAGE_SIZE))))
+            result = query_stored_logs(
+                sources=as_list(request.get("source")),
+                types=as_list(request.get("type")),
+                start=request.get("from") or None,
+                end=request.get("to") or None,
+                offset=(page - 1) * page_size,
+                limit=page_size,
+                newest_first=request.get("order", "desc") != "asc"
+            )
+            response = {
+                "requestId": request.get("requestId"),
+                "status": "success",
+                "total": result["total"],
+                "page": page,
+                "pageSize": page_size,
+                "pages": (result["total"] + page_size - 1) // page_size,
+                "entries": result["entries"],
+                "counts": result["counts"]
+            }
+        except Exception as e:
+            logger.error(f"Error answering error log query: {e}")
+            response = {"requestId": request.get("requestId") if isinstance(request, dict) else None,
+                        "status": "error", "message": str(e)}
+
+        response_topic = request.get("responseTopic") if isinstance(request, dict) else None
+        self.client.publish(response_topic or ERROR_QUERY_RESPONSE_TOPIC, json.dumps(response), qos=QOS)
+
     def shutdown(self):
         """Gracefully shutdown the error logger"""
         try:
+            self._stopping.set()
+            for summary in self.deduplicator.collect(force=True):
+                self._send(summary)
             if self.client:
                 self.client.loop_stop()
                 self.client.disconnect()
+            if self.store_logs and _log_store is not None:
+                _log_store.close()
             logger.info(f"Error logger shutdown for {self.service_name}")
         except Exception as e:
             logger.error(f"Error during error logger shutdown: {e}")
@@ -286,7 +1125,7 @@ class UnifiedErrorLogger:
 _global_logger = None
 
 def initialize_error_logger(service_name: str, mqtt_broker: str = DEFAULT_MQTT_BROKER,
-                          mqtt_port: int = DEFAULT_MQTT_PORT) -> UnifiedErrorLogger:
+                          mqtt_port: int = DEFAULT_MQTT_PORT, store_logs: bool = False) -> UnifiedErrorLogger:
     """
     Initialize global error logger for a service
 
@@ -294,14 +1133,16 @@ def initialize_error_logger(service_name: str, mqtt_broker: str = DEFAULT_MQTT_B
         service_name: Name of the service
         mqtt_broker: MQTT broker address
         mqtt_port: MQTT broker port
+        store_logs: Store received logs in the segment log (error log service only)
 
     Returns:
         UnifiedErrorLogger instance
     """
     global _global_logger
-    # Load existing logs from JSON at startup
-    _load_stored_logs()
-    _global_logger = UnifiedErrorLogger(service_name, mqtt_broker, mqtt_port)
+    if store_logs:
+        # Load indexes and the recent tail from the segments at startup
+        get_log_store()
+    _global_logger = UnifiedErrorLogger(service_name, mqtt_broker, mqtt_port, store_logs)
     _global_logger.initialize()
     return _global_logger
 
@@ -330,4 +1171,17 @@ def shutdown_error_logger():
     global _global_logger
     if _global_logger:
         _global_logger.shutdown()
-        _global_logger = None
\ No newline at end of file
+        _global_logger = None
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.info("Starting Error Log Service...")
+    initialize_error_logger("ErrorLogService", store_logs=True)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Error Log Service interrupted, shutting down...")
+    finally:
+        shutdown_error_logger()
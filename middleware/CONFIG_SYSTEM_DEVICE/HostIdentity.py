@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Host Identity Cache
+Resolves the MAC address and IP of this node once and shares the result with
+every service. Lookups read sysfs directly instead of forking ip/ifconfig, and
+the cache is dropped when the kernel reports a link or address change (netlink),
+or when /sys/class/net changes on hosts where netlink is not available.
+"""
+
+import os
+import time
+import socket
+import struct
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger("HostIdentity")
+
+# --- Configuration ---
+SYS_CLASS_NET = "/sys/class/net"
+PROC_NET_ROUTE = "/proc/net/route"
+DEFAULT_MAC = "00:00:00:00:00:00"
+DEFAULT_INTERFACES = ('eth0', 'wlan0')
+SYSFS_CHECK_INTERVAL = 5  # seconds between /sys/class/net checks without netlink
+
+# Netlink multicast groups for link and IPv4 address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+SIOCGIFADDR = 0x8915
+
+# --- Cache State ---
+_cache: Dict[Any, Any] = {}
+_cache_lock = threading.Lock()
+_netlink_socket = None
+_netlink_opened = False
+_sysfs_signature = None
+_last_sysfs_check = 0.0
+
+
+def _open_netlink():
+    """Subscribe to kernel link/address events (Linux only)"""
+    global _netlink_socket, _netlink_opened
+    _netlink_opened = True
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        sock.setblocking(False)
+        _netlink_socket = sock
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Netlink unavailable, falling back to sysfs checks: {e}")
+        _netlink_socket = None
+
+
+def _read_sys_attr(interface: str, attr: str) -> Optional[str]:
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface, attr), 'r') as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _read_sysfs_signature() -> Tuple:
+    """Snapshot of interface names, states and addresses"""
+    try:
+        interfaces = sorted(os.listdir(SYS_CLASS_NET))
+    except OSError:
+        return ()
+    return tuple(
+        (name, _read_sys_attr(name, 'operstate'), _read_sys_attr(name, 'address'))
+        for name in interfaces
+    )
+
+
+def _network_changed() -> bool:
+    """Return True when the network configuration changed since the last call"""
+    global _sysfs_signature, _last_sysfs_check
+
+    if not _netlink_opened:
+        _open_netlink()
+
+    if _netlink_socket is not None:
+        changed = False
+        while True:
+            try:
+                if not _netlink_socket.recv(65536):
+                    break
+                changed = True
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Receive buffer overrun; events were lost so refresh anyway
+                changed = True
+                break
+        return changed
+
+    now = time.monotonic()
+    if _sysfs_signature is not None and now - _last_sysfs_check < SYSFS_CHECK_INTERVAL:
+        return False
+    _last_sysfs_check = now
+    signature = _read_sysfs_signature()
+    changed = _sysfs_signature is not None and signature != _sysfs_signature
+    _sysfs_signature = signature
+    return changed
+
+
+def _cached(key, resolver):
+    with _cache_lock:
+        if _network_changed():
+            _cache.clear()
+        if key not in _cache:
+            _cache[key] = resolver()
+        return _cache[key]
+
+
+def _is_valid_mac(mac_address: Optional[str]) -> bool:
+    return bool(mac_address) and len(mac_address) == 17 and \
+        len(mac_address.split(':')) == 6 and mac_address != DEFAULT_MAC
+
+
+def _interface_mac(interface: str, require_up: bool = True) -> Optional[str]:
+    if require_up and _read_sys_attr(interface, 'operstate') != 'up':
+        return None
+    mac_address = _read_sys_attr(interface, 'address')
+    return mac_address if _is_valid_mac(mac_address) else None
+
+
+def _getmac_fallback() -> Optional[str]:
+    try:
+        import getmac
+        mac_address = getmac.get_mac_address()
+        if _is_valid_mac(mac_address):
+            return mac_address.lower()
+    except ImportError:
+        logger.warning("getmac library not available")
+    except Exception as e:
+        logger.warning(f"getmac library method failed: {e}")
+    return None
+
+
+def _resolve_active_mac(interfaces: Tuple[str, ...], scan_all: bool) -> str:
+    for interface in interfaces:
+        mac_address = _interface_mac(interface)
+        if mac_address:
+            logger.info(f"Found active MAC address from {interface}: {mac_address}")
+            return mac_address
+
+    if scan_all:
+        try:
+            others = sorted(os.listdir(SYS_CLASS_NET))
+        except OSError:
+            others = []
+        for interface in others:
+            if interface == 'lo' or interface in interfaces:
+                continue
+            mac_address = _interface_mac(interface)
+            if mac_address:
+                logger.info(f"Found active MAC address from {interface}: {mac_address}")
+                return mac_address
+
+    mac_address = _getmac_fallback()
+    if mac_address:
+        logger.info(f"Found MAC address using getmac library: {mac_address}")
+        return mac_address
+
+    logger.warning("No active network interface found, using default MAC")
+    return DEFAULT_MAC
+
+
+def _default_route_interface() -> Optional[str]:
+    try:
+        with open(PROC_NET_ROUTE, 'r') as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 1 and fields[1] == '00000000':
+                    return fields[0]
+    except OSError:
+        pass
+    return None
+
+
+def _resolve_default_mac() -> str:
+    interface = _default_route_interface()
+    if interface:
+        mac_address = _interface_mac(interface, require_up=False)
+        if mac_address:
+            return mac_address
+    return _getmac_fallback() or DEFAULT_MAC
+
+
+def _resolve_interfaces() -> Tuple[str, ...]:
+    try:
+        names = os.listdir(SYS_CLASS_NET)
+    except OSError:
+        return ()
+
+    def ifindex(name):
+        try:
+            return int(_read_sys_attr(name, 'ifindex') or 0)
+        except ValueError:
+            return 0
+    return tuple(sorted(names, key=lambda name: (ifindex(name), name)))
+
+
+def _resolve_interface_ip(interface: str) -> Optional[str]:
+    try:
+        import fcntl
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            packed = struct.pack('256s', interface[:15].encode('utf-8'))
+            return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), SIOCGIFADDR, packed)[20:24])
+    except (ImportError, OSError):
+        return None
+
+
+# --- Public API ---
+def get_active_mac_address(interfaces: Iterable[str] = DEFAULT_INTERFACES, scan_all: bool = False) -> str:
+    """
+    Get MAC address of the first active interface in priority order.
+
+    Args:
+        interfaces: Preferred interface names, highest priority first
+        scan_all: Also consider any other active interface before giving up
+
+    Returns:
+        Lowercase MAC address, or 00:00:00:00:00:00 when nothing is active
+    """
+    interfaces = tuple(interfaces)
+    return _cached(('active_mac', interfaces, scan_all),
+                   lambda: _resolve_active_mac(interfaces, scan_all))
+
+
+def get_default_mac_address() -> str:
+    """Get MAC address of the default-route interface (same as getmac.get_mac_address())"""
+    return _cached(('default_mac',), _resolve_default_mac)
+
+
+def get_interface_ip(interface: str) -> Optional[str]:
+    """Get IPv4 address of an interface, or None when it has no address"""
+    return _cached(('ip', interface), lambda: _resolve_interface_ip(interface))
+
+
+def get_interfaces() -> Tuple[str, ...]:
+    """Get network interface names in kernel (ifindex) order, as `ip addr` lists them"""
+    return _cached(('interfaces',), _resolve_interfaces)
+
+
+def get_interface_mac(interface: str) -> Optional[str]:
+    """Get MAC address of an interface whether or not it is up, or None when it has none"""
+    return _cached(('mac', interface), lambda: _interface_mac(interface, require_up=False))
+
+
+def invalidate_host_identity():
+    """Drop cached values so the next lookup resolves them again"""
+    with _cache_lock:
+        _cache.clear()
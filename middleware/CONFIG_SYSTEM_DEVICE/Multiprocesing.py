@@ -24,11 +24,8 @@ if __name__ == '__main__':
     # Daftar file Python yang ingin dijalankan
     scripts = [
          'ApiCombined.py',
-         'AutomationLogic.py',
-         'AutomationSchedule.py',
-         'AutomationUnified.py',
-        'AutomationValue.py',
-         'AutomationVoice.py',
+         # Logic, Schedule, Unified, Value and Voice share one process and one MQTT connection
+         'AutomationRuntime.py',
          'Button.py',
           'DeviceConfig.py',
         'PayloadStatic.py',
@@ -7,12 +7,12 @@ Publishes node network information to MQTT broker every 10 seconds
 import json
 import os
 import time
-import subprocess
 import psutil
 from datetime import datetime
 import uuid
 import paho.mqtt.client as mqtt
 import logging
+import HostIdentity
 
 # Setup logging
 logging.basicConfig(
@@ -33,108 +33,14 @@ BASE_TOPIC_MQTT = "NANO_PI/"
 def get_active_mac_address():
     """Get MAC address from active network interface"""
     # Check for all common interface names (not just eth0/wlan0)
-    common_interfaces = [
-        'eno1', 'eno2', 'ens1', 'ens2', 'ens3',    # Ethernet
-        'wlo1', 'wlo2', 'wlan0', 'wlan1', 'wlx',  # Wireless
+    common_interfaces = (
+        'eno1', 'eno2', 'ens1', 'ens2', 'ens3',   # Ethernet
+        'wlo1', 'wlo2', 'wlan0', 'wlan1',         # Wireless
         'eth0', 'eth1', 'eth2',                   # Legacy Ethernet
-        'wlan0', 'wlan1', 'wlan2'                  # Legacy Wireless
-    ]
-
-    # Method 1: Use ip link command (most reliable)
-    for interface in common_interfaces:
-        try:
-            result = subprocess.run(
-                ["ip", "link", "show", interface],
-                capture_output=True, text=True, timeout=2
-            )
-            if result.returncode == 0 and 'link/ether' in result.stdout:
-                # Find the MAC address
-                for line in result.stdout.split('\n'):
-                    if 'link/ether' in line:
-                        mac_parts = line.strip().split()
-                        if len(mac_parts) >= 2:
-                            mac_address = mac_parts[1].upper()
-                            # Validate MAC format
-                            if len(mac_address.split(':')) == 6 and len(mac_address) == 17:
-                                # Check if interface is UP by looking for <UP> flag
-                                first_line = result.stdout.split('\n')[0]
-                                if '<UP,' in first_line or 'UP,' in first_line:
-                                    logger.info(f"Found active MAC address from {interface}: {mac_address}")
-                                    return mac_address
-                                else:
-                                    logger.info(f"Interface {interface} exists but is not UP (MAC: {mac_address})")
-        except subprocess.SubprocessError:
-            continue
-
-    # Method 2: Use ifconfig (fallback)
-    try:
-        result = subprocess.run(['ifconfig'], capture_output=True, text=True, timeout=5)
-        if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            i = 0
-            while i < len(lines):
-                line = lines[i].strip()
-                # Look for interface lines (not indented)
-                if line and not line.startswith(' ') and not line.startswith('\t'):
-                    interface_name = line.split(':')[0].strip()
-                    if interface_name in common_interfaces or interface_name.startswith(('en', 'wl', 'eth', 'wlan')):
-                        logger.info(f"Checking interface {interface_name} from ifconfig")
-                        # Look for ether line
-                        j = i + 1
-                        while j < len(lines) and (lines[j].startswith(' ') or lines[j].startswith('\t')):
-                            if 'ether ' in lines[j]:
-                                mac_match = lines[j].split('ether ')[1].split()[0].strip().upper()
-                                if len(mac_match.split(':')) == 6 and len(mac_match) == 17:
-                                    logger.info(f"Found MAC address from {interface_name}: {mac_match}")
-                                    return mac_match
-                            j += 1
-                i += 1
-    except Exception as e:
-        logger.warning(f"ifconfig method failed: {e}")
-
-    # Method 3: Use sysfs directly (for all known interfaces)
-    try:
-        net_dir = '/sys/class/net'
-        if os.path.exists(net_dir):
-            for item in os.listdir(net_dir):
-                interface_path = os.path.join(net_dir, item)
-                address_file = os.path.join(interface_path, 'address')
-                operstate_file = os.path.join(interface_path, 'operstate')
-
-                try:
-                    # Check if operstate is up
-                    with open(operstate_file, 'r') as f:
-                        operstate = f.read().strip()
-
-                    if operstate.lower() == 'up':
-                        # Get MAC address
-                        with open(address_file, 'r') as f:
-                            mac_address = f.read().strip().upper()
-
-                        # Validate MAC format
-                        if len(mac_address.split(':')) == 6 and len(mac_address) == 17 and mac_address != "00:00:00:00:00:00":
-                            logger.info(f"Found active MAC address from {item} (sysfs): {mac_address}")
-                            return mac_address
-                except (FileNotFoundError, PermissionError):
-                    continue
-    except Exception as e:
-        logger.warning(f"sysfs method failed: {e}")
-
-    # Method 4: Try getmac library as last resort
-    try:
-        import getmac
-        mac_address = getmac.get_mac_address()
-        if mac_address and mac_address.upper() != "00:00:00:00:00:00":
-            logger.info(f"Found MAC address using getmac library: {mac_address.upper()}")
-            return mac_address.upper()
-    except ImportError:
-        logger.warning("getmac library not available")
-    except Exception as e:
-        logger.warning(f"getmac library method failed: {e}")
-
-    # Final fallback
-    logger.error("Could not find any valid MAC address from any network interface")
-    return "00:00:00:00:00:00"
+        'wlan2'                                   # Legacy Wireless
+    )
+    # Any other active interface is used before giving up (scan_all)
+    return HostIdentity.get_active_mac_address(common_interfaces, scan_all=True).upper()
 
 def load_node_info_config():
     """Load node information configuration from file"""
@@ -217,116 +123,50 @@ def get_network_info():
     try:
         info = {}
 
-        # Get active network interfaces and their IP addresses using hostname -I and ip addr
-        try:
-            # Use hostname -I to get main IP (usually acts like ifconfig)
-            hostname_result = subprocess.check_output(
-                ["hostname", "-I"],
-                universal_newlines=True,
-                stderr=subprocess.DEVNULL
-            ).strip()
-
-            # This might give multiple IPs separated by spaces
-            all_ips = hostname_result.split()
-
-            logger.info(f"Hostname IPs found: {all_ips}")
-
-        except subprocess.CalledProcessError:
-            all_ips = []
-
-        # Get all interface addresses using ip addr
-        try:
-            addr_result = subprocess.check_output(
-                ["ip", "addr", "show"],
-                universal_newlines=True
-            )
-
-            # Parse interface information
-            interfaces_info = {}
-            current_interface = None
-
-            for line in addr_result.split('\n'):
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Interface header line (e.g., "2: wlan0: <BROADCAST,MULTICAST,UP,LOWER_UP>")
-                if line and ':' in line and not line.startswith(' '):
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        current_interface = parts[1].strip()
-                        interfaces_info[current_interface] = {
-                            'mac': 'N/A',
-                            'ip': 'N/A',
-                            'state': 'DOWN'
-                        }
-
-                        # Check if interface is UP
-                        if '<UP,' in line or 'UP,' in line:
-                            interfaces_info[current_interface]['state'] = 'UP'
-
-                # MAC address line
-                elif current_interface and 'link/ether' in line:
-                    mac_parts = line.split('link/ether')[1].split()
-                    if mac_parts:
-                        interfaces_info[current_interface]['mac'] = mac_parts[0].upper()
-
-                # IP address line
-                elif current_interface and line.startswith('inet '):
-                    ip_parts = line.split()
-                    if len(ip_parts) >= 2:
-                        ip_addr = ip_parts[1].split('/')[0]
-                        interfaces_info[current_interface]['ip'] = ip_addr
-
-            logger.info(f"Interface info: {interfaces_info}")
-
-            # Determine which interfaces to report
-            # Look for ethernet-like (en*, eth*) and wireless-like (wl*, wlan, wlo*) interfaces with IPs
-            ethernet_interfaces = []
-            wireless_interfaces = []
-
-            for iface, iface_data in interfaces_info.items():
-                # Check if interface has an IP address (not just 'N/A')
-                if iface_data['ip'] != 'N/A':
-                    if iface.startswith(('en', 'eth')):
-                        ethernet_interfaces.append(iface)
-                    elif iface.startswith(('wl', 'wlan', 'wlo')):
-                        wireless_interfaces.append(iface)
-
-            # Set IP addresses based on detected interfaces with IPs
-            if ethernet_interfaces:
-                interface_name = ethernet_interfaces[0]
-                info["ip_eth"] = interfaces_info[interface_name]['ip']
-                info["mac_address_eth"] = interfaces_info[interface_name]['mac']
-                logger.info(f"Using Ethernet interface {interface_name}: IP={info['ip_eth']}, MAC={info['mac_address_eth']}")
-            else:
-                info["ip_eth"] = "N/A"
-                info["mac_address_eth"] = "N/A"
-
-            if wireless_interfaces:
-                interface_name = wireless_interfaces[0]
-                info["ip_wlan"] = interfaces_info[interface_name]['ip']
-                info["mac_address_wlan"] = interfaces_info[interface_name]['mac']
-                logger.info(f"Using Wireless interface {interface_name}: IP={info['ip_wlan']}, MAC={info['mac_address_wlan']}")
-            else:
-                info["ip_wlan"] = "N/A"
-                info["mac_address_wlan"] = "N/A"
-
-            # Set general MAC address (prefer ethernet, fallback to wireless)
-            if info["mac_address_eth"] != "N/A":
-                info["mac_address"] = info["mac_address_eth"]
-            elif info["mac_address_wlan"] != "N/A":
-                info["mac_address"] = info["mac_address_wlan"]
-            else:
-                # Fallback to get_active_mac_address if no interfaces found
-                info["mac_address"] = get_active_mac_address()
-
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"Failed to get network addresses: {e}")
+        # Interface addresses come from the shared HostIdentity cache (sysfs and
+        # SIOCGIFADDR, refreshed on netlink changes) instead of forking ip addr
+        # Look for ethernet-like (en*, eth*) and wireless-like (wl*, wlan, wlo*) interfaces with IPs
+        ethernet_interfaces = []
+        wireless_interfaces = []
+
+        for iface in HostIdentity.get_interfaces():
+            if not HostIdentity.get_interface_ip(iface):
+                continue
+            if iface.startswith(('en', 'eth')):
+                ethernet_interfaces.append(iface)
+            elif iface.startswith(('wl', 'wlan', 'wlo')):
+                wireless_interfaces.append(iface)
+
+        def interface_mac(iface):
+            mac_address = HostIdentity.get_interface_mac(iface)
+            return mac_address.upper() if mac_address else "N/A"
+
+        # Set IP addresses based on detected interfaces with IPs
+        if ethernet_interfaces:
+            interface_name = ethernet_interfaces[0]
+            info["ip_eth"] = HostIdentity.get_interface_ip(interface_name)
+            info["mac_address_eth"] = interface_mac(interface_name)
+            logger.info(f"Using Ethernet interface {interface_name}: IP={info['ip_eth']}, MAC={info['mac_address_eth']}")
+        else:
             info["ip_eth"] = "N/A"
-            info["ip_wlan"] = "N/A"
             info["mac_address_eth"] = "N/A"
+
+        if wireless_interfaces:
+            interface_name = wireless_interfaces[0]
+            info["ip_wlan"] = HostIdentity.get_interface_ip(interface_name)
+            info["mac_address_wlan"] = interface_mac(interface_name)
+            logger.info(f"Using Wireless interface {interface_name}: IP={info['ip_wlan']}, MAC={info['mac_address_wlan']}")
+        else:
+            info["ip_wlan"] = "N/A"
             info["mac_address_wlan"] = "N/A"
+
+        # Set general MAC address (prefer ethernet, fallback to wireless)
+        if info["mac_address_eth"] != "N/A":
+            info["mac_address"] = info["mac_address_eth"]
+        elif info["mac_address_wlan"] != "N/A":
+            info["mac_address"] = info["mac_address_wlan"]
+        else:
+            # Fallback to get_active_mac_address if no interfaces found
             info["mac_address"] = get_active_mac_address()
 
         return info
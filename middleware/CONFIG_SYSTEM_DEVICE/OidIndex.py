@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+SNMP OID Index
+Sorted index of the OIDs served by the SNMP agents (PROTOCOL_OUT/SNMP_SERVER
+and MODULAR_I2C/snmp_server), compiled once from the register definitions in
+RegOID. Resolving an OID is a dict lookup and the next OID for GETNEXT/GETBULK
+is a bisect over the sorted OIDs, so a walk no longer scans every object.
+
+pysnmp hangs every MibScalar directly under its root node and finds the next
+one with a linear list search (and copies the key list to find the first
+one); install_sorted_root() swaps that node's children for an IndexedOidDict
+backed by the same sorted lookup and its getNextBranch for one that does not
+copy.
+"""
+
+import types
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from pysnmp.smi import error
+from pysnmp.smi.indices import OidOrderedDict
+
+# --- OID layout (below sysOID) ---
+CATEGORY_SETTING = 5
+CATEGORY_EQUIPMENT = 12
+# Modular category -> number of module slots; the slot count is also the
+# second OID arc, e.g. sysOID.7.8.<module>.<pin * 10>
+MODULAR_SLOTS = {6: 2, 7: 8, 8: 8, 9: 8, 10: 8, 11: 8}
+
+# category: OID category; name: setting / pin variable / equipment value name
+# number: module number or equipment position; pin: pin number or value position
+OidEntry = namedtuple("OidEntry", "category name number pin")
+
+
+def parse_arcs(key: str) -> Tuple[int, ...]:
+    """'[10, 20]' (RegOID key) -> (10, 20)"""
+    return tuple(int(arc) for arc in key.strip("[]").split(",") if arc.strip())
+
+
+class OidIndex:
+    """OID tuple -> value, with ordered next/range lookups"""
+
+    def __init__(self):
+        self._values: Dict[Tuple[int, ...], Any] = {}
+        self._sorted = []
+        self._lengths = []
+        self._dirty = False
+
+    def add(self, oid, value):
+        oid = tuple(oid)
+        if oid not in self._values:
+            self._dirty = True
+        self._values[oid] = value
+
+    def remove(self, oid):
+        del self._values[tuple(oid)]
+        self._dirty = True
+
+    def clear(self):
+        self._values.clear()
+        self._dirty = True
+
+    def _order(self):
+        if self._dirty:
+            self._sorted = sorted(self._values)
+            self._lengths = sorted(set(len(oid) for oid in self._sorted), reverse=True)
+            self._dirty = False
+        return self._sorted
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, oid):
+        return tuple(oid) in self._values
+
+    def resolve(self, oid) -> Optional[Any]:
+        return self._values.get(tuple(oid))
+
+    def oids(self) -> list:
+        return self._order()
+
+    def lengths(self) -> list:
+        self._order()
+        return self._lengths
+
+    def items(self) -> Iterable[Tuple[Tuple[int, ...], Any]]:
+        return [(oid, self._values[oid]) for oid in self._order()]
+
+    def next_oid(self, oid) -> Optional[Tuple[int, ...]]:
+        """First OID strictly after oid (GETNEXT)"""
+        oids = self._order()
+        position = bisect_right(oids, tuple(oid))
+        return oids[position] if position < len(oids) else None
+
+    def range(self, oid, count: int) -> list:
+        """Up to count OIDs following oid (one GETBULK repetition run)"""
+        oids = self._order()
+        position = bisect_right(oids, tuple(oid))
+        return oids[position:position + count]
+
+
+def build_agent_index(sys_oid, setting_oids: Dict[str, str], modular_categories: Dict[int, Tuple[str, Dict[str, str]]],
+                      equipment: Iterable[Tuple[str, Iterable[str]]] = ()) -> OidIndex:
+    """Compile the agent's scalar OIDs (without the trailing .0 instance)
+
+    setting_oids and the pin maps in modular_categories are RegOID's inverted
+    maps ('[10]' -> name); equipment lists (name, value names) in OID order.
+    """
+    sys_oid = tuple(sys_oid)
+    index = OidIndex()
+
+    for key, var_name in setting_oids.items():
+        index.add(sys_oid + (CATEGORY_SETTING,) + parse_arcs(key),
+                  OidEntry(CATEGORY_SETTING, var_name, None, None))
+
+    for category, (type_modular, pin_oids) in modular_categories.items():
+        slots = MODULAR_SLOTS[category]
+        for number_modular in range(1, slots + 1):
+            for key, var_name in pin_oids.items():
+                pin_arc, = parse_arcs(key)
+                index.add(sys_oid + (category, slots, number_modular, pin_arc),
+                          OidEntry(category, var_name, number_modular, pin_arc // 10))
+
+    for position, (name, value_names) in enumerate(equipment):
+        for value_position, value_name in enumerate(value_names, 1):
+            index.add(sys_oid + (CATEGORY_EQUIPMENT, position, value_position),
+                      OidEntry(CATEGORY_EQUIPMENT, value_name, position, value_position))
+
+    return index
+
+
+class IndexedOidDict(OidOrderedDict):
+    """OidOrderedDict with bisect-based nextKey and no per-insert list scans"""
+
+    def __init__(self, *args, **kwargs):
+        self._index = OidIndex()
+        self._keys = None  # original key objects in OID order, rebuilt after changes
+        dict.__init__(self)
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._index.add(key, key)
+        self._keys = None
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._index.remove(key)
+        self._keys = None
+
+    def clear(self):
+        dict.clear(self)
+        self._index.clear()
+        self._keys = None
+
+    def keys(self):
+        # Cached list in OID order, shared between calls; do not modify it
+        if self._keys is None:
+            self._keys = [self._index.resolve(oid) for oid in self._index.oids()]
+        return self._keys
+
+    def firstKey(self):
+        oids = self._index.oids()
+        if not oids:
+            raise KeyError("empty")
+        return self._index.resolve(oids[0])
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def nextKey(self, key):
+        oid = self._index.next_oid(key)
+        if oid is None:
+            raise KeyError(key)
+        return self._index.resolve(oid)
+
+    def getKeysLens(self):
+        return self._index.lengths()
+
+
+def _indexed_next_branch(mib_tree, name, idx=None):
+    """MibTree.getNextBranch without copying the key list for the first OID"""
+    if mib_tree._vars:
+        first = mib_tree._vars.firstKey()
+        if name < first:
+            return mib_tree._vars[first]
+    try:
+        return mib_tree._vars[mib_tree._vars.nextKey(name)]
+    except KeyError:
+        raise error.NoSuchObjectError(idx=idx, name=name)
+
+
+def install_sorted_root(mib_builder):
+    """Index the children of pysnmp's root node; call before exporting objects"""
+    mib_tree, = mib_builder.importSymbols("SNMPv2-SMI", "iso")
+    if not isinstance(mib_tree._vars, IndexedOidDict):
+        mib_tree._vars = IndexedOidDict(mib_tree._vars)
+        mib_tree.getNextBranch = types.MethodType(_indexed_next_branch, mib_tree)
+    return mib_tree
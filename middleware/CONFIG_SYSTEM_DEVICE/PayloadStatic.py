@@ -1,22 +1,28 @@
+import os
 import json
 import time
+import heapq
 import threading
 from threading import Lock
 import paho.mqtt.client as mqtt
 import logging
 from datetime import datetime
 from BrokerTemplateManager import BrokerTemplateManager
-from BrokerResolver import BrokerResolver
+from BrokerResolver import BrokerResolver, PUBLISH_SENT, PUBLISH_QUEUED
 
 CONFIG_FILE_PATH = "../MODULAR_I2C/JSON/Config/mqtt_config.json"
 DATA_FILE_PATH = "./JSON/payloadStaticConfig.json"
 ERROR_LOG_TOPIC = "subrack/error/log"
+CONFIG_CHECK_INTERVAL = 5  # seconds between mtime checks for edits made outside the CRUD handlers
+PUBLISH_RETRY_DELAY = 1  # seconds before retrying a failed publish
+CLEANUP_INTERVAL = 60  # seconds between broker cleanup / health reports
 
 # --- Setup Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("PayloadStaticService")
 
 json_lock = Lock()
+config_changed = threading.Event()  # set by CRUD handlers to reload the payload config
 
 # Publish error log to MQTT
 def log_error(client, error_message, error_type):
@@ -46,6 +52,18 @@ def write_json_file(file_path, data):
         except Exception as e:
             logger.error(f"Error writing JSON file at {file_path}: {e}")
 
+def notify_config_changed():
+    """Wake the publisher so it reloads the payload config"""
+    config_changed.set()
+
+def get_config_stamp(file_path):
+    """(mtime, size) of the config file, or None when it is missing"""
+    try:
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
 def load_mqtt_config():
     try:
         with open(CONFIG_FILE_PATH, "r") as file:
@@ -252,6 +270,7 @@ def handle_write_data(client, payload):
         # Add new entry to payloads
         current_data["payloads"].append(new_entry)
         write_json_file(DATA_FILE_PATH, current_data)
+        notify_config_changed()
 
         # Set LWT for the new entry
         update_lwt(pub_client, new_entry)
@@ -325,6 +344,7 @@ def handle_update_data(client, payload):
                 current_data["payloads"][i]["version"] = item.get("version", 1) + 1
 
                 write_json_file(DATA_FILE_PATH, current_data)
+                notify_config_changed()
                 update_lwt(pub_client, current_data["payloads"][i])
 
                 # Clear retained message for old topic if topic changed
@@ -373,6 +393,7 @@ def handle_delete_data(client, payload):
             # Update the data structure
             current_data["payloads"] = updated_payloads
             write_json_file(DATA_FILE_PATH, current_data)
+            notify_config_changed()
 
             # Clear retained message by publishing empty payload with retain=True
             try:
@@ -386,77 +407,115 @@ def handle_delete_data(client, payload):
         else:
             client.publish("response/data/delete", json.dumps({"status": "error", "message": f"No entry found with topic {topic}"}))
 
+def build_publish_items(data):
+    """Prepare publishable payloads once per config load: online status added and messages serialized"""
+    if not data or not isinstance(data, dict):
+        logger.warning("No valid payload data found or invalid format")
+        return {}
+
+    payloads = data.get('payloads', [])
+    if not payloads:
+        logger.warning("No payloads configured")
+        return {}
+
+    items = {}
+    for item in add_online_status(payloads):
+        topic = item.get("topic")
+        payload = item.get("data")
+        interval = item.get("interval", 5)  # Default 5 seconds if not set
+
+        # The first entry for a topic wins, as with the shared per-topic publish time
+        if not topic or not payload or interval <= 0 or topic in items:
+            continue
+
+        items[topic] = {
+            "interval": interval,
+            "message": json.dumps(payload),
+            "template_id": item.get("template_id"),
+            # Prepare payload data for broker resolver
+            "payload_data": {
+                "qos": item.get("qos", 0),
+                "retain": item.get("retain", False),
+                "lwt": item.get("lwt", True),
+                "template_id": item.get("template_id"),
+                "broker_config": item.get("broker_config", {})
+            }
+        }
+    return items
+
 def send_data_periodically():
-    """Send data periodically using template broker system with health monitoring."""
+    """
+    Send data periodically using template broker system with health monitoring.
+
+    The payload config is loaded once and reloaded only when a CRUD handler
+    signals a change or the file's mtime changes. Topics wait in a heap
+    ordered by their next publish deadline, so each wake-up only touches
+    the topics that are due.
+    """
     last_publish_times = {}  # Track last publish time for each topic
     broker_resolver = BrokerResolver(DATA_FILE_PATH)  # Initialize broker resolver
 
-    # Cleanup unhealthy connections periodically
-    cleanup_counter = 0
+    items = {}
+    schedule = []  # heap of (due_time, topic)
+    config_stamp = None
+    next_config_check = 0
+    next_cleanup = time.time() + CLEANUP_INTERVAL
 
     while True:
         try:
-            data = read_json_file(DATA_FILE_PATH)
-            if not data or not isinstance(data, dict):
-                logger.warning("No valid payload data found or invalid format")
-                time.sleep(5)
-                continue
-
-            # Get payloads array
-            payloads = data.get('payloads', [])
-            if not payloads:
-                logger.warning("No payloads configured")
-                time.sleep(5)
-                continue
-
-            data_with_online = add_online_status(payloads)
-            current_time = time.time()
-
-            for item in data_with_online:
-                topic = item.get("topic")
-                payload = item.get("data")
-                interval = item.get("interval", 5)  # Default 5 seconds if not set
-
-                if not topic or not payload or interval <= 0:
-                    continue
-
-                # Check if it's time to publish for this topic
-                last_publish = last_publish_times.get(topic, 0)
-                if current_time - last_publish >= interval:
-                    try:
-                        # Prepare payload data for broker resolver
-                        payload_data = {
-                            "qos": item.get("qos", 0),
-                            "retain": item.get("retain", False),
-                            "lwt": item.get("lwt", True),
-                            "template_id": item.get("template_id"),
-                            "broker_config": item.get("broker_config", {})
-                        }
-
-                        # Use broker resolver to publish
-                        success = broker_resolver.publish_to_topic(topic, json.dumps(payload), payload_data)
-
-                        if success:
-                            last_publish_times[topic] = current_time
-                            logger.info(f"✅ Published static data to {topic} (interval: {interval}s, template: {item.get('template_id')})")
-                        else:
-                            logger.warning(f"❌ Failed to publish to {topic} using template system")
-
-                    except Exception as e:
-                        logger.error(f"Error publishing to {topic}: {e}")
+            now = time.time()
+
+            # Reload on CRUD change or file edit
+            if config_changed.is_set() or now >= next_config_check:
+                next_config_check = now + CONFIG_CHECK_INTERVAL
+                stamp = get_config_stamp(DATA_FILE_PATH)
+                if config_changed.is_set() or stamp != config_stamp:
+                    config_changed.clear()
+                    config_stamp = stamp
+                    items = build_publish_items(read_json_file(DATA_FILE_PATH))
+                    last_publish_times = {topic: t for topic, t in last_publish_times.items() if topic in items}
+                    schedule = [(last_publish_times.get(topic, 0) + item["interval"], topic)
+                                for topic, item in items.items()]
+                    heapq.heapify(schedule)
+                    logger.info(f"Loaded {len(items)} static payload(s) from {DATA_FILE_PATH}")
+
+            # Publish every topic whose deadline has passed
+            while schedule and schedule[0][0] <= now:
+                _, topic = heapq.heappop(schedule)
+                item = items[topic]
+                next_due = now + PUBLISH_RETRY_DELAY
+                try:
+                    # Use broker resolver to publish
+                    result = broker_resolver.publish_to_topic(topic, item["message"], item["payload_data"])
+
+                    if result == PUBLISH_SENT:
+                        last_publish_times[topic] = now
+                        next_due = now + item["interval"]
+                        logger.info(f"✅ Published static data to {topic} (interval: {item['interval']}s, template: {item['template_id']})")
+                    elif result == PUBLISH_QUEUED:
+                        # The resolver owns the retry; publish again at the next interval only
+                        last_publish_times[topic] = now
+                        next_due = now + item["interval"]
+                        logger.warning(f"⏳ No healthy broker for {topic}, queued for retry")
+                    else:
+                        logger.warning(f"❌ Failed to publish to {topic} using template system")
+
+                except Exception as e:
+                    logger.error(f"Error publishing to {topic}: {e}")
+                heapq.heappush(schedule, (next_due, topic))
 
             # Periodic cleanup of unhealthy connections
-            cleanup_counter += 1
-            if cleanup_counter >= 60:  # Every 60 seconds
+            if now >= next_cleanup:
+                next_cleanup = now + CLEANUP_INTERVAL
                 broker_resolver.cleanup_unhealthy_connections()
-                cleanup_counter = 0
 
                 # Log health report
                 health_report = broker_resolver.get_broker_health_report()
                 logger.info(f"Broker Health Report: {health_report}")
 
-            # Sleep for 1 second to check intervals frequently
-            time.sleep(1)
+            # Sleep until the next deadline; a CRUD change wakes us early
+            wake_at = min(next_config_check, next_cleanup, schedule[0][0] if schedule else next_config_check)
+            config_changed.wait(max(0.0, wake_at - time.time()))
 
         except Exception as e:
             logger.error(f"Error in send_data_periodically: {e}")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Priority Publish Queue
+Bounded outgoing queue in front of one paho client. Control and alarm
+messages are sent before telemetry, the number of unacknowledged publishes
+handed to paho is capped so its internal queue cannot grow without bound
+while the uplink is slow, and when the queue is full telemetry is coalesced
+per topic (latest value wins) instead of growing memory.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger("PublishQueue")
+
+# --- Priorities (lower is sent first) ---
+PRIORITY_CONTROL = 0    # relay commands and command responses
+PRIORITY_ALARM = 1      # error logs and alarms
+PRIORITY_TELEMETRY = 2  # periodic data, coalesced per topic when the queue is full
+PRIORITY_NAMES = {
+    PRIORITY_CONTROL: "control",
+    PRIORITY_ALARM: "alarm",
+    PRIORITY_TELEMETRY: "telemetry",
+}
+
+# --- Configuration ---
+DEFAULT_QUEUE_SIZE = 100    # total queued messages across all priorities
+DEFAULT_MAX_INFLIGHT = 20   # publishes handed to paho but not yet acknowledged
+INFLIGHT_TIMEOUT = 10       # seconds before an unacknowledged publish stops counting
+RETRY_DELAY = 1             # seconds to back off after a failed publish
+IDLE_CHECK_INTERVAL = 0.5   # seconds between connection checks while messages wait
+
+
+class PublishQueue:
+    """Per-client bounded priority queue drained by a sender thread"""
+
+    def __init__(self, client, name: str = "", queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT):
+        self.client = client
+        self.name = name or "publish"
+        self.queue_size = queue_size
+        self.max_inflight = max_inflight
+
+        # One FIFO per priority; telemetry entries are lists so a newer value
+        # for the same topic can replace the queued payload in place
+        self._queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self._telemetry_by_topic: Dict[str, list] = {}
+        self._inflight: Dict[int, float] = {}
+        self._early_acks = set()  # acks that arrived inside the sender's publish() call
+        self._publishing = False
+        self._condition = threading.Condition()
+        self._stopping = False
+
+        self.published = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.dropped = {priority: 0 for priority in PRIORITY_NAMES}
+
+        # Chain on_publish so acknowledgements release in-flight slots; create
+        # the queue after the owner has set its own callbacks
+        self._user_on_publish = client.on_publish
+        client.on_publish = self._on_publish
+
+        self._sender = threading.Thread(target=self._sender_loop, name=f"PublishQueue-{self.name}", daemon=True)
+        self._sender.start()
+
+    def _depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _evict_for(self, priority: int) -> bool:
+        """Drop the oldest message of the lowest priority not above the new one"""
+        for victim in sorted(PRIORITY_NAMES, reverse=True):
+            if victim < priority:
+                break
+            queue = self._queues[victim]
+            if queue:
+                entry = queue.popleft()
+                if victim == PRIORITY_TELEMETRY and self._telemetry_by_topic.get(entry[0]) is entry:
+                    del self._telemetry_by_topic[entry[0]]
+                self.dropped[victim] += 1
+                return True
+        return False
+
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False,
+                priority: int = PRIORITY_TELEMETRY, supersede: bool = False) -> bool:
+        """Queue a message; returns False if it or an older message was dropped.
+
+        With supersede, telemetry still queued for the same topic is discarded
+        so an older value cannot be sent after this one.
+        """
+        with self._condition:
+            if self._stopping:
+                return False
+
+            if supersede:
+                self._discard_telemetry(topic)
+
+            full = self._depth() >= self.queue_size
+            if full and priority == PRIORITY_TELEMETRY:
+                queued = self._telemetry_by_topic.get(topic)
+                if queued is not None:
+                    queued[1:] = [payload, qos, retain]
+                    self.coalesced += 1
+                    return True
+
+            dropped = False
+            if full:
+                dropped = True
+                if not self._evict_for(priority):
+                    self.dropped[priority] += 1
+                    logger.warning(f"Publish queue {self.name} full, dropped "
+                                   f"{PRIORITY_NAMES[priority]} message for {topic}")
+                    return False
+
+            entry = [topic, payload, qos, retain]
+            self._queues[priority].append(entry)
+            if priority == PRIORITY_TELEMETRY:
+                self._telemetry_by_topic[topic] = entry
+            self.max_depth = max(self.max_depth, self._depth())
+            self._condition.notify_all()
+
+        if dropped:
+            logger.warning(f"Publish queue {self.name} full, dropped oldest lower-priority message")
+        return not dropped
+
+    def _discard_telemetry(self, topic: str):
+        queue = self._queues[PRIORITY_TELEMETRY]
+        stale = [entry for entry in queue if entry[0] == topic]
+        for entry in stale:
+            queue.remove(entry)
+        self._telemetry_by_topic.pop(topic, None)
+        self.coalesced += len(stale)
+
+    def notify(self):
+        """Wake the sender, e.g. from the owner's on_connect"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def _on_publish(self, client, userdata, mid):
+        with self._condition:
+            if self._inflight.pop(mid, None) is None and self._publishing:
+                # qos 0, or an ack beating the sender back to the lock, arrives
+                # before the mid is registered; acks for mids already expired
+                # from _inflight are dropped
+                self._early_acks.add(mid)
+            self._condition.notify_all()
+        if self._user_on_publish:
+            self._user_on_publish(client, userdata, mid)
+
+    def _can_send(self) -> bool:
+        if self._inflight:
+            cutoff = time.time() - INFLIGHT_TIMEOUT
+            for mid in [mid for mid, sent in self._inflight.items() if sent < cutoff]:
+                del self._inflight[mid]
+        return len(self._inflight) < self.max_inflight and self.client.is_connected()
+
+    def _pop_next(self):
+        for priority in sorted(PRIORITY_NAMES):
+            queue = self._queues[priority]
+            if queue:
+                entry = queue.popleft()
+                if priority == PRIORITY_TELEMETRY and self._telemetry_by_topic.get(entry[0]) is entry:
+                    del self._telemetry_by_topic[entry[0]]
+                return priority, entry
+        return None, None
+
+    def _sender_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not (self._depth() and self._can_send()):
+                    # Connection state has no callback here, so poll while messages wait
+                    self._condition.wait(IDLE_CHECK_INTERVAL if self._depth() else None)
+                if self._stopping:
+                    return
+                priority, entry = self._pop_next()
+                self._publishing = True
+
+            topic, payload, qos, retain = entry
+            try:
+                result = self.client.publish(topic, payload, qos=qos, retain=retain)
+                rc, mid = result.rc, result.mid
+            except Exception as e:
+                logger.warning(f"Publish queue {self.name} publish error on {topic}: {e}")
+                rc, mid = mqtt.MQTT_ERR_UNKNOWN, None
+
+            with self._condition:
+                self._publishing = False
+                early_ack = mid in self._early_acks
+                self._early_acks.clear()
+                if rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.published += 1
+                    if not early_ack:
+                        self._inflight[mid] = time.time()
+                    continue
+                # Connection dropped between the check and the publish; keep the
+                # message at the head of its priority and retry after a pause
+                self._queues[priority].appendleft(entry)
+                if priority == PRIORITY_TELEMETRY and topic not in self._telemetry_by_topic:
+                    self._telemetry_by_topic[topic] = entry
+            time.sleep(RETRY_DELAY)
+
+    def depth(self) -> int:
+        with self._condition:
+            return self._depth()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "queue_depth": self._depth(),
+                "max_depth": self.max_depth,
+                "depth": {PRIORITY_NAMES[p]: len(q) for p, q in self._queues.items()},
+                "inflight": len(self._inflight),
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "dropped": {PRIORITY_NAMES[p]: count for p, count in self.dropped.items()},
+            }
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the sender; with a timeout, first wait for queued messages to go out"""
+        if timeout:
+            deadline = time.time() + timeout
+            while self.depth() and time.time() < deadline:
+                time.sleep(0.05)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
@@ -1,7 +1,9 @@
 import json
 import os
 import time
+import heapq
 import logging
+import itertools
 import threading
 from datetime import datetime
 
@@ -12,6 +14,12 @@ except ImportError:
     print("WARNING: paho-mqtt library not installed. Please install with: pip3 install paho-mqtt")
     mqtt = None
 
+# Try to import BrokerPool (requires paho-mqtt)
+try:
+    from BrokerPool import BrokerPool
+except ImportError:
+    BrokerPool = None
+
 # Try to import ErrorLogger
 try:
     from ErrorLogger import initialize_error_logger, send_error_log, ERROR_TYPE_MINOR, ERROR_TYPE_MAJOR, ERROR_TYPE_CRITICAL, ERROR_TYPE_WARNING
@@ -46,9 +54,14 @@ topic_response = "REMAP_RESPONSE"
 
 # --- Global Variables ---
 config = []
+topic_index = {}  # {device_topic: [(remap_config, device, key_pairs), ...]} built from enabled configs
 client_remap = None
 config_publish_thread = None
 
+# Persistent connections for config-specific brokers (real-time and periodic publishing)
+broker_pool = BrokerPool(client_id_prefix="remap") if BrokerPool else None
+POOL_STATS_INTERVAL = 60  # seconds between broker pool queue reports
+
 # --- Logging Control ---
 device_topic_logging_enabled = False  # Control device topic message logging
 
@@ -186,6 +199,8 @@ def load_remapping_config(silent=False):
             if not silent:
                 log_simple("Invalid config format, using default structure.", "WARNING")
 
+        build_topic_index()
+
     except FileNotFoundError:
         if not silent:
             log_simple(f"Config file not found: {config_file}. Creating default config.")
@@ -202,6 +217,41 @@ def load_remapping_config(silent=False):
         config = []
         send_error_log("load_remapping_config", f"Config load error: {e}", ERROR_TYPE_MAJOR)
 
+def compile_key_mappings(key_mappings):
+    """Precompute (original_key, custom_key) pairs for a device's key mappings"""
+    return tuple(
+        (mapping.get('original_key'), mapping.get('custom_key'))
+        for mapping in key_mappings
+        if mapping.get('original_key') is not None
+    )
+
+def build_topic_index():
+    """Index enabled configs by source topic so each message only touches its own mappings"""
+    global topic_index, config_by_id
+    index = {}
+    configs = {}
+    for remap_config in config:
+        if not remap_config.get('enabled', False):
+            continue
+        configs[remap_config.get('id', 'unknown')] = remap_config
+        seen_topics = set()
+        for device in remap_config.get('source_devices', []):
+            device_topic = device.get('mqtt_topic')
+            # One device per topic per config (first match wins)
+            if not device_topic or device_topic in seen_topics:
+                continue
+            seen_topics.add(device_topic)
+            key_pairs = compile_key_mappings(device.get('key_mappings', []))
+            index.setdefault(device_topic, []).append((remap_config, device, key_pairs))
+    topic_index = index
+    config_by_id = configs
+
+    # Windows of removed or disabled configs can never complete
+    with join_condition:
+        stale_ids = [config_id for config_id in join_windows if config_id not in configs]
+    for config_id in stale_ids:
+        clear_join_windows(config_id)
+
 def save_remapping_config():
     """Save remapping configuration"""
     try:
@@ -279,34 +329,132 @@ subscribed_topics = []
 # Global cache for device data (temporary storage for combining devices in config)
 cached_device_data = {}  # {config_id: {device_topic: {data: {...}, timestamp: "..."}}}
 
-# Global variables for group-based publishing
-group_publish_timers = {}  # {config_id: {group_key: timer_object}}
-group_buffer_data = {}  # {config_id: {group_key: {device_topic: data, ...}}}
-group_publish_lock = threading.Lock()  # Lock for thread-safe group operations
-GROUP_PUBLISH_DELAY = 5.0  # Delay in seconds before publishing group data
+# --- Windowed Join (combined real-time payloads) ---
+# Each enabled config is one join group. The first source message opens a
+# window; the combined payload is emitted once every source has reported or
+# when the window closes (missing keys are sent as None). Windows run on
+# arrival time (time.monotonic), never on the sources' own Timestamps, so
+# clock skew or a different timestamp format between sources cannot split
+# or drop readings. The payload is flat, like the periodic publish.
+JOIN_WINDOW_DEFAULT = 2.0     # seconds to wait for the remaining sources
+
+join_windows = {}  # {config_id: {'seq', 'start', 'deadline', 'slots': {device_topic: (data, timestamp)}}}
+join_heap = []  # [(deadline, seq, config_id)] window close times
+join_condition = threading.Condition()
+join_sequence = itertools.count()
+join_thread = None
+config_by_id = {}  # {config_id: remap_config} for enabled configs, built with the topic index
+
+def get_join_window(remap_config):
+    """Return the join window in seconds for a config"""
+    pub_config = remap_config.get('mqtt_publish_config', {})
+    return max(float(pub_config.get('join_window_seconds', JOIN_WINDOW_DEFAULT)), 0.0)
+
+def start_join_scheduler():
+    """Start the single scheduler thread that closes join windows"""
+    global join_thread
+    if join_thread is None or not join_thread.is_alive():
+        join_thread = threading.Thread(target=join_scheduler_worker, daemon=True)
+        join_thread.start()
+
+def join_scheduler_worker():
+    """Emit partial payloads for windows whose deadline passed"""
+    while True:
+        with join_condition:
+            while not join_heap or join_heap[0][0] > time.monotonic():
+                timeout = join_heap[0][0] - time.monotonic() if join_heap else None
+                join_condition.wait(timeout)
+
+            deadline, seq, config_id = heapq.heappop(join_heap)
+            window = join_windows.get(config_id)
+            if not window or window['seq'] != seq:
+                continue  # Window already emitted complete or was cleared
+            del join_windows[config_id]
+            remap_config = config_by_id.get(config_id)
+
+        if remap_config:
+            publish_join_window(remap_config, window)
+
+def join_device_data(remap_config, device_topic, data, timestamp):
+    """Add a source reading to its config's join window, emitting when complete"""
+    config_id = remap_config.get('id', 'unknown')
+    window_seconds = get_join_window(remap_config)
+    required_topics = {d.get('mqtt_topic') for d in remap_config.get('source_devices', []) if d.get('mqtt_topic')}
+    arrival = time.monotonic()
+
+    start_join_scheduler()
+    with join_condition:
+        window = join_windows.get(config_id)
+        if window is None:
+            seq = next(join_sequence)
+            window = {
+                'seq': seq,
+                'start': arrival,
+                'deadline': arrival + window_seconds,
+                'slots': {}
+            }
+            join_windows[config_id] = window
+            heapq.heappush(join_heap, (window['deadline'], seq, config_id))
+            join_condition.notify()
+
+        # One slot per source keeps memory bounded; the newest reading wins
+        window['slots'][device_topic] = (data, timestamp)
+
+        if not required_topics.issubset(window['slots']):
+            return
+
+        del join_windows[config_id]
+
+    publish_join_window(remap_config, window)
+
+def publish_join_window(remap_config, window):
+    """Build the combined payload from a join window and publish it"""
+    try:
+        combined_payload = {}
+        latest_timestamp = None
+        slots = window['slots']
+
+        # Devices in configuration order, keys flat as in publish_periodic_device_data
+        for device in remap_config.get('source_devices', []):
+            device_topic = device.get('mqtt_topic')
+            device_data, device_timestamp = slots.get(device_topic, ({}, None))
+
+            if device_timestamp and (latest_timestamp is None or device_timestamp > latest_timestamp):
+                latest_timestamp = device_timestamp
+
+            for mapping in device.get('key_mappings', []):
+                custom_key = mapping.get('custom_key')
+                if custom_key:
+                    combined_payload[custom_key] = device_data.get(custom_key)
+
+        combined_payload['Timestamp'] = latest_timestamp or datetime.now().isoformat()
+
+        # Publish to configured topic through the pooled config broker connection
+        pub_topic = remap_config.get('mqtt_publish_config', {}).get('topic', 'REMAP/DEFAULT')
+        payload = json.dumps(combined_payload)
+        publish_to_config_broker(remap_config, payload)
+        status = "complete" if len(slots) >= len(remap_config.get('source_devices', [])) else "window closed"
+        log_simple(f"Combined real-time data published to {pub_topic} ({status}): {payload}", "INFO")
+
+    except Exception as e:
+        log_simple(f"Error in combined real-time publishing: {e}", "ERROR")
+
+def clear_join_windows(config_id=None):
+    """Drop open join windows for a config (or all configs)"""
+    with join_condition:
+        if config_id:
+            join_windows.pop(config_id, None)
+        else:
+            join_windows.clear()
 
 def clear_cached_device_data(config_id=None):
     """Clear cached device data for config(s)"""
     global cached_device_data
     if config_id:
         cached_device_data.pop(config_id, None)
-        # Also clear group timers for this config
-        if config_id in group_publish_timers:
-            for group_key, timer in group_publish_timers[config_id].items():
-                if timer and timer.is_alive():
-                    timer.cancel()
-            group_publish_timers.pop(config_id, None)
-        if config_id in group_buffer_data:
-            group_buffer_data.pop(config_id, None)
     else:
         cached_device_data.clear()
-        # Clear all group timers
-        for config_id, group_timers in group_publish_timers.items():
-            for group_key, timer in group_timers.items():
-                if timer and timer.is_alive():
-                    timer.cancel()
-        group_publish_timers.clear()
-        group_buffer_data.clear()
+    clear_join_windows(config_id)
 
 def add_to_device_cache(config_id, device_topic, data, timestamp):
     """Add device data to cache for later combination"""
@@ -319,153 +467,39 @@ def add_to_device_cache(config_id, device_topic, data, timestamp):
         'timestamp': timestamp
     }
 
-def clear_group_timers(config_id=None, group_key=None):
-    """Clear group publish timers"""
-    global group_publish_timers
-    if config_id and group_key:
-        # Clear specific timer
-        if config_id in group_publish_timers and group_key in group_publish_timers[config_id]:
-            timer = group_publish_timers[config_id][group_key]
-            if timer and timer.is_alive():
-                timer.cancel()
-            del group_publish_timers[config_id][group_key]
-            if not group_publish_timers[config_id]:
-                del group_publish_timers[config_id]
-    elif config_id:
-        # Clear all timers for config
-        if config_id in group_publish_timers:
-            for timer in group_publish_timers[config_id].values():
-                if timer and timer.is_alive():
-                    timer.cancel()
-            del group_publish_timers[config_id]
-    else:
-        # Clear all timers
-        for config_timers in group_publish_timers.values():
-            for timer in config_timers.values():
-                if timer and timer.is_alive():
-                    timer.cancel()
-        group_publish_timers.clear()
-
-def buffer_group_data(config_id, group_key, device_topic, data, timestamp):
-    """Buffer data for group-based publishing"""
-    global group_buffer_data
-    if config_id not in group_buffer_data:
-        group_buffer_data[config_id] = {}
-    if group_key not in group_buffer_data[config_id]:
-        group_buffer_data[config_id][group_key] = {}
-
-    group_buffer_data[config_id][group_key][device_topic] = {
-        'data': data,
-        'timestamp': timestamp
-    }
-
-def get_group_buffered_data(config_id, group_key):
-    """Get buffered data for a group"""
-    global group_buffer_data
-    if config_id in group_buffer_data and group_key in group_buffer_data[config_id]:
-        return group_buffer_data[config_id][group_key]
-    return {}
-
-def publish_grouped_data(config_id, group_key, client):
-    """Publish grouped data from buffer"""
-    global group_buffer_data, client_remap
-
-    try:
-        # Get the config
-        remap_config = None
-        for cfg in config:
-            if cfg.get('id') == config_id:
-                remap_config = cfg
-                break
-
-        if not remap_config or not remap_config.get('enabled', False):
-            return
-
-        # Get buffered data for this group
-        buffered_data = get_group_buffered_data(config_id, group_key)
-        if not buffered_data:
-            return
-
-        # Find the config device that uses this group
-        config_device = None
-        for device in remap_config.get('source_devices', []):
-            if device.get('group') == group_key:
-                config_device = device
-                break
-
-        if not config_device:
-            return
-
-        # Create final payload structure in device order
-        final_payload = {}
-        final_payload['name'] = remap_config.get('name', 'UNKNOWN')
-
-        # Process devices in the exact order they appear in configuration to maintain consistency
-        for device in remap_config.get('source_devices', []):
-            device_topic = device.get('mqtt_topic')
-            device_group = device.get('group')
-            key_mappings = device.get('key_mappings', [])
-
-            # Check if this device has buffered data
-            if device_topic not in buffered_data:
-                continue
-
-            device_data = buffered_data[device_topic].get('data', {})
-
-            if device_group == group_key and device_group:
-                # This device belongs to the group we're publishing
-                if group_key not in final_payload:
-                    final_payload[group_key] = {}
-                final_payload[group_key].update(device_data)
-            elif not device_group and device_data:
-                # Ungrouped device - add fields directly to payload
-                final_payload.update(device_data)
-
-        # Add timestamp from the latest buffered data
-        latest_timestamp = datetime.now().isoformat()
-        for device_data in buffered_data.values():
-            if device_data.get('timestamp', datetime.min.isoformat()) > latest_timestamp:
-                latest_timestamp = device_data['timestamp']
-
-        final_payload['Timestamp'] = latest_timestamp
-
-        # Publish to configured topic
-        pub_config = remap_config.get('mqtt_publish_config', {})
-        pub_topic = pub_config.get('topic', 'REMAP/DEFAULT')
-        qos = pub_config.get('qos', 1)
-        retain = pub_config.get('retain', False)
-
-        if client_remap and client_remap.is_connected():
-            client_remap.publish(pub_topic, json.dumps(final_payload), qos=qos, retain=retain)
-            log_simple(f"Buffered grouped data published to {pub_topic}: {json.dumps(final_payload)}", "SUCCESS")
-
-        # Clear the buffer for this group after publishing
-        if config_id in group_buffer_data and group_key in group_buffer_data[config_id]:
-            del group_buffer_data[config_id][group_key]
-            if not group_buffer_data[config_id]:
-                del group_buffer_data[config_id]
-
-    except Exception as e:
-        log_simple(f"Error publishing grouped data: {e}", "ERROR")
-
-def schedule_group_publish(config_id, group_key, client):
-    """Schedule publishing for a group with delay"""
-    global group_publish_timers
-
-    # Cancel existing timer for this group if any
-    clear_group_timers(config_id, group_key)
-
-    # Initialize timer storage
-    if config_id not in group_publish_timers:
-        group_publish_timers[config_id] = {}
-
-    # Schedule new timer
-    timer = threading.Timer(GROUP_PUBLISH_DELAY, publish_grouped_data, args=[config_id, group_key, client])
-    timer.daemon = True
-    group_publish_timers[config_id][group_key] = timer
-    timer.start()
+# --- Config Broker Publishing ---
+def get_config_broker(remap_config):
+    """Return (broker_url, username, password) for a remapping config"""
+    pub_config = remap_config.get('mqtt_publish_config', {})
+    return (pub_config.get('broker_url', 'mqtt://18.143.215.113:1883'),
+            pub_config.get('username', ''),
+            pub_config.get('password', ''))
+
+def publish_to_config_broker(remap_config, payload):
+    """Queue a payload on the pooled connection of the config's broker"""
+    if not broker_pool:
+        log_simple("Broker pool not available - paho-mqtt library missing", "ERROR")
+        return False
+
+    pub_config = remap_config.get('mqtt_publish_config', {})
+    broker_url, username, password = get_config_broker(remap_config)
+    return broker_pool.publish(
+        broker_url,
+        pub_config.get('topic', 'REMAP/DEFAULT'),
+        payload,
+        qos=pub_config.get('qos', 1),
+        retain=pub_config.get('retain', False),
+        username=username,
+        password=password
+    )
 
-    log_simple(f"Scheduled group publish for config {config_id}, group {group_key} in {GROUP_PUBLISH_DELAY}s", "INFO")
+def prune_broker_pool():
+    """Close pooled connections that no enabled config uses anymore"""
+    if not broker_pool:
+        return
+    keys = [BrokerPool.make_key(*get_config_broker(remap_config))
+            for remap_config in config if remap_config.get('enabled', False)]
+    broker_pool.retain_only(keys)
 
 # --- Global Variables for Periodic Publishing ---
 device_last_publish_time = {}  # Track last publish time per device/topic
@@ -628,55 +662,16 @@ def publish_periodic_device_data():
                 # Use latest timestamp from cached data or current time
                 final_payload['Timestamp'] = latest_timestamp or current_time.isoformat()
 
-                # Publish using config-specific MQTT settings
+                # Publish on the pooled connection for this config's broker
+                # (kept open with keepalive instead of connecting per publish)
                 pub_topic = pub_config.get('topic', 'REMAP/DEFAULT')
-                qos = pub_config.get('qos', 1)
-                retain = pub_config.get('retain', False)
-
-                # Parse broker URL from config and publish using config-specific settings
                 broker_url = pub_config.get('broker_url', 'mqtt://18.143.215.113:1883')
+                payload = json.dumps(final_payload)
                 try:
-                    if broker_url.startswith('mqtt://'):
-                        broker_part = broker_url[7:]  # Remove 'mqtt://'
-                        if ':' in broker_part:
-                            host, port = broker_part.split(':', 1)
-                            port = int(port)
-                        else:
-                            host = broker_part
-                            port = 1883
-
-                        # Create a separate client for this specific config's broker
-                        client_id = pub_config.get('client_id', f'remap-{config_id}')
-                        periodic_client = connect_mqtt(
-                            f'{client_id}-periodic-{int(time.time())}',
-                            host, port,
-                            on_connect_callback=None,
-                            on_disconnect_callback=None,
-                            on_message_callback=None
-                        )
-
-                        if periodic_client:
-                            periodic_client.loop_start()
-                            # Wait for connection
-                            time.sleep(0.5)
-
-                            if periodic_client.is_connected():
-                                # Use qos, retain, and topic from config-specific mqtt_publish_config
-                                config_qos = pub_config.get('qos', 1)
-                                config_retain = pub_config.get('retain', False)
-                                config_topic = pub_config.get('topic', 'REMAP/DEFAULT')
-
-                                periodic_client.publish(config_topic, json.dumps(final_payload), qos=config_qos, retain=config_retain)
-                                log_simple(f"Config-specific periodic publish to {host}:{port}/{config_topic} (qos={config_qos}, retain={config_retain}): {json.dumps(final_payload)}", "INFO")
-                                periodic_client.loop_stop()
-                                periodic_client.disconnect()
-                            else:
-                                log_simple(f"Failed to connect to config broker {host}:{port}", "ERROR")
-                        else:
-                            log_simple(f"Could not create MQTT client for config {config_id}", "ERROR")
-
+                    publish_to_config_broker(remap_config, payload)
+                    log_simple(f"Config-specific periodic publish to {broker_url}/{pub_topic} (qos={pub_config.get('qos', 1)}, retain={pub_config.get('retain', False)}): {payload}", "INFO")
                 except Exception as broker_error:
-                    log_simple(f"Error parsing broker URL {broker_url}: {broker_error}", "ERROR")
+                    log_simple(f"Error publishing to config broker {broker_url}: {broker_error}", "ERROR")
 
     except Exception as e:
         log_simple(f"Error in periodic device data publishing: {e}", "ERROR")
@@ -727,78 +722,13 @@ def on_message_remap(client, userdata, msg):
         log_simple(f"Error handling remap message: {e}", "ERROR")
         send_error_log(f"Remap message handling error: {e}", ERROR_TYPE_MINOR)
 
-def publish_combined_real_time_data(remap_config, client):
-    """Publish combined real-time data from all devices in config"""
-    try:
-        if not remap_config.get('enabled', False) or not client or not client.is_connected():
-            return
-
-        config_id = remap_config.get('id', 'unknown')
-
-        # Check if we have cached data for all devices in this config
-        required_devices = [device.get('mqtt_topic') for device in remap_config.get('source_devices', [])]
-        cached_data = cached_device_data.get(config_id, {})
-
-        # Only publish if we have data for ALL devices in the config
-        if not all(topic in cached_data for topic in required_devices):
-            return
-
-        # Create combined payload (without 'name' field as requested)
-        combined_payload = {}
-
-        latest_timestamp = None
-
-        # Collect data from all devices in config
-        for device in remap_config.get('source_devices', []):
-            device_topic = device.get('mqtt_topic')
-            key_mappings = device.get('key_mappings', [])
-
-            if device_topic in cached_data:
-                device_cached = cached_data[device_topic]
-                device_data = device_cached.get('data', {})
-                device_timestamp = device_cached.get('timestamp')
-
-                # Update latest timestamp
-                if device_timestamp and (latest_timestamp is None or device_timestamp > latest_timestamp):
-                    latest_timestamp = device_timestamp
-
-                # Map the keys according to configuration
-                for mapping in key_mappings:
-                    original_key = mapping.get('original_key')
-                    custom_key = mapping.get('custom_key')
-                    if custom_key and custom_key in device_data:
-                        combined_payload[custom_key] = device_data[custom_key]
-
-        # Use the latest timestamp
-        combined_payload['Timestamp'] = latest_timestamp or datetime.now().isoformat()
-
-        # Publish to configured topic
-        pub_config = remap_config.get('mqtt_publish_config', {})
-        pub_topic = pub_config.get('topic', 'REMAP/DEFAULT')
-        qos = pub_config.get('qos', 1)
-        retain = pub_config.get('retain', False)
-
-        if client and client.is_connected():
-            client.publish(pub_topic, json.dumps(combined_payload), qos=qos, retain=retain)
-            log_simple(f"Combined real-time data published to {pub_topic}: {json.dumps(combined_payload)}", "INFO")
-
-    except Exception as e:
-        log_simple(f"Error in combined real-time publishing: {e}", "ERROR")
-
 def publish_real_time_data(remap_config, device, remapped_data, timestamp, client):
-    """Update cache and publish combined data if all devices have data (real-time publishing)"""
+    """Feed remapped data into the config's join window (real-time publishing)"""
     try:
-        if not remap_config.get('enabled', False) or not client or not client.is_connected():
+        if not remap_config.get('enabled', False):
             return
 
-        config_id = remap_config.get('id', 'unknown')
-        device_topic = device.get('mqtt_topic')
-
-        # Update cache with new data
-        add_to_device_cache(config_id, device_topic, remapped_data, timestamp)
-
-        # Try to publish combined data if we have data for all devices
-        publish_combined_real_time_data(remap_config, client)
+        join_device_data(remap_config, device.get('mqtt_topic'), remapped_data, timestamp)
 
     except Exception as e:
         log_simple(f"Error in real-time publishing: {e}", "ERROR")
@@ -810,55 +740,39 @@ def handle_device_topic_data(client, topic, payload):
         if device_topic_logging_enabled:
             log_simple(f"Device Data: {topic} - {payload}")
 
+        # Configs and compiled key mappings that use this topic
+        entries = topic_index.get(topic)
+        if not entries:
+            return
+
         try:
             # Parse the main device message
             device_message = json.loads(payload)
 
-            # Find matching config and device for this topic
-            for remap_config in config:
-                if not remap_config.get('enabled', False):
-                    continue
-
-                config_id = remap_config.get('id', 'unknown')
-
-                for device in remap_config.get('source_devices', []):
-                    if device.get('mqtt_topic') == topic:
-                        # Use device-level key mappings
-                        key_mappings = device.get('key_mappings', [])
-
-                        # Parse the nested "value" field which contains sensor data as JSON string
-                        remapped_data = {}
-                        sensor_data = {}
-
-                        if 'value' in device_message:
-                            try:
-                                # The 'value' field is a JSON string, parse it to get sensor data
-                                sensor_data = json.loads(device_message['value'])
-                            except json.JSONDecodeError:
-                                log_simple(f"Failed to parse value field as JSON: {device_message['value']}", "ERROR")
-                                continue
-
-                        # Apply key mappings from sensor data
-                        for mapping in key_mappings:
-                            original = mapping.get('original_key')
-                            custom = mapping.get('custom_key')
-                            if original in sensor_data:
-                                remapped_data[custom] = sensor_data[original]
+            # Parse the nested "value" field which contains sensor data as JSON string
+            sensor_data = {}
+            if 'value' in device_message:
+                try:
+                    sensor_data = json.loads(device_message['value'])
+                except json.JSONDecodeError:
+                    log_simple(f"Failed to parse value field as JSON: {device_message['value']}", "ERROR")
+                    return
 
-                        # Real-time publishing: Publish immediately when data is received
-                        if remapped_data:
-                            device_group = device.get('group')
-                            timestamp = device_message.get('Timestamp', datetime.now().isoformat())
+            timestamp = device_message.get('Timestamp', datetime.now().isoformat())
 
-                            # Publish real-time data immediately
-                            publish_real_time_data(remap_config, device, remapped_data, timestamp, client)
+            for remap_config, device, key_pairs in entries:
+                config_id = remap_config.get('id', 'unknown')
 
-                            # Also buffer for periodic publishing if needed
-                            add_to_device_cache(config_id, topic, remapped_data, timestamp)
+                # Apply precompiled key mappings from sensor data
+                remapped_data = {custom: sensor_data[original] for original, custom in key_pairs if original in sensor_data}
 
-                            # Removed device logging as requested
+                # Real-time publishing: Publish immediately when data is received
+                if remapped_data:
+                    # Publish real-time data immediately
+                    publish_real_time_data(remap_config, device, remapped_data, timestamp, client)
 
-                        break  # Assume one config per topic
+                    # Also buffer for periodic publishing if needed
+                    add_to_device_cache(config_id, topic, remapped_data, timestamp)
 
         except json.JSONDecodeError as e:
             log_simple(f"Failed to parse device message JSON: {e}", "ERROR")
@@ -1014,6 +928,11 @@ def handle_crud_request(client, command, message_data):
         if success and client_remap and client_remap.is_connected():
             subscribe_to_device_topics(client_remap)
 
+        # Rebuild topic index and drop pooled connections to brokers no longer referenced
+        if success:
+            build_topic_index()
+            prune_broker_pool()
+
     except Exception as e:
         error_response = {
             "status": "error",
@@ -1188,6 +1107,7 @@ def run():
     log_simple("MQTT Payload Remapping service started successfully", "SUCCESS")
 
     try:
+        last_pool_stats = time.time()
         while True:
             # Reconnection handling
             if client_remap and not client_remap.is_connected():
@@ -1204,6 +1124,14 @@ def run():
                 except:
                     pass
 
+            if broker_pool and time.time() - last_pool_stats >= POOL_STATS_INTERVAL:
+                last_pool_stats = time.time()
+                for broker, stats in broker_pool.get_stats().items():
+                    if stats['queue_depth'] or any(stats['dropped'].values()) or stats['coalesced']:
+                        log_simple(f"Publish queue {broker}: depth={stats['queue_depth']} "
+                                   f"max={stats['max_depth']} inflight={stats['inflight']} "
+                                   f"coalesced={stats['coalesced']} dropped={stats['dropped']}", "WARNING")
+
             time.sleep(5)
 
     except KeyboardInterrupt:
@@ -1214,6 +1142,8 @@ def run():
     finally:
         log_simple("Shutting down services...")
         stop_config_publish_thread()
+        if broker_pool:
+            broker_pool.close_all()
         if client_remap:
             client_remap.loop_stop()
             client_remap.disconnect()
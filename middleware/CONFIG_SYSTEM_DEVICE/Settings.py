@@ -9,6 +9,7 @@ import threading
 from getmac import get_mac_address
 import netifaces as ni
 from datetime import datetime
+from PublishQueue import PublishQueue, PRIORITY_TELEMETRY
 
 # Import smbus2 for I2C RTC operations
 try:
@@ -57,6 +58,10 @@ def log_simple(message, level="INFO"):
 # --- Connection Status Tracking ---
 broker_connected = False
 
+# --- System Status Publishing ---
+SYSTEM_INFO_INTERVAL = 1     # seconds between system status publishes
+SYSTEM_INFO_QUEUE_SIZE = 10  # status is telemetry: a slow broker gets the latest value, not a backlog
+
 # --- Configuration Paths ---
 # Define paths to various JSON configuration files and network interface file.
 # These paths indicate a modular structure for different system components.
@@ -825,9 +830,11 @@ def reset_rtc_config(client=None):
 def publish_system_info(client):
     """
     Continuously gathers and publishes system information to MQTT.
-    Runs in a separate thread.
+    Runs in a separate thread. Publishes go through a bounded telemetry queue
+    so a slow uplink coalesces status updates instead of growing paho's queue.
     """
     logging.info("Starting system information publisher thread...")
+    publisher = PublishQueue(client, "system-status", SYSTEM_INFO_QUEUE_SIZE)
     while True:
         try:
             # Ensure MQTT client is connected before attempting to publish
@@ -839,15 +846,16 @@ def publish_system_info(client):
             system_info = get_system_info(client)
             if not system_info: # Check if get_system_info return   ed empty data due to internal error
                 logging.error("get_system_info returned empty data. Skipping publish for this cycle.")
-                time.sleep(1) # Still wait for the interval
+                time.sleep(SYSTEM_INFO_INTERVAL) # Still wait for the interval
                 continue
 
+            system_info["publish_queue"] = publisher.get_stats()
             system_info_json = json.dumps(system_info)
             # Publish with QoS 1 and no retain for live data (retain=False is good for live data)
-            client.publish(TOPIC_SYSTEM_STATUS, system_info_json, qos=1, retain=False) 
+            publisher.publish(TOPIC_SYSTEM_STATUS, system_info_json, qos=1, retain=False, priority=PRIORITY_TELEMETRY)
             logging.debug(f"Published system info: {system_info_json}") # Changed to debug for less verbosity
             
-            time.sleep(1) # Publish every 1 second
+            time.sleep(SYSTEM_INFO_INTERVAL) # Publish every 1 second
 
         except Exception as e:
             send_error_log(client, "publish_system_info_loop", e, "critical")
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Rule Engine Replay Benchmark
+Records device-topic MQTT traffic to a file and replays it into the rule
+engines (AutomationLogic, AutomationValue, AutomationUnified) and
+RemapPayload to measure throughput, evaluation latency and action counts.
+
+Usage (run from CONFIG_SYSTEM_DEVICE so the engines find their JSON configs):
+    python3 rule_benchmark.py record traffic.jsonl --duration 300
+    python3 rule_benchmark.py replay traffic.jsonl --speed 1,10,max
+    python3 rule_benchmark.py publish traffic.jsonl --broker localhost --speed 10
+
+Replay feeds messages straight into the engines' entry points with a capture
+client in place of the MQTT broker: relay commands and remap publishes are
+counted instead of sent, and WhatsApp actions are counted instead of calling
+the HTTP API.
+"""
+
+import io
+import sys
+import json
+import time
+import uuid
+import argparse
+import contextlib
+
+import paho.mqtt.client as mqtt
+
+ENGINES = ('logic', 'value', 'unified', 'remap')
+DEFAULT_RECORD_TOPICS = ['#']
+DRAIN_TIMEOUT = 30  # seconds to wait for queued actions after a replay
+
+
+def log_simple(message, level="INFO"):
+    """Simple logging without timestamp for cleaner output"""
+    if level == "ERROR":
+        print(f"[ERROR] {message}", file=sys.stderr)
+    elif level == "SUCCESS":
+        print(f"[OK] {message}", file=sys.stderr)
+    elif level == "WARNING":
+        print(f"[WARN] {message}", file=sys.stderr)
+    else:
+        print(f"[INFO] {message}", file=sys.stderr)
+
+# --- Traffic File ---
+def load_traffic(path):
+    """Load recorded messages as a list of (offset_seconds, topic, payload)"""
+    messages = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            messages.append((float(entry['t']), entry['topic'], entry['payload']))
+    messages.sort(key=lambda m: m[0])
+    return messages
+
+def parse_speeds(value):
+    """Parse '1,10,max' into [1.0, 10.0, None] (None = as fast as possible)"""
+    speeds = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        if item == 'max':
+            speeds.append(None)
+        elif item:
+            speeds.append(float(item))
+    return speeds
+
+def speed_label(speed):
+    return 'max' if speed is None else f"{speed:g}x"
+
+def paced(messages, speed):
+    """Yield messages, sleeping to keep the recorded spacing scaled by speed"""
+    start = time.perf_counter()
+    for offset, topic, payload in messages:
+        if speed is not None:
+            delay = offset / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        yield topic, payload
+
+# --- Record ---
+def record(args):
+    topics = args.topic or DEFAULT_RECORD_TOPICS
+    count = [0]
+    start = [None]
+    out = open(args.output, 'w')
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            for topic in topics:
+                client.subscribe(topic)
+            log_simple(f"Recording {', '.join(topics)} from {args.broker}:{args.port}", "SUCCESS")
+        else:
+            log_simple(f"Connection failed (code {rc})", "ERROR")
+
+    def on_message(client, userdata, msg):
+        now = time.time()
+        if start[0] is None:
+            start[0] = now
+        try:
+            payload = msg.payload.decode()
+        except UnicodeDecodeError:
+            return
+        out.write(json.dumps({"t": round(now - start[0], 6), "topic": msg.topic, "payload": payload}) + "\n")
+        count[0] += 1
+
+    client = mqtt.Client(f"rule-benchmark-recorder-{uuid.uuid4()}")
+    if args.username and args.password:
+        client.username_pw_set(args.username, args.password)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.broker, args.port, keepalive=60)
+    client.loop_start()
+
+    try:
+        deadline = time.time() + args.duration if args.duration else None
+        while deadline is None or time.time() < deadline:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        out.close()
+
+    log_simple(f"Recorded {count[0]} messages to {args.output}", "SUCCESS")
+
+# --- Publish (replay against a real broker) ---
+def publish(args):
+    messages = load_traffic(args.input)
+    client = mqtt.Client(f"rule-benchmark-publisher-{uuid.uuid4()}")
+    if args.username and args.password:
+        client.username_pw_set(args.username, args.password)
+    client.connect(args.broker, args.port, keepalive=60)
+    client.loop_start()
+
+    try:
+        for speed in parse_speeds(args.speed):
+            start = time.perf_counter()
+            for topic, payload in paced(messages, speed):
+                client.publish(topic, payload)
+            elapsed = time.perf_counter() - start
+            rate = len(messages) / elapsed if elapsed > 0 else 0
+            log_simple(f"Published {len(messages)} messages at {speed_label(speed)} in {elapsed:.2f}s ({rate:.0f} msg/s)", "SUCCESS")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+# --- Replay (straight into engine entry points) ---
+class CaptureClient:
+    """Stand-in for a connected paho client that counts publishes per topic"""
+
+    def __init__(self):
+        self.published = {}
+
+    def is_connected(self):
+        return True
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published[topic] = self.published.get(topic, 0) + 1
+        return mqtt.MQTTMessageInfo(0)
+
+    def subscribe(self, topic, qos=0):
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+
+    def unsubscribe(self, topic):
+        return (mqtt.MQTT_ERR_SUCCESS, 0)
+
+class CapturePool:
+    """Stand-in for RemapPayload's BrokerPool that counts publishes on the capture client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def publish(self, broker_url, topic, payload, qos=0, retain=False, username="", password="", priority=None):
+        self.client.publish(topic, payload, qos, retain)
+        return True
+
+    def retain_only(self, keys):
+        pass
+
+    def close_all(self):
+        pass
+
+class CaptureQueue:
+    """Stand-in for the engines' control PublishQueue that counts publishes on the capture client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def publish(self, topic, payload, qos=0, retain=False, priority=None):
+        self.client.publish(topic, payload, qos, retain)
+        return True
+
+    def stop(self, timeout=None):
+        pass
+
+def setup_engine(name, client, counters):
+    """Load an engine's configs, attach the capture client and return a per-message handler"""
+    if name == 'remap':
+        import RemapPayload
+        RemapPayload.load_remapping_config(silent=True)
+        RemapPayload.client_remap = client
+        RemapPayload.broker_pool = CapturePool(client)
+        return lambda topic, payload: RemapPayload.handle_device_topic_data(client, topic, payload)
+
+    import AutomationRuntime
+    module, dispatch = {
+        'logic': (AutomationRuntime.AutomationLogic, AutomationRuntime.dispatch_logic),
+        'value': (AutomationRuntime.AutomationValue, AutomationRuntime.dispatch_value),
+        'unified': (AutomationRuntime.AutomationUnified, AutomationRuntime.dispatch_unified),
+    }[name]
+
+    AutomationRuntime.load_plugin_configs()
+    module.client_crud = client
+    module.client_control = client
+    module.control_queue = CaptureQueue(client)
+    module.subscribed_topics.clear()
+    module.subscribe_to_device_topics(client)
+
+    def count_message(action, rule):
+        counters['send_message'] = counters.get('send_message', 0) + 1
+    module.execute_whatsapp_message = count_message
+
+    def handle(topic, payload):
+        if topic not in module.subscribed_topics:
+            return
+        decoded = AutomationRuntime.decode_device_message(topic, payload)
+        if decoded is not None:
+            module.device_states[topic] = decoded["data"]
+            dispatch(decoded)
+    return handle
+
+def wait_for_actions():
+    """Wait until queued actions have run so action counts are complete"""
+    from ActionDispatcher import get_action_metrics
+    deadline = time.time() + DRAIN_TIMEOUT
+    while time.time() < deadline:
+        metrics = get_action_metrics()
+        if not metrics['queue_depth'] and not metrics['in_flight']:
+            return
+        time.sleep(0.05)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def replay_engine(name, messages, speed, verbose):
+    client = CaptureClient()
+    counters = {}
+    sink = None if verbose else io.StringIO()
+
+    with (contextlib.nullcontext() if verbose else contextlib.redirect_stdout(sink)):
+        handle = setup_engine(name, client, counters)
+        latencies = []
+        start = time.perf_counter()
+        for topic, payload in paced(messages, speed):
+            t0 = time.perf_counter()
+            handle(topic, payload)
+            latencies.append(time.perf_counter() - t0)
+            if sink is not None:
+                sink.seek(0)
+                sink.truncate()
+        elapsed = time.perf_counter() - start
+        if name != 'remap':
+            wait_for_actions()
+
+    latencies.sort()
+    return {
+        "engine": name,
+        "speed": speed_label(speed),
+        "messages": len(messages),
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(len(messages) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "publishes": sum(client.published.values()),
+        "messages_sent": counters.get('send_message', 0),
+        "publish_topics": client.published,
+    }
+
+def replay(args):
+    messages = load_traffic(args.input)
+    engines = ENGINES if args.engine == 'all' else (args.engine,)
+    results = []
+
+    for speed in parse_speeds(args.speed):
+        for name in engines:
+            result = replay_engine(name, messages, speed, args.verbose)
+            results.append(result)
+            log_simple(f"{name:8s} {result['speed']:>5s}  {result['msgs_per_s']:>9.1f} msg/s  "
+                       f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+                       f"publishes {result['publishes']}  messages {result['messages_sent']}", "SUCCESS")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        log_simple(f"Results written to {args.json}", "SUCCESS")
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay MQTT traffic to benchmark the rule engines")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_broker_args(p):
+        p.add_argument('--broker', default='localhost')
+        p.add_argument('--port', type=int, default=1883)
+        p.add_argument('--username', default='')
+        p.add_argument('--password', default='')
+
+    p_record = sub.add_parser('record', help='record device-topic traffic to a JSONL file')
+    p_record.add_argument('output')
+    p_record.add_argument('--topic', action='append', help='topic filter (repeatable, default #)')
+    p_record.add_argument('--duration', type=float, default=0, help='seconds to record (default: until Ctrl-C)')
+    add_broker_args(p_record)
+    p_record.set_defaults(func=record)
+
+    p_replay = sub.add_parser('replay', help='replay a recording into the engines and report metrics')
+    p_replay.add_argument('input')
+    p_replay.add_argument('--engine', choices=ENGINES + ('all',), default='all')
+    p_replay.add_argument('--speed', default='1,10,max', help="comma separated multipliers or 'max'")
+    p_replay.add_argument('--json', help='write results to this file')
+    p_replay.add_argument('--verbose', action='store_true', help='keep engine log output')
+    p_replay.set_defaults(func=replay)
+
+    p_publish = sub.add_parser('publish', help='replay a recording to a real broker')
+    p_publish.add_argument('input')
+    p_publish.add_argument('--speed', default='1')
+    add_broker_args(p_publish)
+    p_publish.set_defaults(func=publish)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import smbus
+from Protocols import i2c_bus
 LM75_ADDRESS = 0x48
 LM75_TEMP_REGISTER = 0
 LM75_CONF_REGISTER = 1
@@ -12,7 +12,7 @@ LM75_CONF_OS_F_QUE = 3
 def get_data(address=LM75_ADDRESS, device_bus=0, mode=LM75_CONF_OS_COMP_INT):
     try:
         data =[]
-        device = smbus.SMBus(device_bus)
+        device = i2c_bus.get_bus(device_bus)
         raw = device.read_word_data(address, LM75_TEMP_REGISTER) & 0xFFFF
         raw = ((raw << 8) & 0xFF00) + (raw >> 8)
         # Get temperarture in chelcius
@@ -1,10 +1,10 @@
-import smbus
+from Protocols import i2c_bus
 PCA9531_ADDRESS = 0x60
 
 
 def set_data(data, address=PCA9531_ADDRESS, device_bus=0):
     try:
-        device = smbus.SMBus(device_bus)
+        device = i2c_bus.get_bus(device_bus)
         # SET Prescale frequency to 0
         device.write_byte_data(address, 0x01, 0x00)
         # SET PWM duty cycle
@@ -1,6 +1,7 @@
 # !python3
 # cython: language_level=3
 import Protocols.i2c_modular as i2c_modular
+from Protocols import i2c_bus
 
 # Addr AD5593
 _i2c_address            = 0x11
@@ -58,6 +59,9 @@ _PCR_lsbs               = 0x00
 _DAC_config             = 0x00
 _ADC_config             = 0x00
 
+# (device_bus, address) -> ADC channel mask programmed into the sequence register
+_sequences              = {}
+
 
 for i in range(_num_of_channels):
     config[ADCs[i]]      = 0
@@ -149,43 +153,109 @@ def read_data_pin(channel, _i2c_address, device_bus):
     # reade data in selected pin
     try:
         device = i2c_modular.Device(_i2c_address, device_bus)  
-        enable_internal_Vref(device)
-        set_ADC_max_2x_Vref(device)
-        for i in range(5):
-            configure_ADC(device, channel)
-            channel_byte        = 1 << channel
-            data                = [0x02, channel_byte] 
-            device.writeList(_ADAC_ADC_SEQUENCE, data)
-        
-            data = device.readList(_ADAC_ADC_READ, 2)
-            #int_number = int.from_bytes(data, byteorder="big", signed=False)
-            _data_bits = (data[0] & 0x0f) << 8
-            _data_bits = _data_bits | data[1]
-
-            data = _ADC_max*(_data_bits)/4095
+        # hold the bus for the whole configure/sequence/read exchange
+        with i2c_bus.get_bus(device_bus).lock:
+            _sequences.pop((device_bus, _i2c_address), None)
+            enable_internal_Vref(device)
+            set_ADC_max_2x_Vref(device)
+            for i in range(5):
+                configure_ADC(device, channel)
+                channel_byte        = 1 << channel
+                data                = [0x02, channel_byte] 
+                device.writeList(_ADAC_ADC_SEQUENCE, data)
+            
+                data = device.readList(_ADAC_ADC_READ, 2)
+                #int_number = int.from_bytes(data, byteorder="big", signed=False)
+                _data_bits = (data[0] & 0x0f) << 8
+                _data_bits = _data_bits | data[1]
+
+                data = _ADC_max*(_data_bits)/4095
 
         return data , "Succes"
     except Exception as e:
         print(e)
         return 0, "Failed"
 
+def _program_sequence(device, channel_mask):
+    global _ADC_config
+    # Enable the channels as ADC inputs and let the chip convert them in a
+    # repeating sequence, so every 2-byte read returns the next channel
+    enable_internal_Vref(device)
+    set_ADC_max_2x_Vref(device)
+    _ADC_config = channel_mask
+    device.writeList(_ADAC_ADC_CONFIG, [0x0, channel_mask])
+    device.writeList(_ADAC_ADC_SEQUENCE, [_ADAC_SEQUENCE_ON, channel_mask])
+
+def read_data_all(channels, _i2c_address, device_bus):
+    # Read several ADC channels in one burst: the sequence is programmed once
+    # per module, after that each poll is a single block read of 2 bytes per
+    # channel. Returns the voltages in the order of channels.
+    try:
+        channel_mask = 0
+        for channel in channels:
+            if channel < 0 or channel > 7:
+                raise ValueError("Invalid Channel range, Channel must be in 0-7 range")
+            channel_mask |= 1 << channel
+        number_of_conversions = bin(channel_mask).count("1")
+
+        key = (device_bus, _i2c_address)
+        device = i2c_modular.Device(_i2c_address, device_bus)
+
+        def read(bus):
+            try:
+                if _sequences.get(key) != channel_mask:
+                    _program_sequence(device, channel_mask)
+                    _sequences[key] = channel_mask
+                return device.readList(_ADAC_ADC_READ, 2 * number_of_conversions)
+            except (IOError, OSError):
+                # the module may have been reset: program it again on retry
+                _sequences.pop(key, None)
+                raise
+
+        data = i2c_bus.get_bus(device_bus).transaction(read)
+
+        # the sequence always runs in 2x Vref range; the shared _ADC_max is
+        # rewritten by the single pin and DAC paths of any module
+        adc_max = 2 * _Vref
+
+        # each result word carries its channel in bits 14:12; bit 15 is only
+        # set when the chip is not returning ADC results
+        values = {}
+        for i in range(0, len(data) - 1, 2):
+            if data[i] & 0x80:
+                break
+            channel = (data[i] >> 4) & 0x07
+            _data_bits = ((data[i] & 0x0f) << 8) | data[i + 1]
+            values[channel] = adc_max*(_data_bits)/4095
+
+        if any(channel not in values for channel in channels):
+            _sequences.pop(key, None)
+            raise ValueError("ADC sequence out of step, reprogramming")
+
+        return [values[channel] for channel in channels], "Succes"
+    except Exception as e:
+        print(e)
+        return [0]*len(channels), "Failed"
+
 def write_data_pin(_i2c_address, device_bus, channel, voltage):
     # Write data to pin selected
     try:
         device = i2c_modular.Device(_i2c_address, device_bus) 
-        enable_internal_Vref(device)
-        set_DAC_max_2x_Vref(device)
-        configure_DAC(device, channel)
-        if voltage > _DAC_max:
-            raise ValueError("Vref or DAC Max is lower than voltage")
-
-        data_bits       = int((voltage/_DAC_max)*4095)
-        data_msbs       = (data_bits & 0xf00) >> 8
-        lsbs            = (data_bits & 0x0ff)
-        msbs            = (0x80 | (channel << 4)) | data_msbs
-        data            = [msbs, lsbs]
-
-        i2c_modular.device.writeList(_ADAC_DAC_WRITE | channel, data)
+        with i2c_bus.get_bus(device_bus).lock:
+            _sequences.pop((device_bus, _i2c_address), None)
+            enable_internal_Vref(device)
+            set_DAC_max_2x_Vref(device)
+            configure_DAC(device, channel)
+            if voltage > _DAC_max:
+                raise ValueError("Vref or DAC Max is lower than voltage")
+
+            data_bits       = int((voltage/_DAC_max)*4095)
+            data_msbs       = (data_bits & 0xf00) >> 8
+            lsbs            = (data_bits & 0x0ff)
+            msbs            = (0x80 | (channel << 4)) | data_msbs
+            data            = [msbs, lsbs]
+
+            device.writeList(_ADAC_DAC_WRITE | channel, data)
 
         value[DACs[channel]] = voltage
         return "Succes"
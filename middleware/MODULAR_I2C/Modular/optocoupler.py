@@ -1,61 +1,47 @@
-from multiprocessing.util import ForkAwareThreadLock
-import smbus
+from Protocols import i2c_bus
 
 DEV_PCF_ADDRS = 0x20
 
-i2c_device = None
-
 debug = False
 
 confinput_GPIO = [0,1,2,3,4,5,6,8,9,10,11,12,13,14]
 confoutput_GPIO = [8,9,10,11,12,13,14]
 
 def read_gpio_all(_i2c_address=DEV_PCF_ADDRS, device_bus=1):
-    for i in range(5):
-        try:
-
-            data_pin= [0,0,0,0,0,0,0,0,0,0,0,0,0,0]
-            i2c_device = smbus.SMBus(device_bus)
-            
-            #pull-up
-            #for gpio_num in confinput_GPIO:
-            #    data_read = i2c_device.read_word_data(_i2c_address, 0)
-            #    data_write = data_read | (0x01 << gpio_num)
-            #    data_b = data_write.to_bytes(2, byteorder='little')
-            #    i2c_device.write_byte_data(_i2c_address, data_b[0], data_b[1])
+    data_pin= [0,0,0,0,0,0,0,0,0,0,0,0,0,0]
+    try:
+        #pull-up
+        #for gpio_num in confinput_GPIO:
+        #    data_read = i2c_device.read_word_data(_i2c_address, 0)
+        #    data_write = data_read | (0x01 << gpio_num)
+        #    data_b = data_write.to_bytes(2, byteorder='little')
+        #    i2c_device.write_byte_data(_i2c_address, data_b[0], data_b[1])
 
-            ## read corespond device
-            data = i2c_device.read_word_data(_i2c_address, 0)
-            i2c_device.close()
-            
+        ## read corespond device
+        data = i2c_bus.get_bus(device_bus).transaction(lambda i2c_device: i2c_device.read_word_data(_i2c_address, 0))
+    except Exception as e:
+        print(e)
+        return data_pin, "Failed"
 
-            for gpio_num in range(len(confinput_GPIO)):
-                if (data & (0x01 << confinput_GPIO[gpio_num])):
-                    if debug:
-                        print("gpio: " + str(confinput_GPIO[gpio_num]) + ", data: true" )
-                    data_pin[gpio_num] = False
-                else:
-                    if debug:
-                        print("gpio: " + str(confinput_GPIO[gpio_num]) + ", data: false")
-                    data_pin[gpio_num] = True
-            #
-            return data_pin, "Succes"
-            
-        except Exception as e:
-            print(e)
-            print("Error in " + str(i) + " time trying")
-            pass
+    for gpio_num in range(len(confinput_GPIO)):
+        if (data & (0x01 << confinput_GPIO[gpio_num])):
+            if debug:
+                print("gpio: " + str(confinput_GPIO[gpio_num]) + ", data: true" )
+            data_pin[gpio_num] = False
+        else:
+            if debug:
+                print("gpio: " + str(confinput_GPIO[gpio_num]) + ", data: false")
+            data_pin[gpio_num] = True
+    #
+    return data_pin, "Succes"
 
 def read_gpio_num(gpio_num, _i2c_address=DEV_PCF_ADDRS, device_bus=1):
     try:
-        i2c_device = smbus.SMBus(device_bus)
         #
         if gpio_num < 1 or gpio_num > 7:
             raise ValueError("Invalid Optocoupler Number, optocoupler number must be in 1-7 range")
         # read corespond device
-        data = i2c_device.read_word_data(_i2c_address, 0)
-        #
-        i2c_device.close()
+        data = i2c_bus.get_bus(device_bus).read_word_data(_i2c_address, 0)
         #
         gpio_num = gpio_num - 1
         if (data & (0x01 << confinput_GPIO[gpio_num])):
@@ -67,17 +53,17 @@ def read_gpio_num(gpio_num, _i2c_address=DEV_PCF_ADDRS, device_bus=1):
         return 0, "Failed"
 
 def write_gpio_num(gpio_num, data,  _i2c_address=DEV_PCF_ADDRS, device_bus=1):
-    for i in range(5):
-        try:
-            data = not data
-            i2c_device = smbus.SMBus(device_bus)
-            #
-            if gpio_num < 1 or gpio_num > 7:
-                raise ValueError("Invalid Optocoupler Number, optocoupler number must be in 1-7 range")
-            # read corespond device
+    try:
+        data = not data
+        #
+        if gpio_num < 1 or gpio_num > 7:
+            raise ValueError("Invalid Optocoupler Number, optocoupler number must be in 1-7 range")
+        gpio_num = gpio_num -1
+
+        # read-modify-write under the bus lock so a poll cannot interleave
+        def write(i2c_device):
             data_read = i2c_device.read_word_data(_i2c_address, 0)
             #
-            gpio_num = gpio_num -1
             if data:
                 data_write = data_read | (0x01 << confoutput_GPIO[gpio_num])
             else:
@@ -85,10 +71,9 @@ def write_gpio_num(gpio_num, data,  _i2c_address=DEV_PCF_ADDRS, device_bus=1):
             #
             data_b = data_write.to_bytes(2, byteorder='little')
             i2c_device.write_byte_data(_i2c_address, data_b[0], data_b[1])
-            #
-            i2c_device.close()
-            return "Succes"
-        except Exception as e:
-            print(e)
-            print("Error in " + str(i) + " time trying")
-            pass
+
+        i2c_bus.get_bus(device_bus).transaction(write)
+        return "Succes"
+    except Exception as e:
+        print(e)
+        return "Failed"
@@ -0,0 +1,206 @@
+import threading
+import time
+import traceback
+
+from Protocols import i2c_bus
+
+# The expander INT lines are read through OPi.GPIO on the NanoPi. Without it
+# (development hosts, tests) SimulatedGPIO stands in and edges are raised
+# with trigger(pin).
+try:
+    import nanopi.duo
+    from OPi import GPIO
+    GPIO_MODE = nanopi.duo.BOARD
+except ImportError:
+    GPIO = None
+    GPIO_MODE = None
+
+GPIO_MODULE = "GPIO"
+OPTOCOUPLER = "OPTOCOUPLER"
+DRYCONTACT = "DRYCONTACT"
+INPUT_MODULES = (GPIO_MODULE, OPTOCOUPLER, DRYCONTACT)
+
+FAILED_VALUE = 9999         # value poll() reports for a pin it could not read
+FAST_POLL_INTERVAL = 0.05   # seconds between port reads of "fast_poll" modules without an INT line
+EDGE_SETTLE_TIME = 0.005    # seconds to let contacts settle after an INT edge
+EDGE_CHECK_INTERVAL = 1     # seconds between safety reads of INT-wired modules (missed edges)
+
+
+class SimulatedGPIO(object):
+    """Software stand-in for OPi.GPIO: edges are raised with trigger(pin)."""
+    BOARD = 10
+    IN = 1
+    PUD_UP = 22
+    FALLING = 32
+
+    def __init__(self):
+        self._callbacks = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, state):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None):
+        pass
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def trigger(self, pin):
+        callback = self._callbacks.get(pin)
+        if callback:
+            callback(pin)
+
+
+class InputWatcher(object):
+    def __init__(self, devices_list, dev_poller, publish, gpio=None):
+        """Publish input module changes as they happen, between regular polls.
+
+        Modules whose protocol_setting has an "interrupt_pin" (board pin of
+        the expander INT line) are read on its falling edge; modules that set
+        "fast_poll": true instead get a single-word port read every
+        FAST_POLL_INTERVAL. Input modules with neither are left to the regular
+        polling cycle. Only when the raw port changed is the module fully
+        polled, and publish(index, data, changed) is called with the poll
+        result and the names of the values that changed."""
+        self.publish = publish
+        self.gpio = gpio
+        self.modules = []
+        for i in range(len(devices_list)):
+            setting = devices_list[i]["protocol_setting"]
+            if devices_list[i]["profile"]["part_number"] not in INPUT_MODULES:
+                continue
+            if setting.get("interrupt_pin") is None and not setting.get("fast_poll"):
+                continue
+            self.modules.append({
+                "index": i,
+                "poller": dev_poller[i],
+                "interrupt_pin": setting.get("interrupt_pin"),
+                "fast_poll": bool(setting.get("fast_poll")),
+                "raw": None,
+                "data": None
+            })
+        self._pending_pins = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._pins = []
+        self._thread = None
+
+    # --- Edges ---
+    def _setup_interrupts(self):
+        pins = sorted(set(module["interrupt_pin"] for module in self.modules
+                          if module["interrupt_pin"] is not None))
+        if not pins:
+            return
+        if self.gpio is None:
+            if GPIO is None:
+                print("input watcher: OPi.GPIO not available, simulating INT lines")
+                self.gpio = SimulatedGPIO()
+            else:
+                self.gpio = GPIO
+                self.gpio.setmode(GPIO_MODE)
+                self.gpio.setwarnings(False)
+
+        for pin in pins:
+            try:
+                self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+                self.gpio.add_event_detect(pin, self.gpio.FALLING, callback=self._on_edge)
+                self._pins.append(pin)
+            except Exception as e:
+                # modules on this line fall back to fast polling if they opted
+                # in, otherwise to the regular polling cycle
+                print("input watcher: cannot watch INT pin " + str(pin) + ": " + str(e))
+                for module in self.modules:
+                    if module["interrupt_pin"] == pin:
+                        module["interrupt_pin"] = None
+                self.modules = [module for module in self.modules
+                                if module["interrupt_pin"] is not None or module["fast_poll"]]
+
+    def _on_edge(self, pin):
+        with self._lock:
+            self._pending_pins.add(pin)
+        self._wake.set()
+
+    # --- Reads ---
+    def _read_port(self, module):
+        poller = module["poller"]
+        return i2c_bus.get_bus(poller.device_bus).read_word_data(poller.address, 0)
+
+    def _check(self, module):
+        try:
+            raw = self._read_port(module)
+        except Exception as e:
+            print("input watcher: port read failed on " + module["poller"].name + ": " + str(e))
+            return
+        if raw == module["raw"]:
+            return
+
+        data = module["poller"].poll()
+        if FAILED_VALUE in data.values():
+            # read again next time instead of publishing a failed poll
+            module["raw"] = None
+            return
+        module["raw"] = raw
+
+        last_data = module["data"]
+        module["data"] = data
+        if last_data is None:
+            return
+        changed = [key for key in data if data[key] != last_data.get(key)]
+        if changed:
+            self.publish(module["index"], data, changed)
+
+    def _run(self):
+        polled = any(module["interrupt_pin"] is None for module in self.modules)
+        timeout = FAST_POLL_INTERVAL if polled else EDGE_CHECK_INTERVAL
+        last_edge_check = time.time()
+
+        while not self._stopping:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            with self._lock:
+                pins, self._pending_pins = self._pending_pins, set()
+            if pins:
+                time.sleep(EDGE_SETTLE_TIME)
+
+            edge_check = time.time() - last_edge_check >= EDGE_CHECK_INTERVAL
+            if edge_check:
+                last_edge_check = time.time()
+
+            for module in self.modules:
+                pin = module["interrupt_pin"]
+                if pin is None or pin in pins or edge_check:
+                    try:
+                        self._check(module)
+                    except Exception as e:
+                        print(e)
+                        print(traceback.format_exc())
+
+    def start(self):
+        if not self.modules or self._thread is not None:
+            return
+        self._setup_interrupts()
+        if not self.modules:
+            return
+        # baseline so the first change is reported against real values
+        for module in self.modules:
+            self._check(module)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print("input watcher: watching " + str(len(self.modules)) + " input modules")
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        for pin in self._pins:
+            try:
+                self.gpio.remove_event_detect(pin)
+            except Exception:
+                pass
+        self._pins = []
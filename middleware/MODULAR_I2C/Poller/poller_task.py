@@ -10,7 +10,7 @@ import Modular.relay_mini as relay_mini
 import json
 
 from time import strftime, localtime
-import time, os, traceback, pprint, psutil
+import time, os, traceback, pprint, psutil, threading
 import Poller.libs as libs
 
 import I2Cout as I2Cout
@@ -33,6 +33,42 @@ def get_process_memory():
     process = psutil.Process(os.getpid())
     return [process.memory_info().rss,process.memory_full_info().rss]
 
+# Group module indexes by I2C bus, keeping the installed order on each bus
+def group_by_bus(devices_list):
+    buses = {}
+    for i in range(len(devices_list)):
+        buses.setdefault(devices_list[i]["protocol_setting"]["device_bus"], []).append(i)
+    return buses
+
+# Poll the modules of every bus on its own thread: buses are independent, so a
+# cycle takes as long as the slowest bus instead of the sum of all of them.
+# Returns {index: data, or the exception raised} and {device_bus: seconds}.
+def poll_buses(dev_poller, buses):
+    results = {}
+    cycle_times = {}
+
+    def poll_bus(device_bus, indexes):
+        start = time.time()
+        for i in indexes:
+            try:
+                results[i] = dev_poller[i].poll()
+            except Exception as e:
+                results[i] = e
+        cycle_times[device_bus] = time.time() - start
+
+    if len(buses) == 1:
+        for device_bus, indexes in buses.items():
+            poll_bus(device_bus, indexes)
+        return results, cycle_times
+
+    threads = [threading.Thread(target=poll_bus, args=(device_bus, indexes), daemon=True)
+               for device_bus, indexes in buses.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, cycle_times
+
 # Class for SNMP polling
 class Modular(object):
     def __init__(self, profile, protocol_setting):
@@ -78,8 +114,10 @@ class Modular(object):
                 var_name.append(item["var_name"])
 
         elif self.part_number == AIO:
-            for item in self.data_lib:
-                value, status = aio.read_data_pin(item["gpio_number"], self.address, self.device_bus)
+            # all channels in one sequenced ADC burst
+            channels = [item["gpio_number"] for item in self.data_lib]
+            values, status = aio.read_data_all(channels, self.address, self.device_bus)
+            for item, value in zip(self.data_lib, values):
                 if status == SUCCESS:
                     value = round(value * 100)
                     raw_data.append(value)
@@ -0,0 +1,81 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+STATE_FILE = "last_data.json"
+FLUSH_INTERVAL = 60    # seconds between writes of changed values to the SD card
+
+
+class StateStore(object):
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL):
+        """Last polled value of every module, kept in memory and keyed by
+        bus and address so modules of the same type do not overwrite each
+        other. Changed values are written to one JSON file at most every
+        flush_interval seconds (and at exit), through a temporary file and
+        os.replace so a power cut leaves either the old or the new file."""
+        self.path = path or os.path.join(os.getcwd(), STATE_FILE)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.time()
+        self.states = self._load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(device_bus, address):
+        return str(device_bus) + ":" + str(address)
+
+    def _load(self):
+        try:
+            with open(self.path) as json_data:
+                states = json.load(json_data)
+            return states if isinstance(states, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, device_bus, address):
+        """Last stored value dict of a module, None if it was never stored."""
+        with self._lock:
+            state = self.states.get(self.key(device_bus, address))
+            return dict(state["data"]) if state else None
+
+    def update(self, device, data):
+        """Record the value of an installed_devices.json entry; only a value
+        that differs from the stored one marks the store for the next flush."""
+        key = self.key(device["protocol_setting"]["device_bus"], device["protocol_setting"]["address"])
+        with self._lock:
+            state = self.states.get(key)
+            if state and state["data"] == data:
+                return
+            self.states[key] = {
+                "name": device["profile"]["name"],
+                "part_number": device["profile"]["part_number"],
+                "data": dict(data)
+            }
+            self._dirty = True
+
+    def flush_due(self):
+        """Flush when flush_interval has passed since the last write."""
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.time()
+            if not self._dirty:
+                return
+            content = json.dumps(self.states)
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as outfile:
+                outfile.write(content)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print("Failed to save last data: " + str(e))
+            with self._lock:
+                self._dirty = True
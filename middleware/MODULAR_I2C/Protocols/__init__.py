@@ -1 +1 @@
-from Protocols import i2c_modular, mqtt
\ No newline at end of file
+from Protocols import i2c_bus, i2c_modular, i2c_sim, mqtt
\ No newline at end of file
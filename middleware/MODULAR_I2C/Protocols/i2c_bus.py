@@ -0,0 +1,100 @@
+import threading
+import time
+
+try:
+    import smbus
+except ImportError:
+    smbus = None
+
+# Retry policy for a failed transaction (bus busy, NACK while a module reboots)
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.01      # seconds before the second attempt
+MAX_RETRY_DELAY = 0.2   # backoff doubles up to this
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+# Opens the handle of a bus number: smbus.SMBus on the device, or an
+# i2c_sim.I2CSimulator when running without hardware (see set_backend)
+_backend = smbus.SMBus if smbus else None
+
+
+class I2CBus(object):
+    def __init__(self, device_bus):
+        """One persistent SMBus handle for an I2C bus number, shared by the
+        poller and the MQTT control path. Hold `lock` (or use transaction) for
+        any sequence of accesses that must not be interleaved, such as a
+        read-modify-write of an expander port."""
+        self.device_bus = device_bus
+        self.lock = threading.RLock()
+        self._handle = None
+
+    def handle(self):
+        """Return the open SMBus handle, opening /dev/i2c-N on first use."""
+        with self.lock:
+            if self._handle is None:
+                if _backend is None:
+                    raise IOError("no I2C backend: smbus is not installed")
+                self._handle = _backend(self.device_bus)
+            return self._handle
+
+    def reset(self):
+        """Close the handle so the next access reopens the bus."""
+        with self.lock:
+            if self._handle is not None:
+                try:
+                    self._handle.close()
+                except Exception:
+                    pass
+                self._handle = None
+
+    def transaction(self, function, attempts=MAX_ATTEMPTS):
+        """Run function(handle) with the bus locked, retrying with backoff.
+        The bus is reopened after a failure and the lock is released while
+        waiting, so other devices on the bus are not held up. Raises the last
+        error when every attempt failed."""
+        delay = RETRY_DELAY
+        for attempt in range(attempts):
+            try:
+                with self.lock:
+                    return function(self.handle())
+            except (IOError, OSError) as e:
+                print(e)
+                print("I2C bus " + str(self.device_bus) + " error in " + str(attempt) + " time trying")
+                self.reset()
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def __getattr__(self, name):
+        """Single SMBus calls (read_byte, write_i2c_block_data, ...) made
+        under the bus lock, so the bus can stand in for an smbus.SMBus."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            with self.lock:
+                return getattr(self.handle(), name)(*args, **kwargs)
+        return call
+
+
+def get_bus(device_bus):
+    """Return the shared I2CBus for a bus number."""
+    with _buses_lock:
+        bus = _buses.get(device_bus)
+        if bus is None:
+            bus = _buses[device_bus] = I2CBus(device_bus)
+        return bus
+
+
+def set_backend(backend):
+    """Open buses with backend(device_bus) instead of smbus.SMBus, e.g.
+    I2CSimulator.open. Handles already open are closed so the next access
+    goes through the new backend."""
+    global _backend
+    with _buses_lock:
+        _backend = backend
+        buses = list(_buses.values())
+    for bus in buses:
+        bus.reset()
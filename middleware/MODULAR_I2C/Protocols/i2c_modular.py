@@ -1,4 +1,5 @@
 import logging
+from Protocols import i2c_bus
 
 DeviceList = ["AIO","GPIO","OPTOCOUPLER", "RELAY"]
 
@@ -8,9 +9,9 @@ class Device(object):
         specified I2C bus number."""
         self._address = address
         if i2c_interface is None:
-            # Use pure python I2C interface if none is specified.
-            import smbus
-            self._bus = smbus.SMBus(device_bus)
+            # Use the process-wide handle for this bus, shared with the poller
+            # and control path and kept open between devices.
+            self._bus = i2c_bus.get_bus(device_bus)
         else:
             # Otherwise use the provided class to create an smbus interface.
             self._bus = i2c_interface(device_bus)
@@ -0,0 +1,293 @@
+import errno
+import random
+import threading
+import time
+
+from Protocols import i2c_bus
+
+# 100 kHz standard mode: 9 clocks (8 bits + ACK) per byte on the wire
+STANDARD_MODE_BYTE_TIME = 9 / 100000.0
+
+# Bytes on the wire for each smbus call, not counting block data:
+# (address + command bytes written, data bytes, repeated start address)
+_CALL_BYTES = {
+    "read_byte": (1, 1, 0),
+    "write_byte": (1, 1, 0),
+    "read_byte_data": (2, 1, 1),
+    "write_byte_data": (2, 1, 0),
+    "read_word_data": (2, 2, 1),
+    "write_word_data": (2, 2, 0),
+    "read_i2c_block_data": (2, 0, 1),
+    "write_i2c_block_data": (2, 0, 0),
+}
+
+
+def _remote_io_error():
+    return OSError(errno.EREMOTEIO, "Remote I/O error")
+
+
+class PCF857x(object):
+    def __init__(self, width=8):
+        """Quasi-bidirectional port expander, PCF8574 (width=8) as on the
+        RELAY/RELAYMINI modules or PCF8575 (width=16) as on the GPIO,
+        OPTOCOUPLER and DRYCONTACT modules. A pin reads high unless its latch
+        is written low or set_input() drives it low from outside."""
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.latch = self.mask
+        self.driven_low = 0
+
+    def set_input(self, pin, level):
+        """Drive a pin from outside the chip: level False pulls it low."""
+        if level:
+            self.driven_low &= ~(1 << pin)
+        else:
+            self.driven_low |= 1 << pin
+
+    def port(self):
+        return self.latch & ~self.driven_low & self.mask
+
+    def read_byte(self):
+        return self.port() & 0xFF
+
+    def write_byte(self, value):
+        self.latch = (self.latch & ~0xFF) | (value & 0xFF)
+
+    def read_word_data(self, register):
+        # the modules answer a plain 2-byte port read after the command byte
+        return self.port() & 0xFFFF
+
+    def write_byte_data(self, register, value):
+        # the drivers send the two port bytes as command and data byte
+        self.latch = ((register & 0xFF) | ((value & 0xFF) << 8)) & self.mask
+
+
+class AD5593(object):
+    REFERENCE = 2.5
+
+    def __init__(self):
+        """AD5593R 8 channel ADC/DAC as on the AIO module: configuration
+        registers, the repeating ADC sequence and DAC writes. Inputs are set
+        with set_voltage()."""
+        self.registers = [0] * 16
+        self.volts = [0.0] * 8
+        self.dac = [0] * 8
+        self._sequence_position = 0
+
+    def set_voltage(self, channel, volts):
+        self.volts[channel] = volts
+
+    def _adc_max(self):
+        return self.REFERENCE * (2 if self.registers[0x03] & 0x20 else 1)
+
+    def _adc_word(self, channel):
+        code = int(self.volts[channel] / self._adc_max() * 4095)
+        return (channel << 12) | max(0, min(4095, code))
+
+    def write_i2c_block_data(self, register, data):
+        word = ((data[0] & 0xFF) << 8) | (data[1] & 0xFF) if len(data) > 1 else 0
+        if register == 0x0F and word == 0x0DAC:
+            self.__init__()
+        elif register < 0x10:
+            self.registers[register] = word
+            if register == 0x02:
+                self._sequence_position = 0
+        elif register & 0xF0 == 0x10:
+            self.dac[register & 0x07] = word & 0x0FFF
+        else:
+            raise _remote_io_error()
+
+    def read_i2c_block_data(self, register, length=32):
+        words = []
+        if register == 0x40:
+            sequence = [channel for channel in range(8) if self.registers[0x02] >> channel & 1]
+            for i in range(length // 2):
+                if not sequence:
+                    words.append(0x8000)
+                    continue
+                words.append(self._adc_word(sequence[self._sequence_position % len(sequence)]))
+                self._sequence_position += 1
+        elif register & 0xF0 == 0x50:
+            words = [0x8000 | (register & 0x07) << 12 | self.dac[register & 0x07]] * (length // 2)
+        elif register & 0xF0 == 0x60:
+            words = [self.registers[register & 0x0F]] * (length // 2)
+        else:
+            raise _remote_io_error()
+
+        data = []
+        for word in words:
+            data += [word >> 8, word & 0xFF]
+        return data
+
+
+class LM75(object):
+    def __init__(self, temperature=25.0):
+        """LM75 temperature sensor; set `temperature` to change the reading."""
+        self.temperature = temperature
+        self.registers = [0, 0, 75 << 8, 80 << 8]
+
+    def read_word_data(self, register):
+        if register == 0:
+            value = (int(round(self.temperature * 2)) << 7) & 0xFFFF
+        else:
+            value = self.registers[register & 0x03]
+        # SMBus words are little-endian, the LM75 sends the MSB first
+        return ((value >> 8) & 0xFF) | ((value & 0xFF) << 8)
+
+    def read_byte_data(self, register):
+        return self.registers[register & 0x03] & 0xFF
+
+    def write_byte_data(self, register, value):
+        self.registers[register & 0x03] = value & 0xFF
+
+
+class PCA9531(object):
+    def __init__(self):
+        """PCA9531 8-bit LED dimmer: INPUT, PSC0, PWM0, PSC1, PWM1 and the
+        LED selector registers."""
+        self.registers = [0xFF, 0, 0x80, 0, 0x80, 0, 0, 0, 0, 0]
+
+    def read_byte_data(self, register):
+        return self.registers[register & 0x0F]
+
+    def write_byte_data(self, register, value):
+        if not isinstance(value, int):
+            raise TypeError("an integer is required")
+        if register & 0x0F >= len(self.registers):
+            raise _remote_io_error()
+        self.registers[register & 0x0F] = value & 0xFF
+
+
+# Simulated chip for each part_number of installed_devices.json
+PART_MODELS = {
+    "RELAY": lambda: PCF857x(8),
+    "RELAYMINI": lambda: PCF857x(8),
+    "GPIO": lambda: PCF857x(16),
+    "OPTOCOUPLER": lambda: PCF857x(16),
+    "DRYCONTACT": lambda: PCF857x(16),
+    "AIO": AD5593,
+    "LM75": LM75,
+    "pca9531": PCA9531,
+}
+
+
+class SimulatedSMBus(object):
+    def __init__(self, simulator, device_bus):
+        """smbus.SMBus look-alike handed out by I2CSimulator.open."""
+        self.simulator = simulator
+        self.device_bus = device_bus
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        if name not in _CALL_BYTES:
+            raise AttributeError(name)
+
+        def call(address, *args):
+            return self.simulator.transfer(self.device_bus, address, name, args)
+        return call
+
+
+class I2CSimulator(object):
+    def __init__(self, latency=0, byte_time=STANDARD_MODE_BYTE_TIME, fault_rate=0, seed=None):
+        """In-memory I2C buses for running MODULAR_I2C without hardware.
+
+        Every smbus call takes latency + byte_time per byte on the wire and
+        fails with a Remote I/O error at fault_rate (or when queued with
+        fail_next), like a NACK from a rebooting module. install() makes
+        i2c_bus open these buses instead of /dev/i2c-N."""
+        self.latency = latency
+        self.byte_time = byte_time
+        self.fault_rate = fault_rate
+        self.devices = {}
+        self._random = random.Random(seed)
+        self._failures = {}
+        self._busy = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def add_device(self, device_bus, address, device):
+        self.devices[(device_bus, address)] = device
+        return device
+
+    def add_devices(self, devices_list):
+        """Add the simulated chip of every entry of an installed_devices.json
+        style list."""
+        for item in devices_list:
+            part_number = item["profile"]["part_number"]
+            setting = item["protocol_setting"]
+            self.add_device(setting["device_bus"], setting["address"], PART_MODELS[part_number]())
+
+    def device(self, device_bus, address):
+        return self.devices[(device_bus, address)]
+
+    def fail_next(self, device_bus, count=1):
+        """Make the next count calls on device_bus fail."""
+        with self._lock:
+            self._failures[device_bus] = self._failures.get(device_bus, 0) + count
+
+    def open(self, device_bus):
+        with self._lock:
+            self.opens += 1
+        return SimulatedSMBus(self, device_bus)
+
+    def install(self):
+        i2c_bus.set_backend(self.open)
+
+    def reset_stats(self):
+        with self._lock:
+            self.opens = 0
+            self.transactions = 0
+            self.bytes = 0
+            self.errors = 0
+            self.collisions = 0
+            self.bus_time = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "collisions": self.collisions,
+                "bus_time": self.bus_time,
+                "opens": self.opens,
+            }
+
+    def _wire_bytes(self, name, args):
+        header, data, restart = _CALL_BYTES[name]
+        if name == "read_i2c_block_data":
+            data = args[1] if len(args) > 1 else 32
+        elif name == "write_i2c_block_data":
+            data = len(args[1])
+        return header + data + restart
+
+    def transfer(self, device_bus, address, name, args):
+        wire_bytes = self._wire_bytes(name, args)
+        duration = self.latency + wire_bytes * self.byte_time
+        with self._lock:
+            self.transactions += 1
+            self.bytes += wire_bytes
+            self.bus_time += duration
+            # two calls on one bus at once would garble the wire
+            if self._busy.get(device_bus, 0):
+                self.collisions += 1
+            self._busy[device_bus] = self._busy.get(device_bus, 0) + 1
+            fail = self._failures.get(device_bus, 0) > 0
+            if fail:
+                self._failures[device_bus] -= 1
+            elif self.fault_rate:
+                fail = self._random.random() < self.fault_rate
+        try:
+            if duration:
+                time.sleep(duration)
+            device = self.devices.get((device_bus, address))
+            if fail or device is None or not hasattr(device, name):
+                with self._lock:
+                    self.errors += 1
+                raise _remote_io_error()
+            return getattr(device, name)(*args)
+        finally:
+            with self._lock:
+                self._busy[device_bus] -= 1
@@ -1,7 +1,16 @@
 import paho.mqtt.client as mqtt
 import json
 from time import strftime, localtime
-import time, os, traceback, pprint, psutil
+import time, os, sys, traceback, pprint, psutil
+
+# Shared priority publish queue (CONFIG_SYSTEM_DEVICE) keeps a slow broker from
+# growing paho's internal queue; without it publishes go straight to paho
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "CONFIG_SYSTEM_DEVICE"))
+try:
+    from PublishQueue import PublishQueue, PRIORITY_CONTROL, PRIORITY_ALARM, PRIORITY_TELEMETRY
+except ImportError:
+    PublishQueue = None
+    PRIORITY_CONTROL, PRIORITY_ALARM, PRIORITY_TELEMETRY = 0, 1, 2
 
 pp = pprint.PrettyPrinter(indent=4)
 
@@ -14,6 +23,7 @@ class Client(object):
         self.retain = retain
         self.username = username
         self.password = password
+        self.queue = None
     
     def set_usr_pw(self, username = None, password = None):
         if password:
@@ -31,14 +41,20 @@ class Client(object):
 
     def loop_start(self):
         self.client.loop_start()
+        # The queue's sender needs the network loop for acks and reconnects
+        if PublishQueue and self.queue is None:
+            self.queue = PublishQueue(self.client, "{}:{}".format(self.broker_address, self.broker_port))
 
-    def publish(self, topic, data):
+    def publish(self, topic, data, priority=PRIORITY_TELEMETRY, supersede=False):
         Timestamp = strftime("%Y-%m-%d %H:%M:%S", localtime())
         
         if type(data) == dict:
             data["Timestamp"] = Timestamp
             
-        self.client.publish(topic, json.dumps(data), self.qos, self.retain)
+        if self.queue:
+            self.queue.publish(topic, json.dumps(data), self.qos, self.retain, priority, supersede)
+        else:
+            self.client.publish(topic, json.dumps(data), self.qos, self.retain)
         #Timestamp = strftime("%Y-%m-%d %H:%M:%S", localtime())
         #print("Published new data at", Timestamp, topic, json.dumps(data))
         pp.pprint(data)
@@ -46,8 +62,14 @@ class Client(object):
         #print("Published on", topic, ">>>",json.dumps(data))
 
     def loop_stop(self):
+        if self.queue:
+            self.queue.stop()
+            self.queue = None
         self.client.loop_stop()
 
+    def get_queue_stats(self):
+        return self.queue.get_stats() if self.queue else None
+
     def disconnect(self):
         self.client.disconnect()
 
@@ -12,6 +12,8 @@ import ast
 import sys
 
 import Poller.poller_task as poller
+from Poller.input_watcher import InputWatcher
+from Poller.state_store import StateStore
 
 import Modular.aio as aio
 import Modular.gpio as gpio
@@ -21,6 +23,14 @@ import Modular.relay_mini as relay_mini
 
 import Protocols.mqtt as MyMQTT
 
+# Host MAC is resolved once by the shared HostIdentity cache (CONFIG_SYSTEM_DEVICE)
+# and refreshed only when the network changes, instead of on every publish
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "CONFIG_SYSTEM_DEVICE"))
+try:
+    from HostIdentity import get_default_mac_address
+except ImportError:
+    get_default_mac_address = getmac.get_mac_address
+
 
 wait_delay = False
 
@@ -36,6 +46,7 @@ DRYCONTACT ="DRYCONTACT"
 RELAYMINI = "RELAYMINI"
 
 Subsclient = mqtt.Client("")
+status_queue = None  # control-priority queue in front of Subsclient for command responses
 sub_data = []
 sub_topic = ""
 
@@ -67,6 +78,13 @@ def process_data_subscribe(client, userdata, message):
         print(e)
         pass
 
+def publish_status(data):
+    # command responses go out ahead of any other queued publish on Subsclient
+    if status_queue:
+        status_queue.publish(sub_topic + "_status", json.dumps(data), priority=MyMQTT.PRIORITY_CONTROL)
+    else:
+        Subsclient.publish(sub_topic + "_status", json.dumps(data))
+
 def process_data_subscribe_in_loop():
     global Subsclient, sub_data, sub_topic
     try: 
@@ -80,7 +98,7 @@ def process_data_subscribe_in_loop():
 
         errlog = open(os.getcwd() + "/errlog.txt", "a")
 
-        if mac == getmac.get_mac_address():
+        if mac == get_default_mac_address():
             print("Get Subscribe data with topic =", sub_topic)
             
             if device == AIO:
@@ -92,11 +110,11 @@ def process_data_subscribe_in_loop():
                     data, status = aio.read_data_pin(value["pin"], address, device_bus)
                     sub_data["data"] = data
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
                 elif function == function_write:
                     status = aio.write_data_pin(address, device_bus, value["pin"], value["data"])
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
             elif device == GPIO:
                 print("GPIO")
                 errlog.write("{0} {1} data acquisition check\n".format(
@@ -106,12 +124,12 @@ def process_data_subscribe_in_loop():
                     data, status = gpio.read_gpio_num(value["pin"], address, device_bus)
                     sub_data["data"] = data
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
                 elif function == function_write:
                     print(value)
                     status = gpio.write_gpio_num(value["pin"], value["data"], address, device_bus)
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
             elif device == OPTOCOUPLER:
                 print("OPTOCOUPLER")
                 errlog.write("{0} {1} data acquisition check\n".format(
@@ -121,11 +139,11 @@ def process_data_subscribe_in_loop():
                     data, status = optocoupler.read_gpio_num(value["pin"], address, device_bus)
                     sub_data["data"] = data
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
                 elif function == function_write:
                     status = optocoupler.write_gpio_num(value["pin"], value["data"], address, device_bus)
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
             elif device == RELAY:
                 print("RELAY")
                 errlog.write("{0} {1} data acquisition check\n".format(
@@ -135,11 +153,11 @@ def process_data_subscribe_in_loop():
                     data, status = relay.read_gpio_num(value["pin"], address, device_bus)
                     sub_data["data"] = data
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
                 elif function == function_write:
                     status = relay.write_gpio_num(value["pin"], value["data"], address, device_bus)
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
             elif device == RELAYMINI:
                 print("RELAYMINI")
                 errlog.write("{0} {1} data acquisition check\n".format(
@@ -149,11 +167,11 @@ def process_data_subscribe_in_loop():
                     data, status = relay_mini.read_gpio_num(value["pin"], address, device_bus)
                     sub_data["data"] = data
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
                 elif function == function_write:
                     status = relay_mini.write_gpio_num(value["pin"], value["data"], address, device_bus)
                     sub_data["status"] = status
-                    Subsclient.publish( sub_topic + "_status", json.dumps(sub_data))
+                    publish_status(sub_data)
             else:
                 print("not recognize")
             
@@ -170,7 +188,7 @@ def process_data_subscribe_in_loop():
 
 
 def i2c_modular_polling_task(devices_list, interval, mqtt_config):
-    global Subsclient, wait_delay
+    global Subsclient, status_queue, wait_delay
 
     print("starting i2c modular polling task ....")
 
@@ -187,6 +205,12 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
         dev_poller.append(poller.Modular(
             devices_list[i]["profile"], devices_list[i]["protocol_setting"]))
 
+    # Modules on different I2C buses are polled in parallel, one worker per bus
+    buses = poller.group_by_bus(devices_list)
+
+    # Last value of every module, written to the SD card in batches
+    state_store = StateStore()
+
     with open(os.getcwd() + '/stat.temp') as file:
         FINISH = ast.literal_eval(file.read())
 
@@ -210,6 +234,8 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
             Subsclient.username_pw_set(username, password)
             Subsclient.connect(broker_address, broker_port, 60)
             Subsclient.loop_start()
+            if MyMQTT.PublishQueue and status_queue is None:
+                status_queue = MyMQTT.PublishQueue(Subsclient, "subscribe")
             Subsclient.subscribe(mqtt_config['sub_topic_modular'])
             break
         except Exception as e:
@@ -232,7 +258,7 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
     print("Connecting to broker for Subscriber")
 
     pub_data =  {
-                    'mac': getmac.get_mac_address(),
+                    'mac': get_default_mac_address(),
                     'protocol_type': 'I2C Modular',
                     'device' : "",
                     'adrress': "",
@@ -248,9 +274,7 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
     # still development
     """
     try:
-        last_data_relaymini = {}
-        with open(os.getcwd() + '/last_data_RELAYMINI.json') as json_data:
-            last_data_relaymini = json.load(json_data)
+        last_data_relaymini = state_store.get(0, 34)
         for i in range(6):
             relay_mini.write_gpio_num(i+1,  last_data_relaymini["relayMiniOutput" + str(i+1)], 34, 0)
     except Exception as e:
@@ -283,15 +307,41 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
                 strftime("%Y-%m-%d %H:%M:%S", localtime()), "i2c modular task", "Failed to connect broker mqtt"))
             errlog.close()
             pass
+
+    # Input modules with an "interrupt_pin" or "fast_poll" in their
+    # protocol_setting publish their changes as they happen, between polls. The
+    # full value dict is sent so subscribers can keep replacing their state;
+    # telemetry still queued for the topic is older and is dropped.
+    def publish_input_change(i, data, changed):
+        mqtt_client.publish(devices_list[i]["profile"]["topic"], {
+            'mac': get_default_mac_address(),
+            'protocol_type': 'I2C MODULAR',
+            'number_address': devices_list[i]["protocol_setting"]["address"],
+            'value': json.dumps(data),
+            'changed': changed
+        }, priority=MyMQTT.PRIORITY_ALARM, supersede=True)
+
+    input_watcher = None
+    if mqtt_enable:
+        input_watcher = InputWatcher(devices_list, dev_poller, publish_input_change)
+        input_watcher.start()
             
 
     while (not FINISH):
         try:            
+            results, bus_cycle_times = poller.poll_buses(dev_poller, buses)
+            print("I2C bus cycle time: " + ", ".join(
+                "bus " + str(device_bus) + " " + str(round(bus_cycle_times[device_bus] * 1000, 1)) + " ms"
+                for device_bus in sorted(bus_cycle_times)))
+
+            # Publish from this thread only, in installed order
             for i in range(dev_num):
                 #topic = mqtt_config['pub_topic'][0]
                 topic = devices_list[i]["profile"]["topic"]
                 try:
-                    data = dev_poller[i].poll()
+                    data = results[i]
+                    if isinstance(data, Exception):
+                        raise data
                     # Publish data to MQTT Broker IF MQTT SERVICE ENABLED
                     if mqtt_enable:
                         try:
@@ -300,7 +350,7 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
 
                             i2c_addres = devices_list[i]["protocol_setting"]["address"]
                             mqtt_client.publish(topic, {
-                                'mac': getmac.get_mac_address(),
+                                'mac': get_default_mac_address(),
                                 'protocol_type': 'I2C MODULAR',
                                 'number_address': i2c_addres,
                                 'value': json.dumps(data)
@@ -317,9 +367,7 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
                                 with open(os.getcwd() + '/stat_subscribe_modular.temp', 'w') as file:
                                     file.write(str(False))
                                 
-                            type_device = devices_list[i]["profile"]["part_number"]    
-                            with open(os.getcwd() + '/last_data_'+ type_device +'.json', "w") as outfile:
-                                outfile.write(json.dumps(data)) 
+                            state_store.update(devices_list[i], data)
 
                             #errlog = open(os.getcwd() + "/errlog.txt", "a")
                             #errlog.write("{0} {1} publish check\n".format(
@@ -367,6 +415,8 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
             with open(os.getcwd() + '/stat.temp') as file:
                 FINISH = ast.literal_eval(file.read())
 
+            state_store.flush_due()
+
             # Wait for next data polling
             wait_delay = True
             for i in range(interval):
@@ -387,3 +437,6 @@ def i2c_modular_polling_task(devices_list, interval, mqtt_config):
         errlog.write("{0} loop check\n".format(strftime("%Y-%m-%d %H:%M:%S")))
         errlog.close()
 
+    if input_watcher:
+        input_watcher.stop()
+    state_store.flush()
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# Times the MODULAR_I2C polling cycle against simulated modules, no hardware
+# or broker needed. Run from this folder:
+#   python benchmark_i2c.py --modules 64 --cycles 20 --fault-rate 0.01
+# Buses are polled in parallel as in the task; --serial polls them in turn.
+import argparse
+import json
+import time
+
+import Poller.poller_task as poller
+from Protocols.i2c_sim import I2CSimulator, STANDARD_MODE_BYTE_TIME
+
+PARTS = ["RELAY", "RELAYMINI", "GPIO", "OPTOCOUPLER", "DRYCONTACT", "AIO"]
+FAILED_VALUE = 9999
+
+
+def simulated_devices(modules, buses):
+    # installed_devices.json style list, modules spread round robin over the
+    # buses and every bus gets the same mix of module types
+    devices_list = []
+    for i in range(modules):
+        part_number = PARTS[(i // buses) % len(PARTS)]
+        devices_list.append({
+            "profile": {
+                "name": part_number + str(i + 1),
+                "device_type": "Modular",
+                "manufacturer": "IOT",
+                "part_number": part_number,
+                "topic": "IOT/Modular/" + part_number.lower() + "/" + str(i + 1)
+            },
+            "protocol_setting": {
+                "protocol": "Modular",
+                "address": 0x10 + i // buses,
+                "device_bus": i % buses
+            }
+        })
+    return devices_list
+
+
+def run(args):
+    simulator = I2CSimulator(args.latency, args.byte_time, args.fault_rate, args.seed)
+    devices_list = simulated_devices(args.modules, args.buses)
+    simulator.add_devices(devices_list)
+    simulator.install()
+
+    # same pollers and per-device publish payload as i2c_modular_polling_task
+    dev_poller = [poller.Modular(item["profile"], item["protocol_setting"]) for item in devices_list]
+    buses = poller.group_by_bus(devices_list)
+    if args.serial:
+        buses = {"all": list(range(len(devices_list)))}
+
+    cycle_times = []
+    bus_times = {}
+    failed_polls = 0
+    for cycle in range(args.cycles + 1):
+        if cycle == 1:
+            # the first cycle opens the buses and programs the AIO sequences
+            simulator.reset_stats()
+            cycle_times = []
+            bus_times = {}
+            failed_polls = 0
+        start = time.time()
+        results, bus_cycle_times = poller.poll_buses(dev_poller, buses)
+        for device_bus in bus_cycle_times:
+            bus_times[device_bus] = bus_times.get(device_bus, 0) + bus_cycle_times[device_bus]
+        for i in range(len(dev_poller)):
+            data = results[i]
+            if FAILED_VALUE in data.values():
+                failed_polls += 1
+            json.dumps({
+                'protocol_type': 'I2C MODULAR',
+                'number_address': devices_list[i]["protocol_setting"]["address"],
+                'value': json.dumps(data)
+            })
+        cycle_times.append(time.time() - start)
+
+    stats = simulator.stats()
+    cycles = len(cycle_times)
+    print("modules: %d on %d buses, cycles: %d" % (args.modules, args.buses, cycles))
+    print("cycle time: mean %.1f ms, min %.1f ms, max %.1f ms" % (
+        1000 * sum(cycle_times) / cycles, 1000 * min(cycle_times), 1000 * max(cycle_times)))
+    for device_bus in sorted(bus_times, key=str):
+        print("  bus %s: %d modules, mean %.1f ms" % (
+            device_bus, len(buses[device_bus]), 1000 * bus_times[device_bus] / cycles))
+    print("bus transactions per cycle: %.1f (%.1f bytes, %.1f ms on the wire)" % (
+        stats["transactions"] / cycles, stats["bytes"] / cycles, 1000 * stats["bus_time"] / cycles))
+    print("bus errors: %d, failed polls: %d, collisions: %d" % (
+        stats["errors"], failed_polls, stats["collisions"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the MODULAR_I2C polling cycle on simulated I2C buses")
+    parser.add_argument("--modules", type=int, default=64)
+    parser.add_argument("--buses", type=int, default=4)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every bus call")
+    parser.add_argument("--byte-time", type=float, default=STANDARD_MODE_BYTE_TIME, help="seconds per byte on the wire")
+    parser.add_argument("--fault-rate", type=float, default=0, help="probability a bus call fails")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--serial", action="store_true", help="poll all buses one after another")
+    run(parser.parse_args())
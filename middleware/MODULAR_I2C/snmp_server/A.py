@@ -16,6 +16,20 @@ import paho.mqtt.client as mqtt
 
 FolderPath = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 
+# Sorted OID index shared with PROTOCOL_OUT/SNMP_SERVER (CONFIG_SYSTEM_DEVICE)
+sys.path.append(os.path.join(FolderPath, "..", "..", "CONFIG_SYSTEM_DEVICE"))
+from OidIndex import build_agent_index, install_sorted_root, CATEGORY_SETTING
+
+# OID category -> (modular type, pin OID map)
+MODULAR_CATEGORIES = {
+    6: ("analog_io", mod_analog_io),
+    7: ("optocoupler", mod_optocoupler),
+    8: ("gpio", mod_gpio),
+    9: ("drycontact", mod_drycontact),
+    10: ("relay", mod_relay),
+    11: ("relay_mini", mod_relay_mini),
+}
+
 MQTT_CONFIG = {}
 with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/mqtt_config.json') as json_data:
     MQTT_CONFIG = json.load(json_data)
@@ -89,17 +103,19 @@ while (True):
         MibScalar, MibScalarInstance = mibBuilder.importSymbols(
             'SNMPv2-SMI', 'MibScalar', 'MibScalarInstance'
         )
+        install_sorted_root(mibBuilder)
+
+        # OIDs compiled once per start; getValue/setValue resolve their OID here
+        oid_index = build_agent_index(sysOID, SNMPSetting_oids, MODULAR_CATEGORIES)
 
         class MyStaticMibScalarInstance(MibScalarInstance):
             def setValue(self, value, name, idx):
-                self._oid = list(self.name)[0:-1]
-                Category = self._oid[8]
-                self.SpecificOID = self._oid[9:]
+                entry = oid_index.resolve(self.name[:-1])
+                Category = entry.category
                    
                 #--------------------------------------------------- SNMP Setting -----------------------------------------------------
                 if Category == 5:
-                    self.varName = SNMPSetting_oids[str(self.SpecificOID)]
-                    print(str(self.SpecificOID))
+                    self.varName = entry.name
                     print(self.varName)
                     
                     if dataType[self.varName] == 'Float':
@@ -137,8 +153,8 @@ while (True):
 
                 #--------------------------------------------------- Analog Input Output -----------------------------------------------------
                 elif Category == 6:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -173,8 +189,8 @@ while (True):
 
                 #--------------------------------------------------- Modular Optocoupler ---------------------------------------------------
                 elif Category == 7:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -211,8 +227,8 @@ while (True):
 
                 #--------------------------------------------------- Modular GPIO ---------------------------------------------------
                 elif Category == 8:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -249,8 +265,8 @@ while (True):
 
                 #--------------------------------------------------- Modular Drycontact ---------------------------------------------------
                 elif Category == 9:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -287,8 +303,8 @@ while (True):
 
                 #--------------------------------------------------- Modular Relay ---------------------------------------------------
                 elif Category == 10:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -324,8 +340,8 @@ while (True):
                     return self.getSyntax().clone(int(value))
                  #--------------------------------------------------- Modular Relay Mini---------------------------------------------------
                 elif Category == 11:
-                    self.numberModular = self.SpecificOID[1] 
-                    self.numberPin = int(self.SpecificOID[2] / 10)
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     list_modular = []
                     with open(FolderPath.replace('/snmp_server', '') + '/JSON/Config/installed_devices.json') as json_data:
                         list_modular = json.load(json_data)
@@ -362,9 +378,8 @@ while (True):
                     
             def getValue(self, name, idx):
                 #print(self.name)
-                self._oid = list(self.name)[0:-1]
-                Category = self._oid[8]
-                self.SpecificOID = self._oid[9:]
+                entry = oid_index.resolve(self.name[:-1])
+                Category = entry.category
                 #--------------------------------------------------- SNMP Setting ---------------------------------------------------
                 if Category == 5:
                     #print("SNMP Setting")
@@ -377,15 +392,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = SNMPSetting_oids[str(self.SpecificOID)]
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
-                    #print(str(self.SpecificOID))
                     #print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(str(self.varVal))
                 #--------------------------------------------------- Modular Analaog Input Output ---------------------------------------------------
                 elif Category == 6:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular analog input ouput")
@@ -398,14 +412,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_analog_io['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
                 #--------------------------------------------------- Modular Optocoupler ---------------------------------------------------
                 elif Category == 7:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular Optocoupler")
@@ -418,14 +432,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_optocoupler['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
                 #--------------------------------------------------- Modular GPIO ---------------------------------------------------
                 elif Category == 8:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular GPIO")
@@ -438,14 +452,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_gpio['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
                 #--------------------------------------------------- Modular Drycontact ---------------------------------------------------
                 elif Category == 9:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular Drycontact")
@@ -458,14 +472,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_drycontact['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
                 #--------------------------------------------------- Modular Relay ---------------------------------------------------
                 elif Category == 10:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular Relay")
@@ -478,14 +492,14 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_relay['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
                 #--------------------------------------------------- Modular Relay Mini ---------------------------------------------------
                 elif Category == 11:
-                    self.numberModular = self.SpecificOID[1]
-                    self.numberPin = self.SpecificOID[2]
+                    self.numberModular = entry.number
+                    self.numberPin = entry.pin
                     #print(str(self.numberModular))
                     #print(str(self.numberPin))
                     #print("Modular Relay Mini")
@@ -498,7 +512,7 @@ while (True):
                         except:
                             self.Trial += 1
                             time.sleep(0.05)
-                    self.varName = mod_relay_mini['[' + str(self.numberPin) + ']']
+                    self.varName = entry.name
                     self.varVal = dat[self.varName]
                     print(self.varName, " : ", self.varVal)
                     return self.getSyntax().clone(int(self.varVal))
@@ -510,136 +524,14 @@ while (True):
                     print('requested: ' + self.varName)
                 """     
                 
-        ###############################  SNMP Setting  ###################################
-        pre = sysOID + (5,)
-
-        #IP Address
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(10,),pre+(10,))
-        exec(command)
-
-        #Netmask
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(20,),pre+(20,))
-        exec(command)
-
-        #Gateway
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(30,),pre+(30,))
-        exec(command)
-
-        #SNMP Version
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(40,),pre+(40,))
-        exec(command)
-
-        #SNMP Community
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(50,),pre+(50,))
-        exec(command)
-
-        #SNMP Port
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(60,),pre+(60,))
-        exec(command)
-
-        #System OID
-        command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(70,),pre+(70,))
-        exec(command)
-
-        ######################  MODULAR ANALOG INPUT OUTPUT  ###############################
-
-        for numberModular in range(1,3):
-            for number_pin in range(1,9):
-                pre = sysOID + (6,2, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
-
-        ######################  MODULAR OPTOCPUPLER  ###############################
-
-        for numberModular in range(1,9):
-            for number_pin in range(1,15):
-                pre = sysOID + (7,8, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
-
-        ######################  MODULAR GPIO  ###############################
-
-        for numberModular in range(1,9):
-            for number_pin in range(1,15):
-                pre = sysOID + (8,8, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
-
-        ######################  MODULAR DRYCONTACT  ###############################
-
-        for numberModular in range(1,9):
-            for number_pin in range(1,15):
-                pre = sysOID + (9,8, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
-
-        ######################  MODULAR RELAY  ###############################
-
-        for numberModular in range(1,9):
-            for number_pin in range(1,9):
-                pre = sysOID + (10, 8, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
-
-        ######################  MODULAR RELAY MINI ###############################
-
-        for numberModular in range(1,9):
-            for number_pin in range(1,7):
-                pre = sysOID + (11, 8, numberModular ,number_pin * 10,)
-                command ="""
-mibBuilder.exportSymbols(
-  '__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-              MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                exec(command)
+        ###############################  Register OIDs  ###################################
+        # One scalar per indexed OID: settings are strings, modular pins integers
+        mib_objects = []
+        for oid, entry in oid_index.items():
+            syntax = v2c.OctetString if entry.category == CATEGORY_SETTING else v2c.Integer
+            mib_objects.append(MibScalar(oid, syntax()).setMaxAccess('readwrite'))
+            mib_objects.append(MyStaticMibScalarInstance(oid, (0,), syntax()))
+        mibBuilder.exportSymbols('__MY_MIB', *mib_objects)
 
         # --- end of Managed Object Instance initialization ----
 
@@ -9,6 +9,7 @@ import paho.mqtt.client as mqtt
 import getmac
 from time import strftime, localtime
 import socket
+from MODBUS_TCP_SERVER.register_map import RegisterMap
 
 ParentFolder = os.path.abspath('..')
 
@@ -34,6 +35,8 @@ print("MODBUS TCP: MODBUS TCP Port: " + str(modbus_tcp_port))
 
 # Create an instance of ModbusServer
 server = ModbusServer(modbus_tcp_ip, modbus_tcp_port, no_block=True)
+# Registers are kept in memory and fed straight from device messages on MQTT
+register_map = RegisterMap(ParentFolder + '/PROTOCOL_OUT/Lib/modbus_list.json')
 Subsclient = mqtt.Client("modbus_tcp_server")
 MQTT_CONFIG = {}
 with open(ParentFolder + '/PROTOCOL_OUT/JSON/Config/mqtt_config.json') as json_data:
@@ -60,262 +63,176 @@ list_equipment = []
 with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/installed_devices.json') as json_data:
     list_equipment = json.load(json_data)
 
+list_device_equipment = {}
+with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/Library/devices.json') as json_data:
+    list_device_equipment = json.load(json_data)
+
+MQTT_CONFIG_Modular = {}
+with open(ParentFolder + '/MODULAR_I2C/JSON/Config/mqtt_config.json') as json_data:
+    MQTT_CONFIG_Modular = json.load(json_data)
+
+MQTT_CONFIG_Equipment_ModbusRTU = {}
+with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/mqtt_config.json') as json_data:
+    MQTT_CONFIG_Equipment_ModbusRTU = json.load(json_data)
+
+#---------------------------------- Write lookup (built once) ----------------------------------------
+# (type, number) from the device topic -> settings needed to forward a client write
+modular_targets = {}
+for device in list_modular:
+    topic_parts = device["profile"]["topic"].split("/")
+    modular_targets[(topic_parts[2], topic_parts[3])] = {
+        "device": device["profile"]["part_number"],
+        "address": device["protocol_setting"]["address"],
+        "device_bus": device["protocol_setting"]["device_bus"]
+    }
+
+equipment_targets = {}
+for device in list_equipment:
+    topic_parts = device["profile"]["topic"].split("/")
+    protocol_setting = device["protocol_setting"]
+    registers = {}
+    for item in list_device_equipment.get(device["profile"]["device_type"], []):
+        if item["part_number"] == device["profile"]["part_number"]:
+            for data_item in item["data"]:
+                registers[data_item["var_name"]] = (data_item["relative_address"], data_item["data_type"])
+    equipment_targets[(topic_parts[2], topic_parts[3])] = {
+        "protocol_type": protocol_setting["protocol"],
+        "port": protocol_setting["port"],
+        "baudrate": protocol_setting["baudrate"],
+        "parity": protocol_setting["parity"],
+        "bytesize": protocol_setting["bytesize"],
+        "stop_bit": protocol_setting["stop_bit"],
+        "timeout": protocol_setting["timeout"],
+        "endianness": protocol_setting["endianness"],
+        "number_address": protocol_setting["address"],
+        "registers": registers
+    }
+
+def get_device_topics():
+    """Device topics to mirror into registers, from both installed device lists"""
+    topics = []
+    for device in list_modular:
+        topics.append(device["profile"]["topic"])
+    for device in list_equipment:
+        split_publish = device["profile"].get("split_publish", 0)
+        if split_publish > 0:
+            for j in range(split_publish):
+                topics.append(device["profile"]["topic"] + "/" + str(j+1))
+        else:
+            topics.append(device["profile"]["topic"])
+    return topics
+
+def on_connect_subscribe(client, userdata, flags, rc):
+    if rc == 0:
+        for topic in get_device_topics():
+            client.subscribe(topic)
+        print("MODBUS TCP: Subscribed to device topics")
+    else:
+        print("MODBUS TCP: Failed to connect broker mqtt (code " + str(rc) + ")")
+
+def process_data_subscribe(client, userdata, message):
+    try:
+        sub_data = json.loads(message.payload)
+        topic_parts = message.topic.split("/")
+        type_device = topic_parts[1]
+
+        if type_device == "Modular":
+            sub_data_value = json.loads(sub_data["value"])
+            device = "modular_" + topic_parts[2] + "_" + topic_parts[3]
+            register_map.update_modular(device, list(sub_data_value.values()))
+        elif type_device == "Smartrack":
+            register_map.update_equipment(topic_parts[2] + "_" + topic_parts[3], sub_data)
+        elif type_device == "2U":
+            register_map.update_equipment(topic_parts[2] + "_" + topic_parts[4], sub_data)
+    except Exception as e:
+        print("MODBUS TCP: failed to update registers from " + message.topic + ": " + str(e))
+
+def publish_modular_write(name, value):
+    # name is "modular_<type>_<number>_pin_<pin>", e.g. modular_relay_mini_1_pin_3
+    device_name, pin = name[len("modular_"):].rsplit("_pin_", 1)
+    type_modular, number_modular = device_name.rsplit("_", 1)
+    target = modular_targets.get((type_modular, number_modular))
+    if target is None:
+        print("MODBUS TCP: your modular not configure")
+        return
+
+    send_msg = {
+            "mac":getmac.get_mac_address(),
+            "protocol_type":"Modular",
+            "device": target["device"],
+            "function": "write",
+            "value": {"pin": int(pin),"data": value},
+            "address": target["address"],
+            "device_bus": target["device_bus"],
+            "Timestamp": strftime("%Y-%m-%d %H:%M:%S", localtime())
+            }
+    print("MODBUS TCP: " + json.dumps(send_msg))
+    Pubsclient.publish(MQTT_CONFIG_Modular["sub_topic_modular"], payload=json.dumps(send_msg))
+
+def publish_equipment_write(name, value):
+    # name is "<var_name>-<type>_<number>", e.g. "Relay 1-SPM206_1"
+    data_name_equipment, device_name = name.rsplit("-", 1)
+    type_equipment, number_equipment = device_name.rsplit("_", 1)
+    target = equipment_targets.get((type_equipment, number_equipment))
+    if target is None:
+        print("MODBUS TCP: your equipment not configure")
+        return
+
+    fix_register, fix_data_type = target["registers"].get(data_name_equipment, (0, ""))
+    send_msg = {
+                "mac":getmac.get_mac_address(),
+                "protocol_type": target["protocol_type"],
+                "port": target["port"],
+                "baudrate": target["baudrate"],
+                "parity": target["parity"],
+                "bytesize": target["bytesize"],
+                "stop_bit": target["stop_bit"],
+                "timeout": target["timeout"],
+                "endianness" : target["endianness"],
+                "number_address": target["number_address"],
+                "value":{"address": fix_register,"value": value},
+                "data_type": fix_data_type,
+                "Timestamp": strftime("%Y-%m-%d %H:%M:%S", localtime())
+                }
+    print("MODBUS TCP: " + json.dumps(send_msg))
+    Pubsclient.publish(MQTT_CONFIG_Equipment_ModbusRTU["sub_topic_modbusRTU"], payload=json.dumps(send_msg))
+
 def modbus_tcp_server_main():
     try:
         #---------------------------------- Start Server Modbus TCP ----------------------------------
         print("MODBUS TCP: Start server...")
+        register_map.install_write_hook()
         server.start()
         print("MODBUS TCP: Server is online")
 
-        #---------------------------------- List Modular in JSON  ----------------------------------------
-        all_data = []
-        modbus_list = {}
-        last_count = 0
-
-        lst_file_json = []
-        lst_file_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Modular/') # your directory path
-        for i in range(len(lst_file_json_raw)):
-            if lst_file_json_raw[i].endswith(".json"):
-                lst_file_json.append(lst_file_json_raw[i])
-        lst_file_json.sort()
-
-        #---------------------------------- List Equipment in JSON  ----------------------------------------
-        lst_file_equipment_json = []
-        lst_file_equipment_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Equipment/') # your directory path
-        for i in range(len(lst_file_equipment_json_raw)):
-            if lst_file_equipment_json_raw[i].endswith(".json"):
-                lst_file_equipment_json.append(lst_file_equipment_json_raw[i])
-        lst_file_equipment_json.sort()
-
-
-        #---------------------------------- Create Modbus List in JSON ------------------------------------
-        for i in range(len(lst_file_json)):
-            with open(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Modular/' + lst_file_json[i]) as json_data:
-                data_modular = json.load(json_data)
-                for j in range(len(data_modular)):
-                    address = last_count + 1
-                    keyvalue = lst_file_json[i].replace(".json", "") +  "_pin_" + str(j+1)
-                    modbus_list.update({address: keyvalue})
-                    last_count = address
-            all_data.extend(data_modular)
-        
-        last_count = 1000
-        for i in range(len(lst_file_equipment_json)):
-            with open(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Equipment/' + lst_file_equipment_json[i]) as json_data:
-                data_equipment = json.load(json_data)
-                try:
-                    del data_equipment["PollingDuration"]
-                    del data_equipment["Timestamp"]
-                except Exception as e:
-                    #print("MODBUS TCP: problem in delete " + str(e))
-                    pass
-                keysList = list(data_equipment.keys())
-                for j in range(len(keysList)):
-                    address = last_count + 1
-                    modbus_list.update({address: keysList[j] + "-" + lst_file_equipment_json[i].replace(".json","")})
-                    last_count = address
-
-        #print(modbus_list)
-    
-        with open(os.getcwd() + '/Lib/modbus_list.json' , "w") as outfile:
-            outfile.write(json.dumps(modbus_list))
-        print("MODBUS TCP: Succes write modbus list")
+        #---------------------------------- Subscribe device data ----------------------------------------
+        Subsclient.on_connect = on_connect_subscribe
+        Subsclient.on_message = process_data_subscribe
+        Subsclient.connect(MQTT_CONFIG["broker_address"], MQTT_CONFIG["broker_port"])
+        Subsclient.loop_start()
+        Pubsclient.loop_start()
 
+        #---------------------------------- Forward client writes to MQTT ----------------------------------------
+        # Only 0/1 writes are forwarded (relay / coil style outputs)
         while True:
-            # Read data in JSON
-            all_data = []
-            all_data_equipment = []
-            last_count = 0
-            value_publish = []
-            data_publish = []
-            value_publish_equipment = []
-            data_publish_equipment = []
-
-            #---------------------------------- List Modular in JSON  ----------------------------------------
-            lst_file_json = []
-            lst_file_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Modular/') # your directory path
-            for i in range(len(lst_file_json_raw)):
-                if lst_file_json_raw[i].endswith(".json"):
-                    lst_file_json.append(lst_file_json_raw[i])
-            lst_file_json.sort()
-
-            #---------------------------------- List Equipment in JSON  ----------------------------------------
-            lst_file_equipment_json = []
-            lst_file_equipment_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Equipment/') # your directory path
-            for i in range(len(lst_file_equipment_json_raw)):
-                if lst_file_equipment_json_raw[i].endswith(".json"):
-                    lst_file_equipment_json.append(lst_file_equipment_json_raw[i])
-            lst_file_equipment_json.sort()
-
-            #---------------------------------- Read all data Modular in JSON  ----------------------------------------
-            for i in range(len(lst_file_json)):
-                with open(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Modular/' + lst_file_json[i]) as json_data:
-                    data_modular = json.load(json_data)
-                all_data.extend(data_modular)
-
-            #---------------------------------- Read all data Equipment in JSON  ----------------------------------------
-            for i in range(len(lst_file_equipment_json)):
-                with open(ParentFolder + '/PROTOCOL_OUT/MODBUS_TCP_SERVER/JSON/Data/Equipment/' + lst_file_equipment_json[i]) as json_data:
-                    data_equipment = json.load(json_data)
-                    try:
-                        del data_equipment["PollingDuration"]
-                        del data_equipment["Timestamp"]
-                    except Exception as e:
-                        #print("MODBUS TCP: problem in delete " + str(e))
-                        pass
-                all_data_equipment.extend(list(data_equipment.values()))
-
-            #---------------------------------- Store all data Modular to DataBank Modbus TCP  ----------------------------------------
-            for i in  range(len(all_data)):
-                DataBank.set_words(i, [all_data[i]])
-             #---------------------------------- Store all data Equipment to DataBank Modbus TCP  ----------------------------------------
-            for i in range(len(all_data_equipment)):
-                DataBank.set_words(1000 + i, [all_data_equipment[i]])
-
-            #---------------------------------- Get Data Write in Modbus TCP  ----------------------------------------    
-            for i in range(50):
-                data_databank = DataBank.get_words(0, len(all_data))
-                if all_data != data_databank:
+            name, value = register_map.write_events.get()
+            if value != 0 and value != 1:
+                continue
+            try:
+                if name.startswith("modular_"):
                     print("MODBUS TCP: modular get write data")
-                    for i in range(len(all_data)):
-                        if all_data[i] != data_databank[i]:
-                            #print(modbus_list[i+1])
-                            value_publish.append(data_databank[i])
-                            data_publish.append(modbus_list[i+1]) 
-                            #print(data_databank[i])
-                            #print(all_data[i])
-                            all_data[i] = data_databank[i]
-
-                data_databank_equipment = DataBank.get_words(1000, len(all_data_equipment))
-                if all_data_equipment != data_databank_equipment:
+                    publish_modular_write(name, value)
+                else:
+                    # to do: pastikan equipment modbus rtu
                     print("MODBUS TCP: equipment get write data")
-                    for i in range(len(all_data_equipment)):
-                        if all_data_equipment[i] != data_databank_equipment[i]:
-                            #print(i+1001)
-                            #print(all_data_equipment[i])
-                            #print(data_databank_equipment[i])
-                            value_publish_equipment.append(data_databank_equipment[i])
-                            data_publish_equipment.append(modbus_list[i+1001]) 
-                            all_data_equipment[i] = data_databank_equipment[i]
-                sleep(0.1)
-            
-            #---------------------------------- Publish write data Modular to MQTT  ----------------------------------------
-            for value, data in zip(value_publish, data_publish):
-                if value == 0 or value == 1:
-                    data_type_modular = data.split("_")[1]
-                    data_number_modular = data.split("_")[2]
-                    data_pin_modular = data.split("_")[4]
-                    if data_number_modular == "mini":
-                        data_type_modular = "relay_mini"
-                        data_number_modular = data.split("_")[3]
-                        data_pin_modular = data.split("_")[5]
-                        data
-        
-                    with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
-                        list_modular = json.load(json_data)
-                    for i in range(len(list_modular)):
-                        topic_pub = list_modular[i]["profile"]["topic"]
-                        type_modular = topic_pub.split("/")[2]
-                        number_modular = topic_pub.split("/")[3]
-                        if data_type_modular == type_modular and data_number_modular == number_modular:
-                            fix_device = list_modular[i]["profile"]["part_number"]
-                            fix_address = list_modular[i]["protocol_setting"]["address"]
-                            fix_device_bus = list_modular[i]["protocol_setting"]["device_bus"]
-                    
-                            send_msg = {
-                                    "mac":getmac.get_mac_address(),
-                                    "protocol_type":"Modular",
-                                    "device": fix_device,
-                                    "function": "write",
-                                    "value": {"pin": int(data_pin_modular),"data": value},
-                                    "address": fix_address,
-                                    "device_bus": fix_device_bus,
-                                    "Timestamp": strftime("%Y-%m-%d %H:%M:%S", localtime())
-                                    }
-                            print("MODBUS TCP: " + json.dumps(send_msg))
-
-                            MQTT_CONFIG_Modular = []
-                            with open(ParentFolder + '/MODULAR_I2C/JSON/Config/mqtt_config.json') as json_data:
-                                MQTT_CONFIG_Modular = json.load(json_data)
-                            topic_pub_write = MQTT_CONFIG_Modular["sub_topic_modular"]
-                            Pubsclient.publish(topic_pub_write, payload=json.dumps(send_msg))
-                        else:
-                            print("MODBUS TCP: your modular not configure")
-
-            #---------------------------------- Publish write data Equipment to MQTT  ----------------------------------------
-            # to do: pastikan equipment modbus rtu
-            for value, data in zip(value_publish_equipment, data_publish_equipment):
-                if value == 0 or value == 1:
-                    data_type_equipment_raw = data.split("-")[1]
-                    data_name_equipment = data.split("-")[0]
-                    data_type_equipment_number = data_type_equipment_raw.split("_")[-1:][0]
-                    data_type_equipment = data_type_equipment_raw.replace("_" + data_type_equipment_number, "")
-                    
-                    list_equipment = []
-                    with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/installed_devices.json') as json_data:
-                        list_equipment = json.load(json_data)
-                    list_device_equipment = []
-                    with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/Library/devices.json') as json_data:
-                        list_device_equipment = json.load(json_data)
-
-                    for i in range(len(list_equipment)):
-                        topic_pub = list_equipment[i]["profile"]["topic"]
-                        type_equipment= topic_pub.split("/")[2]
-                        number_type_equipment = topic_pub.split("/")[3]
-                        if data_type_equipment == type_equipment and data_type_equipment_number == number_type_equipment:
-                            fix_device_type = list_equipment[i]["profile"]["device_type"]
-                            fix_device = list_equipment[i]["profile"]["part_number"]
-                            fix_address = list_equipment[i]["protocol_setting"]["address"]
-                            fix_protocol = list_equipment[i]["protocol_setting"]["protocol"]
-                            fix_port = list_equipment[i]["protocol_setting"]["port"]
-                            fix_baudrate = list_equipment[i]["protocol_setting"]["baudrate"]
-                            fix_parity = list_equipment[i]["protocol_setting"]["parity"]
-                            fix_bytesize = list_equipment[i]["protocol_setting"]["bytesize"]
-                            fix_stop_bit = list_equipment[i]["protocol_setting"]["stop_bit"]
-                            fix_timeout = list_equipment[i]["protocol_setting"]["timeout"]
-                            fix_endianness = list_equipment[i]["protocol_setting"]["endianness"]
-                            
-                            fix_register = 0
-                            fix_data_type = ""
-                            for item in list_device_equipment[fix_device_type]:
-                                if item["part_number"] == fix_device:
-                                    for data_item in item["data"]:
-                                        if data_item["var_name"] == data_name_equipment:
-                                            fix_register = data_item["relative_address"]
-                                            fix_data_type = data_item["data_type"]
-
-                            send_msg = {
-                                        "mac":getmac.get_mac_address(),
-                                        "protocol_type": fix_protocol,
-                                        "port": fix_port,
-                                        "baudrate": fix_baudrate,
-                                        "parity": fix_parity,
-                                        "bytesize": fix_bytesize,
-                                        "stop_bit": fix_stop_bit,
-                                        "timeout": fix_timeout,
-                                        "endianness" : fix_endianness,
-                                        "number_address":fix_address,
-                                        "value":{"address": fix_register,"value": value},
-                                        "data_type": fix_data_type,
-                                        "Timestamp": strftime("%Y-%m-%d %H:%M:%S", localtime())
-                                        }
-
-                            MQTT_CONFIG_Equipment_ModbusRTU = []
-                            with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/mqtt_config.json') as json_data:
-                                MQTT_CONFIG_Equipment_ModbusRTU = json.load(json_data)
-
-                            topic_pub_write = MQTT_CONFIG_Equipment_ModbusRTU["sub_topic_modbusRTU"]
-                            print(topic_pub_write)
-                            print(send_msg)
-                            Pubsclient.publish(topic_pub_write, payload=json.dumps(send_msg))
-                        else:
-                            print("MODBUS TCP: your equipment not configure")
-
-
+                    publish_equipment_write(name, value)
+            except Exception as e:
+                print("MODBUS TCP: failed to forward write on " + name + ": " + str(e))
 
     except Exception as e:
         print("MODBUS TCP: error " + str(e))
         print("MODBUS TCP: Shutdown server ...")
+        Subsclient.loop_stop()
+        Pubsclient.loop_stop()
         server.stop()
         print("MODBUS TCP: Server is offline")
-
@@ -0,0 +1,156 @@
+#!/bin/python
+"""
+Modbus TCP register map
+Holds the server's holding registers in memory and updates the DataBank
+straight from MQTT device messages. Register addresses are allocated once
+per value name and persisted in Lib/modbus_list.json (the list users
+download), so devices keep their registers across restarts and new devices
+or values are appended instead of shifting everything after them.
+
+Client writes are reported through a hook on DataBank.set_words, which the
+pyModbusTCP request handler calls for every write request; the map's own
+updates go through the original method and do not raise write events.
+"""
+
+import json
+import os
+import queue
+import threading
+from pyModbusTCP.server import DataBank
+
+MODULAR_BASE = 0        # registers 0..999 hold modular pins
+EQUIPMENT_BASE = 1000   # registers 1000.. hold equipment values
+REGISTER_LIMIT = 65536
+IGNORED_KEYS = ("PollingDuration", "Timestamp")
+
+# Unhooked DataBank write used for values coming from devices
+_bank_set_words = DataBank.set_words
+
+
+def encode_word(value):
+    """Convert a device value to an unsigned 16-bit register word"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return 0
+    if isinstance(value, float):
+        value = int(round(value))
+    if not isinstance(value, int):
+        return 0
+    return value & 0xFFFF
+
+
+def contiguous_runs(registers, words):
+    """Group (register, word) pairs into (start, [words]) runs of consecutive registers"""
+    runs = []
+    for register, word in sorted(zip(registers, words)):
+        if runs and runs[-1][0] + len(runs[-1][1]) == register:
+            runs[-1][1].append(word)
+        else:
+            runs.append((register, [word]))
+    return runs
+
+
+class RegisterMap(object):
+    def __init__(self, list_path):
+        self.list_path = list_path
+        self.lock = threading.Lock()
+        self.names = {}      # register -> value name
+        self.registers = {}  # value name -> register
+        self.words = {}      # register -> last word in the DataBank, written by us or a client
+        self.write_events = queue.Queue()  # (name, word) for each register a client changed
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.list_path) as json_data:
+                modbus_list = json.load(json_data)
+        except (IOError, ValueError):
+            modbus_list = {}
+
+        # modbus_list.json is keyed by 1-based Modbus address
+        for address, name in modbus_list.items():
+            register = int(address) - 1
+            self.names[register] = name
+            self.registers[name] = register
+            self.words[register] = 0
+        print("MODBUS TCP: Loaded register map with " + str(len(self.names)) + " registers")
+
+    def _save(self):
+        modbus_list = {register + 1: name for register, name in sorted(self.names.items())}
+        temp_path = self.list_path + ".tmp"
+        with open(temp_path, "w") as outfile:
+            outfile.write(json.dumps(modbus_list))
+        os.replace(temp_path, self.list_path)
+        print("MODBUS TCP: Succes write modbus list")
+
+    def _allocate(self, names, base, limit):
+        """Give unallocated names consecutive registers after the last one in [base, limit)"""
+        missing = [name for name in names if name not in self.registers]
+        if not missing:
+            return False
+
+        used = [register for register in self.names if base <= register < limit]
+        register = max(used) + 1 if used else base
+        if register + len(missing) > limit:
+            print("MODBUS TCP: register range " + str(base) + "-" + str(limit - 1) + " is full")
+            missing = missing[:max(0, limit - register)]
+
+        for name in missing:
+            self.names[register] = name
+            self.registers[name] = register
+            self.words[register] = 0
+            register += 1
+        return bool(missing)
+
+    def _update(self, names, values, base, limit):
+        with self.lock:
+            if self._allocate(names, base, limit):
+                self._save()
+
+            registers = []
+            words = []
+            for name, value in zip(names, values):
+                register = self.registers.get(name)
+                if register is None:
+                    continue
+                word = encode_word(value)
+                self.words[register] = word
+                registers.append(register)
+                words.append(word)
+
+            for start, run in contiguous_runs(registers, words):
+                _bank_set_words(start, run)
+
+    def update_modular(self, device, values):
+        """Store a modular device's pin values, e.g. device 'modular_relay_1'"""
+        names = [device + "_pin_" + str(i + 1) for i in range(len(values))]
+        self._update(names, values, MODULAR_BASE, EQUIPMENT_BASE)
+
+    def update_equipment(self, device, data):
+        """Store an equipment message's values, e.g. device 'SPM206_1'"""
+        items = [(key, value) for key, value in data.items() if key not in IGNORED_KEYS]
+        names = [key + "-" + device for key, value in items]
+        self._update(names, [value for key, value in items], EQUIPMENT_BASE, REGISTER_LIMIT)
+
+    def install_write_hook(self):
+        """Route client writes through _on_client_write; call once before the server starts"""
+        def set_words(cls, address, word_list):
+            result = _bank_set_words(address, word_list)
+            if result:
+                self._on_client_write(address, [int(w) & 0xffff for w in word_list])
+            return result
+        DataBank.set_words = classmethod(set_words)
+
+    def _on_client_write(self, address, words):
+        with self.lock:
+            for offset, word in enumerate(words):
+                register = address + offset
+                name = self.names.get(register)
+                if name is None or word == self.words[register]:
+                    continue
+                self.words[register] = word
+                self.write_events.put((name, word))
@@ -5,11 +5,13 @@ from pysnmp.entity import engine, config
 from pysnmp.entity.rfc3413 import cmdrsp, context
 from pysnmp.carrier.asynsock.dgram import udp
 from pysnmp.proto.api import v2c
+from pysnmp.smi import error
 import random, traceback
 from SNMP_SERVER.RegOID import *
 #from GSPE_DCB105ZK import *
 import time, os, inspect, json
 from SNMP_SERVER.DataType import dataType
+from SNMP_SERVER.mib_cache import MibCache
 import getmac
 from time import strftime, localtime
 import paho.mqtt.client as mqtt
@@ -17,6 +19,10 @@ import paho.mqtt.client as mqtt
 ParentFolder = os.path.abspath('..')
 FolderPath = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 
+# Sorted OID index shared with MODULAR_I2C/snmp_server (CONFIG_SYSTEM_DEVICE)
+sys.path.append(os.path.join(FolderPath, "..", "..", "CONFIG_SYSTEM_DEVICE"))
+from OidIndex import build_agent_index, install_sorted_root, CATEGORY_SETTING
+
 MQTT_CONFIG = {}
 with open(ParentFolder + '/PROTOCOL_OUT/JSON/Config/mqtt_config.json') as json_data:
     MQTT_CONFIG = json.load(json_data)
@@ -34,20 +40,61 @@ password = MQTT_CONFIG['password']
 Pubsclient = mqtt.Client()
 Pubsclient.connect(MQTT_CONFIG["broker_address"], MQTT_CONFIG["broker_port"])
 
+# OID category -> (modular type, pin OID map)
+MODULAR_CATEGORIES = {
+    6: ("analog_io", mod_analog_io),
+    7: ("optocoupler", mod_optocoupler),
+    8: ("gpio", mod_gpio),
+    9: ("drycontact", mod_drycontact),
+    10: ("relay", mod_relay),
+    11: ("relay_mini", mod_relay_mini),
+}
+
+# Values served by the agent, kept in memory and fed from device messages on MQTT
+mib_cache = MibCache(FolderPath + '/json')
+Subsclient = mqtt.Client("snmp_server")
+
+def get_device_topics():
+    """Device topics to mirror into the MIB cache, from both installed device lists"""
+    topics = []
+    with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
+        for device in json.load(json_data):
+            topics.append(device["profile"]["topic"])
+    with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/installed_devices.json') as json_data:
+        for device in json.load(json_data):
+            split_publish = device["profile"].get("split_publish", 0)
+            if split_publish > 0:
+                for j in range(split_publish):
+                    topics.append(device["profile"]["topic"] + "/" + str(j+1))
+            else:
+                topics.append(device["profile"]["topic"])
+    return topics
+
+def on_connect_subscribe(client, userdata, flags, rc):
+    if rc == 0:
+        for topic in get_device_topics():
+            client.subscribe(topic)
+        print("SNMP: Subscribed to device topics")
+    else:
+        print("SNMP: Failed to connect broker mqtt (code " + str(rc) + ")")
+
+def process_data_subscribe(client, userdata, message):
+    try:
+        mib_cache.update_from_message(message.topic, message.payload)
+    except Exception as e:
+        print("SNMP: failed to update MIB cache from " + message.topic + ": " + str(e))
+
 
 def snmp_server_main():
+    Subsclient.on_connect = on_connect_subscribe
+    Subsclient.on_message = process_data_subscribe
+    Subsclient.connect(MQTT_CONFIG["broker_address"], MQTT_CONFIG["broker_port"])
+    Subsclient.loop_start()
+    mib_cache.start_persisting()
+
     while (True):
         try:
-            Trial = 0
-            while(Trial <= 150):
-                try:
-                    with open(FolderPath + '/json/Comm.json') as json_data:
-                        Comm = json.load(json_data)
-                    break
-                except:
-                    Trial += 1
-                    time.sleep(0.05)
-                    
+            Comm = mib_cache.snapshot["comm"]
 
             sysOID = Comm['sysOID'].split('.')[1:]
             sysOID = list(map(int,sysOID))
@@ -99,17 +146,23 @@ def snmp_server_main():
             MibScalar, MibScalarInstance = mibBuilder.importSymbols(
                 'SNMPv2-SMI', 'MibScalar', 'MibScalarInstance'
             )
+            install_sorted_root(mibBuilder)
+
+            # OIDs compiled once per start; getValue/setValue resolve their OID here
+            snapshot = mib_cache.snapshot
+            oid_index = build_agent_index(
+                sysOID, SNMPSetting_oids, MODULAR_CATEGORIES,
+                [(name, snapshot["equipment"][name][0]) for name in snapshot["equipment_order"]]
+            )
 
             class MyStaticMibScalarInstance(MibScalarInstance):
                 def setValue(self, value, name, idx):
-                    self._oid = list(self.name)[0:-1]
-                    Category = self._oid[8]
-                    self.SpecificOID = self._oid[9:]
+                    entry = oid_index.resolve(self.name[:-1])
+                    Category = entry.category
                     
                     #--------------------------------------------------- SNMP Setting -----------------------------------------------------
                     if Category == 5:
-                        self.varName = SNMPSetting_oids[str(self.SpecificOID)]
-                        print("SNMP: " + str(self.SpecificOID))
+                        self.varName = entry.name
                         print("SNMP: " + self.varName)
                         
                         if dataType[self.varName] == 'Float':
@@ -121,34 +174,14 @@ def snmp_server_main():
                         elif dataType[self.varName] == 'String':
                             value = str(value)
 
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Comm.json') as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        dat[self.varName] = value
-                        
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Comm.json', 'w') as file:
-                                    file.write(json.dumps(dat))
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                                
+                        mib_cache.update_comm(self.varName, value)
                         print('SNMP: changed: ' + self.varName)
                         return self.getSyntax().clone(str(value))
 
                     #--------------------------------------------------- Analog Input Output -----------------------------------------------------
                     elif Category == 6:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -183,8 +216,8 @@ def snmp_server_main():
 
                     #--------------------------------------------------- Modular Optocoupler ---------------------------------------------------
                     elif Category == 7:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -221,8 +254,8 @@ def snmp_server_main():
 
                     #--------------------------------------------------- Modular GPIO ---------------------------------------------------
                     elif Category == 8:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -259,8 +292,8 @@ def snmp_server_main():
 
                     #--------------------------------------------------- Modular Drycontact ---------------------------------------------------
                     elif Category == 9:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -297,8 +330,8 @@ def snmp_server_main():
 
                     #--------------------------------------------------- Modular Relay ---------------------------------------------------
                     elif Category == 10:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -334,8 +367,8 @@ def snmp_server_main():
                         return self.getSyntax().clone(int(value))
                     #--------------------------------------------------- Modular Relay Mini---------------------------------------------------
                     elif Category == 11:
-                        self.numberModular = self.SpecificOID[1] 
-                        self.numberPin = int(self.SpecificOID[2] / 10)
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
                         list_modular = []
                         with open(ParentFolder + '/MODULAR_I2C/JSON/Config/installed_devices.json') as json_data:
                             list_modular = json.load(json_data)
@@ -371,36 +404,20 @@ def snmp_server_main():
                         return self.getSyntax().clone(int(value))
                     #--------------------------------------------------- Equipment Modbus RTU ---------------------------------------------------               
                     elif Category == 12:
-                        self.number_equipment = self.SpecificOID[0]
-                        self.number_data_equipment = self.SpecificOID[1]
-
-                        lst_file_equipment_json = []
-                        lst_file_equipment_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/') # your directory path
-                        for i in range(len(lst_file_equipment_json_raw)):
-                            if lst_file_equipment_json_raw[i].endswith(".json"):
-                                lst_file_equipment_json.append(lst_file_equipment_json_raw[i])
-                        lst_file_equipment_json.sort()
-
-                        for i in range(len(lst_file_equipment_json)):
-                            with open(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/' + lst_file_equipment_json[i]) as json_data:
-                                data_equipment = json.load(json_data)
-                                try:
-                                    del data_equipment["PollingDuration"]
-                                    del data_equipment["Timestamp"]
-                                except Exception as e:
-                                    #print("SNMP: problem in delete " + str(e))
-                                    pass
-                                list_data_equipment = []
-                                for item_data_equipment in data_equipment:
-                                    list_data_equipment.append(item_data_equipment)
-
-                                for j in range(len(data_equipment)):
-                                    if (i + 1) == self.number_equipment and (j + 1) == self.number_data_equipment:
-                                        self.varVal = data_equipment[list_data_equipment[j]]
-                                        data_type_equipment_raw = lst_file_equipment_json[i].replace(".json","")
-                                        data_type_equipment_number = data_type_equipment_raw.split("_")[-1:][0]
-                                        data_type_equipment = data_type_equipment_raw.replace("_" + data_type_equipment_number, "")
-                                        print("SNMP: Write " + list_data_equipment[j], " : ", str(value))
+                        self.number_equipment = entry.number
+                        self.number_data_equipment = entry.pin
+
+                        snapshot = mib_cache.snapshot
+                        lst_equipment = snapshot["equipment_order"]
+                        for i in range(len(lst_equipment)):
+                            list_data_equipment, values_equipment = snapshot["equipment"][lst_equipment[i]]
+                            for j in range(len(list_data_equipment)):
+                                if (i + 1) == self.number_equipment and (j + 1) == self.number_data_equipment:
+                                    self.varVal = values_equipment[j]
+                                    data_type_equipment_raw = lst_equipment[i]
+                                    data_type_equipment_number = data_type_equipment_raw.split("_")[-1:][0]
+                                    data_type_equipment = data_type_equipment_raw.replace("_" + data_type_equipment_number, "")
+                                    print("SNMP: Write " + list_data_equipment[j], " : ", str(value))
 
                         list_equipment = []
                         with open(ParentFolder + '/MODBUS_SNMP/JSON/Config/installed_devices.json') as json_data:
@@ -466,359 +483,77 @@ def snmp_server_main():
                         return self.getSyntax().clone(int(1))
 
                 def getValue(self, name, idx):
-                    #print(self.name)
-                    self._oid = list(self.name)[0:-1]
-                    Category = self._oid[8]
-                    self.SpecificOID = self._oid[9:]
+                    # Served from the in-memory snapshot: no file access on the GET path
+                    entry = oid_index.resolve(self.name[:-1])
+                    Category = entry.category
+                    snapshot = mib_cache.snapshot
+
                     #--------------------------------------------------- SNMP Setting ---------------------------------------------------
                     if Category == 5:
-                        #print("SNMP Setting")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Comm.json') as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = SNMPSetting_oids[str(self.SpecificOID)]
-                        self.varVal = dat[self.varName]
-                        #print(str(self.SpecificOID))
-                        #print(self.varName, " : ", self.varVal)
+                        self.varName = entry.name
+                        self.varVal = snapshot["comm"].get(self.varName)
+                        if self.varVal is None:
+                            raise error.NoSuchInstanceError(name=name, idx=idx)
                         return self.getSyntax().clone(str(self.varVal))
-                    #--------------------------------------------------- Modular Analaog Input Output ---------------------------------------------------
-                    elif Category == 6:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular analog input ouput")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/analog_io/modular_analog_io_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_analog_io['[' + str(self.numberPin) + ']']
-                        self.varVal = dat[self.varName]
-                        print("SNMP: " + self.varName, " : ", self.varVal)
-                        return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Modular Optocoupler ---------------------------------------------------
-                    elif Category == 7:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular Optocoupler")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/optocoupler/modular_optocoupler_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_optocoupler['[' + str(self.numberPin) + ']']
-                        self.varVal = dat[self.varName]
-                        print("SNMP: " + self.varName, " : ", self.varVal)
-                        return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Modular GPIO ---------------------------------------------------
-                    elif Category == 8:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular GPIO")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/gpio/modular_gpio_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_gpio['[' + str(self.numberPin) + ']']
-                        self.varVal = dat[self.varName]
-                        print("SNMP: " +self.varName, " : ", self.varVal)
-                        return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Modular Drycontact ---------------------------------------------------
-                    elif Category == 9:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular Drycontact")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/drycontact/modular_drycontact_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_drycontact['[' + str(self.numberPin) + ']']
-                        self.varVal = dat[self.varName]
-                        print("SNMP: " + self.varName, " : ", self.varVal)
-                        return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Modular Relay ---------------------------------------------------
-                    elif Category == 10:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular Relay")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/relay/modular_relay_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_relay['[' + str(self.numberPin) + ']']
-                        self.varVal = dat[self.varName]
-                        print("SNMP: " + self.varName, " : ", self.varVal)
-                        return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Modular Relay Mini ---------------------------------------------------
-                    elif Category == 11:
-                        self.numberModular = self.SpecificOID[1]
-                        self.numberPin = self.SpecificOID[2]
-                        #print(str(self.numberModular))
-                        #print(str(self.numberPin))
-                        #print("Modular Relay Mini")
-                        self.Trial = 0
-                        while(self.Trial <= 150):
-                            try:
-                                with open(FolderPath + '/json/Modular/relay_mini/modular_relay_mini_%d.json' %self.numberModular) as json_data:
-                                    dat = json.load(json_data)
-                                break
-                            except:
-                                self.Trial += 1
-                                time.sleep(0.05)
-                        self.varName = mod_relay_mini['[' + str(self.numberPin) + ']']
+
+                    #--------------------------------------------------- Modular ---------------------------------------------------
+                    elif Category in MODULAR_CATEGORIES:
+                        type_modular = MODULAR_CATEGORIES[Category][0]
+                        self.numberModular = entry.number
+                        self.numberPin = entry.pin
+                        dat = snapshot["modular"].get((type_modular, self.numberModular))
+                        self.varName = entry.name
+                        if dat is None or self.varName not in dat:
+                            raise error.NoSuchInstanceError(name=name, idx=idx)
                         self.varVal = dat[self.varName]
                         print("SNMP: " + self.varName, " : ", self.varVal)
                         return self.getSyntax().clone(int(self.varVal))
-                    #--------------------------------------------------- Equipment Modbus RTU ---------------------------------------------------
-                    elif Category == 12:
-                        self.number_equipment = self.SpecificOID[0]
-                        self.number_data_equipment = self.SpecificOID[1]
-                        #---------------------------------- List Equipment in JSON  ----------------------------------------
-                        lst_file_equipment_json = []
-                        lst_file_equipment_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/') # your directory path
-                        for i in range(len(lst_file_equipment_json_raw)):
-                            if lst_file_equipment_json_raw[i].endswith(".json"):
-                                lst_file_equipment_json.append(lst_file_equipment_json_raw[i])
-                        lst_file_equipment_json.sort()
-                        
-  
-                        with open(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/' + lst_file_equipment_json[self.number_equipment]) as json_data:
-                            data_equipment = json.load(json_data)
-                            try:
-                                del data_equipment["PollingDuration"]
-                                del data_equipment["Timestamp"]
-                            except Exception as e:
-                                #print("SNMP: problem in delete " + str(e))
-                                pass
-                            list_data_equipment = []
-                            for item_data_equipment in data_equipment:
-                                list_data_equipment.append(item_data_equipment)
-                            for j in range(len(data_equipment)):
-                                if j == self.number_data_equipment-1:
-                                    self.varVal = data_equipment[list_data_equipment[j]]
-                                    print("SNMP: " + list_data_equipment[j], " : ", self.varVal)
-
 
+                    #--------------------------------------------------- Equipment ---------------------------------------------------
+                    elif Category == 12:
+                        self.number_equipment = entry.number
+                        self.number_data_equipment = entry.pin
+                        equipment_order = snapshot["equipment_order"]
+                        if self.number_equipment >= len(equipment_order):
+                            raise error.NoSuchInstanceError(name=name, idx=idx)
+                        keys, values = snapshot["equipment"][equipment_order[self.number_equipment]]
+                        if not 1 <= self.number_data_equipment <= len(values):
+                            raise error.NoSuchInstanceError(name=name, idx=idx)
+                        self.varVal = values[self.number_data_equipment - 1]
+                        print("SNMP: " + keys[self.number_data_equipment - 1], " : ", self.varVal)
                         return self.getSyntax().clone(int(self.varVal))
-                    """
-                    try:
-                        print('requested: ' + self.varName + ' in Group ' + str(self.group) + ' Module ' + str(self.mod))
-                    except:
-                        print('requested: ' + self.varName)
-                    """     
                     
-            ###############################  SNMP Setting  ###################################
-            pre = sysOID + (5,)
-
-            #IP Address
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(10,),pre+(10,))
-            exec(command)
-
-            #Netmask
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(20,),pre+(20,))
-            exec(command)
-
-            #Gateway
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(30,),pre+(30,))
-            exec(command)
-
-            #SNMP Version
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(40,),pre+(40,))
-            exec(command)
-
-            #SNMP Community
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(50,),pre+(50,))
-            exec(command)
-
-            #SNMP Port
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(60,),pre+(60,))
-            exec(command)
-
-            #System OID
-            command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.OctetString()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.OctetString())
-)""" %(pre+(70,),pre+(70,))
-            exec(command)
-
-            ######################  MODULAR ANALOG INPUT OUTPUT  ###############################
-
-            for numberModular in range(1,3):
-                for number_pin in range(1,9):
-                    pre = sysOID + (6,2, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
-
-            ######################  MODULAR OPTOCPUPLER  ###############################
-
-            for numberModular in range(1,9):
-                for number_pin in range(1,15):
-                    pre = sysOID + (7,8, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
-
-            ######################  MODULAR GPIO  ###############################
-
-            for numberModular in range(1,9):
-                for number_pin in range(1,15):
-                    pre = sysOID + (8,8, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
-
-            ######################  MODULAR DRYCONTACT  ###############################
-
-            for numberModular in range(1,9):
-                for number_pin in range(1,15):
-                    pre = sysOID + (9,8, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
-
-            ######################  MODULAR RELAY  ###############################
-
-            for numberModular in range(1,9):
-                for number_pin in range(1,9):
-                    pre = sysOID + (10, 8, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
-
-            ######################  MODULAR RELAY MINI ###############################
-
-            for numberModular in range(1,9):
-                for number_pin in range(1,7):
-                    pre = sysOID + (11, 8, numberModular ,number_pin * 10,)
-                    command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                    exec(command)
+            ###############################  Register OIDs  ###################################
+            # One scalar per indexed OID: settings are strings, modular pins and equipment values integers
+            mib_objects = []
+            for oid, entry in oid_index.items():
+                syntax = v2c.OctetString if entry.category == CATEGORY_SETTING else v2c.Integer
+                mib_objects.append(MibScalar(oid, syntax()).setMaxAccess('readwrite'))
+                mib_objects.append(MyStaticMibScalarInstance(oid, (0,), syntax()))
+            mibBuilder.exportSymbols('__MY_MIB', *mib_objects)
 
             ######################  Equipment MODBUS RTU ###############################
             
-            #---------------------------------- List Equipment in JSON  ----------------------------------------
-            lst_file_equipment_json = []
-            lst_file_equipment_json_raw = os.listdir(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/') # your directory path
-            for i in range(len(lst_file_equipment_json_raw)):
-                if lst_file_equipment_json_raw[i].endswith(".json"):
-                    lst_file_equipment_json.append(lst_file_equipment_json_raw[i])
-            lst_file_equipment_json.sort()
+            #---------------------------------- List Equipment in MIB cache  ----------------------------------------
+            lst_equipment = snapshot["equipment_order"]
             
-            for i in range(len(lst_file_equipment_json)):
+            for i in range(len(lst_equipment)):
                 with open(ParentFolder + '/PROTOCOL_OUT/Lib/IOT_MODULAR_I2C.mib') as txt_file:
                     data_mib = txt_file.read()[:-3]
                 
                 list_data_mib_new = []
-                list_data_mib_new.append("---12.1 Equipment_" + lst_file_equipment_json[i].replace(".json","") + " --------------------------------------")
-                if i == len(lst_file_equipment_json)-1:
-                    list_data_mib_new.append("Equipment_"+ lst_file_equipment_json[i].replace(".json","") +" OBJECT IDENTIFIER ::= {Equipment "+ str(0)+"}")
+                list_data_mib_new.append("---12.1 Equipment_" + lst_equipment[i] + " --------------------------------------")
+                if i == len(lst_equipment)-1:
+                    list_data_mib_new.append("Equipment_"+ lst_equipment[i] +" OBJECT IDENTIFIER ::= {Equipment "+ str(0)+"}")
                 else:
-                    list_data_mib_new.append("Equipment_"+ lst_file_equipment_json[i].replace(".json","") +" OBJECT IDENTIFIER ::= {Equipment "+ str(i+1)+"}")
-
-                with open(ParentFolder + '/PROTOCOL_OUT/SNMP_SERVER/json/Equipment/' + lst_file_equipment_json[i]) as json_data:
-                    data_equipment = json.load(json_data)
-                    try:
-                        del data_equipment["PollingDuration"]
-                        del data_equipment["Timestamp"]
-                    except Exception as e:
-                        #print("SNMP: problem in delete " + str(e))
-                        pass
-                    list_data_equipment = []
-                    for item_data_equipment in data_equipment:
-                        list_data_equipment.append(item_data_equipment)
-                    #print(data_equipment)
-                    for j in range(len(data_equipment)):
-                        #i = i + 1
-                        #j = j + 1
-                        pre = sysOID + (12, i, j+1,)
-                        name_var_raw = list_data_equipment[j].replace(" ", "_")
-                        name_var = lst_file_equipment_json[i-1].replace(".json","") + "_" + name_var_raw
-                        parent_oid = "Equipment_"+ lst_file_equipment_json[i-1].replace(".json","")
-                        #print(name_var)
-                        #print(parent_oid)
-                        input_string = """
+                    list_data_mib_new.append("Equipment_"+ lst_equipment[i] +" OBJECT IDENTIFIER ::= {Equipment "+ str(i+1)+"}")
+
+                list_data_equipment = snapshot["equipment"][lst_equipment[i]][0]
+                for j in range(len(list_data_equipment)):
+                    name_var_raw = list_data_equipment[j].replace(" ", "_")
+                    name_var = lst_equipment[i-1] + "_" + name_var_raw
+                    parent_oid = "Equipment_"+ lst_equipment[i-1]
+                    input_string = """
 %s OBJECT-TYPE
     SYNTAX INT
     MAX-ACCESS read-write
@@ -826,21 +561,13 @@ mibBuilder.exportSymbols(
     ::= {%s %d}
 
 """ % (name_var, parent_oid, j+1 )
-                        list_data_mib_new.append(input_string)
-                        
-                        command ="""
-mibBuilder.exportSymbols(
-'__MY_MIB', MibScalar(%s, v2c.Integer()).setMaxAccess('readwrite'),
-            MyStaticMibScalarInstance(%s, (0,), v2c.Integer())
-)""" %(pre,pre)
-                        exec(command)
-                
-                    list_data_mib_new.append("END")
-                    string_data_mib_new = '\n'.join(list_data_mib_new)
-                    #print(string_data_mib_new)
-                    data_mib = data_mib + string_data_mib_new
-                    with open(ParentFolder + '/PROTOCOL_OUT/Lib/IOT_MODULAR_I2C.mib', 'w') as f2:
-                        f2.writelines(data_mib)
+                    list_data_mib_new.append(input_string)
+            
+                list_data_mib_new.append("END")
+                string_data_mib_new = '\n'.join(list_data_mib_new)
+                data_mib = data_mib + string_data_mib_new
+                with open(ParentFolder + '/PROTOCOL_OUT/Lib/IOT_MODULAR_I2C.mib', 'w') as f2:
+                    f2.writelines(data_mib)
 
             # --- end of Managed Object Instance initialization ----
 
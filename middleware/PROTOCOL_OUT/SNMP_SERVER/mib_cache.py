@@ -0,0 +1,182 @@
+#!/bin/python
+"""
+SNMP MIB value cache
+Holds the values served by the SNMP agent in memory, updated straight from
+MQTT device messages. Readers take the current snapshot (a plain dict that is
+never modified after it is published) and look values up without locks or
+file access; every update builds a new snapshot and swaps the reference.
+
+The json/ files are only a startup seed: changed entries are written back in
+the background every SNAPSHOT_PERSIST_INTERVAL so a restart starts from
+recent values and sees equipment added since the last start. Comm.json is
+also edited by the Settings service and is reloaded when it changes.
+"""
+
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_PERSIST_INTERVAL = 60  # seconds between writing changed entries back to json/
+COMM_CHECK_INTERVAL = 5         # seconds between checks for Comm.json edited by Settings
+IGNORED_KEYS = ("PollingDuration", "Timestamp")
+MODULAR_TYPES = ("analog_io", "optocoupler", "gpio", "drycontact", "relay", "relay_mini")
+
+
+def load_json(path):
+    try:
+        with open(path) as json_data:
+            return json.load(json_data)
+    except (IOError, ValueError) as e:
+        print("SNMP: failed to read " + path + ": " + str(e))
+        return None
+
+
+def write_json(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as outfile:
+        outfile.write(json.dumps(data))
+    os.replace(temp_path, path)
+
+
+class MibCache(object):
+    def __init__(self, json_folder):
+        self.json_folder = json_folder
+        self.lock = threading.Lock()  # serialises writers; readers only use self.snapshot
+        self._dirty = set()
+        self._persist_thread = None
+        self._comm_mtime = self._get_comm_mtime()
+        self.snapshot = self._load_seed()
+
+    # --- Paths ---
+    def comm_path(self):
+        return os.path.join(self.json_folder, "Comm.json")
+
+    def modular_path(self, type_modular, number_modular):
+        return os.path.join(self.json_folder, "Modular", type_modular,
+                            "modular_" + type_modular + "_" + str(number_modular) + ".json")
+
+    def equipment_path(self, name):
+        return os.path.join(self.json_folder, "Equipment", name + ".json")
+
+    def _get_comm_mtime(self):
+        try:
+            return os.stat(self.comm_path()).st_mtime_ns
+        except OSError:
+            return None
+
+    # --- Seed ---
+    def _load_seed(self):
+        snapshot = {"comm": load_json(self.comm_path()) or {}, "modular": {},
+                    "equipment": {}, "equipment_order": ()}
+
+        for type_modular in MODULAR_TYPES:
+            folder = os.path.join(self.json_folder, "Modular", type_modular)
+            if not os.path.isdir(folder):
+                continue
+            prefix = "modular_" + type_modular + "_"
+            for file_name in os.listdir(folder):
+                if file_name.startswith(prefix) and file_name.endswith(".json"):
+                    number = file_name[len(prefix):-len(".json")]
+                    data = load_json(os.path.join(folder, file_name))
+                    if number.isdigit() and isinstance(data, dict):
+                        snapshot["modular"][(type_modular, int(number))] = data
+
+        # Equipment OIDs are numbered by this sorted order at agent start
+        folder = os.path.join(self.json_folder, "Equipment")
+        names = sorted(f[:-len(".json")] for f in os.listdir(folder) if f.endswith(".json")) \
+            if os.path.isdir(folder) else []
+        for name in names:
+            data = load_json(self.equipment_path(name))
+            snapshot["equipment"][name] = self._equipment_entry(data if isinstance(data, dict) else {})
+        snapshot["equipment_order"] = tuple(names)
+        return snapshot
+
+    @staticmethod
+    def _equipment_entry(data):
+        """(keys, values) of an equipment message without the bookkeeping fields"""
+        items = [(key, value) for key, value in data.items() if key not in IGNORED_KEYS]
+        return tuple(key for key, value in items), tuple(value for key, value in items)
+
+    # --- Updates (copy, modify, swap) ---
+    def _swap(self, section, key, value, dirty_key):
+        with self.lock:
+            snapshot = dict(self.snapshot)
+            snapshot[section] = dict(snapshot[section])
+            snapshot[section][key] = value
+            if section == "equipment" and key not in snapshot["equipment_order"]:
+                snapshot["equipment_order"] = snapshot["equipment_order"] + (key,)
+            self.snapshot = snapshot
+            self._dirty.add(dirty_key)
+
+    def update_modular(self, type_modular, number_modular, data):
+        self._swap("modular", (type_modular, int(number_modular)), dict(data),
+                   ("modular", type_modular, int(number_modular)))
+
+    def update_equipment(self, name, data):
+        self._swap("equipment", name, self._equipment_entry(data), ("equipment", name))
+
+    def update_comm(self, key, value):
+        with self.lock:
+            snapshot = dict(self.snapshot)
+            snapshot["comm"] = dict(snapshot["comm"], **{key: value})
+            self.snapshot = snapshot
+            comm = snapshot["comm"]
+        # Settings are rare and must survive a restart, so write through
+        write_json(self.comm_path(), comm)
+        self._comm_mtime = self._get_comm_mtime()
+
+    def refresh_comm(self):
+        """Reload Comm.json if another service changed it"""
+        mtime = self._get_comm_mtime()
+        if mtime is None or mtime == self._comm_mtime:
+            return
+        comm = load_json(self.comm_path())
+        if isinstance(comm, dict):
+            with self.lock:
+                snapshot = dict(self.snapshot)
+                snapshot["comm"] = comm
+                self.snapshot = snapshot
+            self._comm_mtime = mtime
+
+    def update_from_message(self, topic, payload):
+        """Apply a device message using the same topic layout the publishers use"""
+        topic_parts = topic.split("/")
+        type_device = topic_parts[1]
+        sub_data = json.loads(payload)
+
+        if type_device == "Modular":
+            self.update_modular(topic_parts[2], topic_parts[3], json.loads(sub_data["value"]))
+        elif type_device == "Smartrack":
+            self.update_equipment(topic_parts[2] + "_" + topic_parts[3], sub_data)
+        elif type_device == "2U":
+            self.update_equipment(topic_parts[2] + "_" + topic_parts[4], sub_data)
+
+    # --- Background persistence ---
+    def persist(self):
+        with self.lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshot = self.snapshot
+        for item in dirty:
+            try:
+                if item[0] == "modular":
+                    write_json(self.modular_path(item[1], item[2]), snapshot["modular"][(item[1], item[2])])
+                else:
+                    keys, values = snapshot["equipment"][item[1]]
+                    write_json(self.equipment_path(item[1]), dict(zip(keys, values)))
+            except (IOError, OSError) as e:
+                print("SNMP: failed to persist " + str(item) + ": " + str(e))
+
+    def _persist_loop(self):
+        last_persist = time.time()
+        while True:
+            time.sleep(COMM_CHECK_INTERVAL)
+            self.refresh_comm()
+            if time.time() - last_persist >= SNAPSHOT_PERSIST_INTERVAL:
+                last_persist = time.time()
+                self.persist()
+
+    def start_persisting(self):
+        if self._persist_thread is None:
+            self._persist_thread = threading.Thread(target=self._persist_loop, daemon=True)
+            self._persist_thread.start()
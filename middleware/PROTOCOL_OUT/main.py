@@ -1,6 +1,5 @@
 import threading
 import time
-import pull_data_to_json
 import MODBUS_TCP_SERVER.modbus_tcp_server as modbus_tcp_server
 import SNMP_SERVER.A as snmp_server
 import os, sys